@@ -4,7 +4,7 @@ from .models import (
     Usuario, CategoriaNegocio, Negocio, EmpleadoNegocio, 
     ServicioNegocio, HorarioNegocio, BloqueoHorario, 
     Cita, ReseñaNegocio, FacturacionSuscripcion, 
-    ConfiguracionPlataforma
+    ConfiguracionPlataforma, MetricaPlataforma
 )
 
 # Admin para Usuario
@@ -59,7 +59,10 @@ class NegocioAdmin(admin.ModelAdmin):
     )
     list_filter = ('estado_suscripcion', 'activo', 'verificado', 'categoria')
     search_fields = ('nombre', 'propietario__username', 'propietario__email', 'email', 'telefono')
-    readonly_fields = ('fecha_creacion', 'fecha_actualizacion', 'id')
+    readonly_fields = (
+        'fecha_creacion', 'fecha_actualizacion', 'id',
+        'precio_min', 'precio_max', 'duracion_min', 'duracion_max'
+    )
     fieldsets = (
         (None, {'fields': ('id', 'propietario', 'categoria', 'nombre', 'slug')}),
         ('Información de Contacto', {
@@ -75,6 +78,7 @@ class NegocioAdmin(admin.ModelAdmin):
             )
         }),
         ('Métricas', {'fields': ('calificacion_promedio', 'total_reseñas', 'activo', 'verificado')}),
+        ('Servicios', {'fields': ('precio_min', 'precio_max', 'duracion_min', 'duracion_max')}),
         ('Timestamps', {'fields': ('fecha_creacion', 'fecha_actualizacion')}),
     )
 
@@ -102,7 +106,7 @@ class ServicioNegocioAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'negocio', 'duracion_minutos', 'precio', 'activo')
     list_filter = ('negocio', 'activo', 'disponible_online', 'requiere_confirmacion')
     search_fields = ('nombre', 'negocio__nombre', 'descripcion')
-    readonly_fields = ('fecha_creacion',)
+    readonly_fields = ('fecha_creacion', 'fecha_actualizacion')
     fieldsets = (
         (None, {'fields': ('negocio', 'nombre', 'descripcion')}),
         ('Configuración', {
@@ -112,7 +116,7 @@ class ServicioNegocioAdmin(admin.ModelAdmin):
                 'orden', 'activo'
             )
         }),
-        ('Timestamps', {'fields': ('fecha_creacion',)}),
+        ('Timestamps', {'fields': ('fecha_creacion', 'fecha_actualizacion')}),
     )
 
 # Admin para HorarioNegocio
@@ -215,5 +219,23 @@ class ConfiguracionPlataformaAdmin(admin.ModelAdmin):
         ('Timestamps', {'fields': ('fecha_creacion', 'fecha_actualizacion')}),
     )
 
+# Admin para MetricaPlataforma (solo lectura; la rellena actualizar_metricas_plataforma)
+@admin.register(MetricaPlataforma)
+class MetricaPlataformaAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'tipo', 'clave', 'valor', 'fecha_actualizacion')
+    list_filter = ('tipo',)
+    search_fields = ('clave',)
+    date_hierarchy = 'fecha'
+    ordering = ('-fecha', 'tipo', '-valor')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # Registrar el modelo Usuario con su admin personalizado
 admin.site.register(Usuario, UsuarioAdmin)
\ No newline at end of file
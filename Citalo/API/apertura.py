@@ -0,0 +1,158 @@
+"""
+Horario semanal precalculado de cada negocio.
+
+`Negocio.mascara_apertura` guarda un carácter por cuarto de hora de la semana
+en hora local del negocio (7 × 96 = 672, lunes 00:00 primero): '1' si está
+abierto todo ese cuarto de hora. `dias_apertura` guarda un bit por día de la
+semana con algún tramo abierto. Así "abierto ahora", "abierto en" y "abierto
+el día" se resuelven sobre la propia fila, sin joins con los horarios.
+"""
+from django.db.models import Case, CharField, F, IntegerField, Q, Value, When
+from django.db.models.functions import Substr
+from django.db.models.lookups import Exact, GreaterThan
+from django.utils import timezone
+
+from .fechas import dia_actual, obtener_zona_horaria
+from .indices import IndiceEnMemoria
+
+
+CUARTOS_POR_DIA = 96
+CUARTOS_POR_SEMANA = 7 * CUARTOS_POR_DIA
+MASCARA_CERRADO = '0' * CUARTOS_POR_SEMANA
+
+
+def _cuarto(hora, redondear_arriba=False):
+    minutos = hora.hour * 60 + hora.minute + (1 if hora.second or hora.microsecond else 0)
+    cuarto, resto = divmod(minutos, 15)
+    return cuarto + 1 if redondear_arriba and resto else cuarto
+
+
+def horario_vigente(horario, fecha):
+    if not horario.activo:
+        return False
+    if horario.fecha_inicio_vigencia and fecha < horario.fecha_inicio_vigencia:
+        return False
+    if horario.fecha_fin_vigencia and fecha > horario.fecha_fin_vigencia:
+        return False
+    return True
+
+
+def calcular_mascara(horarios, fecha=None):
+    """
+    (mascara_apertura, dias_apertura) a partir de los horarios vigentes en
+    `fecha`, el día local del negocio (hoy en la zona por defecto si no se
+    indica). Solo cuentan los cuartos de hora abiertos completos; un horario
+    cuyo fin es anterior al inicio continúa al día siguiente.
+    """
+    fecha = fecha or dia_actual(obtener_zona_horaria())
+    mascara = bytearray(MASCARA_CERRADO, 'ascii')
+    for horario in horarios:
+        if not horario_vigente(horario, fecha):
+            continue
+        base = horario.dia_semana * CUARTOS_POR_DIA
+        inicio = base + _cuarto(horario.hora_inicio, redondear_arriba=True)
+        fin = base + _cuarto(horario.hora_fin)
+        if horario.hora_fin <= horario.hora_inicio:
+            fin += CUARTOS_POR_DIA
+        for i in range(inicio, fin):
+            mascara[i % CUARTOS_POR_SEMANA] = ord('1')
+
+    mascara = mascara.decode('ascii')
+    dias = 0
+    for dia in range(7):
+        if '1' in mascara[dia * CUARTOS_POR_DIA:(dia + 1) * CUARTOS_POR_DIA]:
+            dias |= 1 << dia
+    return mascara, dias
+
+
+def posicion(instante):
+    """Índice del cuarto de hora de la semana de un datetime local"""
+    return instante.weekday() * CUARTOS_POR_DIA + instante.hour * 4 + instante.minute // 15
+
+
+def actualizar_mascara(negocio_id):
+    """Recalcula y guarda la máscara de un negocio sin pasar por save()"""
+    from .models import HorarioNegocio, Negocio
+
+    zona_horaria = Negocio.objects.filter(pk=negocio_id).values_list('zona_horaria', flat=True).first()
+    horarios = HorarioNegocio.objects.filter(negocio_id=negocio_id)
+    mascara, dias = calcular_mascara(horarios, dia_actual(obtener_zona_horaria(zona_horaria)))
+    Negocio.objects.filter(pk=negocio_id).update(
+        mascara_apertura=mascara,
+        dias_apertura=dias,
+        fecha_actualizacion=timezone.now(),
+    )
+
+
+class ZonasHorarias(IndiceEnMemoria):
+    """
+    Zonas horarias distintas de los negocios. Una zona que falte se evaluaría
+    con el valor por defecto del Case, así que cada zona nueva sube la versión
+    compartida y los demás procesos releen el conjunto.
+    """
+    clave_version = 'apertura:zonas_horarias:version'
+
+    def __init__(self):
+        super().__init__()
+        self.zonas = set()
+
+    def reconstruir(self):
+        from .models import Negocio
+
+        self.zonas = set(Negocio.objects.order_by().values_list('zona_horaria', flat=True).distinct())
+
+    def registrar_cambio(self, zona):
+        # Las zonas que dejan de usarse se quedan: una rama de más no cambia el resultado
+        if self.version is not None and zona in self.zonas and self.version == self.version_compartida():
+            return
+        super().registrar_cambio(lambda: self.zonas.add(zona))
+
+    def listar(self):
+        self.sincronizar()
+        with self.lock:
+            return sorted(self.zonas)
+
+
+zonas_horarias = ZonasHorarias()
+
+
+def _por_zona(valor_para_zona, output_field):
+    """Case sobre zona_horaria con el valor calculado para cada zona"""
+    return Case(
+        *[When(zona_horaria=zona, then=Value(valor_para_zona(zona))) for zona in zonas_horarias.listar()],
+        default=Value(valor_para_zona(None)),
+        output_field=output_field,
+    )
+
+
+def q_abierto_en(instante):
+    """
+    Q de negocios abiertos en `instante`. Con un datetime aware se convierte
+    a la hora local de cada negocio; uno naive se toma como hora local.
+    """
+    if timezone.is_naive(instante):
+        caracter = Substr('mascara_apertura', posicion(instante) + 1, 1)
+    else:
+        caracter = Substr(
+            'mascara_apertura',
+            _por_zona(
+                lambda zona: posicion(instante.astimezone(obtener_zona_horaria(zona))) + 1,
+                IntegerField(),
+            ),
+            1,
+        )
+    return Q(Exact(caracter, Value('1', output_field=CharField())))
+
+
+def q_abierto_dia(dia_semana):
+    return Q(Exact(F('dias_apertura').bitand(1 << dia_semana), Value(1 << dia_semana)))
+
+
+def q_abierto_hoy(instante=None):
+    """Negocios con algún tramo abierto en el día local de cada uno"""
+    instante = instante or timezone.now()
+    bit = _por_zona(
+        lambda zona: 1 << instante.astimezone(obtener_zona_horaria(zona)).weekday(),
+        IntegerField(),
+    )
+    return Q(GreaterThan(F('dias_apertura').bitand(bit), Value(0)))
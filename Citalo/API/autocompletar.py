@@ -0,0 +1,116 @@
+"""
+Autocompletado de nombres de negocios, servicios y categorías.
+
+Índice de prefijos en memoria: una lista ordenada de claves normalizadas en la
+que se busca con bisect. Cada nombre se indexa desde el comienzo de cada una
+de sus palabras, de modo que "clas" encuentra "Barbería Clásica".
+"""
+from bisect import bisect_left, insort
+
+from .busqueda import normalizar
+from .indices import IndiceEnMemoria
+
+
+LIMITE_POR_DEFECTO = 10
+LIMITE_MAXIMO = 20
+
+
+def claves_nombre(nombre):
+    """Sufijos del nombre normalizado que empiezan en cada palabra"""
+    palabras = normalizar(nombre).split()
+    return [(' '.join(palabras[i:]), i) for i in range(len(palabras))]
+
+
+class IndicePrefijos(IndiceEnMemoria):
+    """Lista ordenada de (clave, posición, tipo, id) con su etiqueta aparte"""
+    clave_version = 'autocompletar:version'
+
+    def __init__(self):
+        super().__init__()
+        self.entradas = []
+        self.elementos = {}
+
+    def reconstruir(self):
+        from .models import CategoriaNegocio, Negocio, ServicioNegocio
+
+        self.entradas = []
+        self.elementos = {}
+        elementos = [
+            ('categoria', pk, nombre, {})
+            for pk, nombre in CategoriaNegocio.objects.filter(activa=True).values_list('pk', 'nombre')
+        ]
+        elementos += [
+            ('negocio', pk, nombre, {'ciudad': ciudad})
+            for pk, nombre, ciudad in Negocio.objects.filter(activo=True).values_list('pk', 'nombre', 'ciudad')
+        ]
+        elementos += [
+            ('servicio', pk, nombre, {'negocio': str(negocio_id)})
+            for pk, nombre, negocio_id in ServicioNegocio.objects.filter(
+                activo=True, negocio__activo=True
+            ).values_list('pk', 'nombre', 'negocio_id')
+        ]
+        for tipo, pk, nombre, extra in elementos:
+            self._añadir(tipo, str(pk), nombre, extra, ordenar=False)
+        self.entradas.sort()
+
+    def _añadir(self, tipo, pk, nombre, extra, ordenar=True):
+        claves = claves_nombre(nombre)
+        self.elementos[(tipo, pk)] = ({'tipo': tipo, 'id': pk, 'etiqueta': nombre, **extra}, claves)
+        for clave, posicion in claves:
+            entrada = (clave, posicion, tipo, pk)
+            if ordenar:
+                insort(self.entradas, entrada)
+            else:
+                self.entradas.append(entrada)
+
+    def _quitar(self, tipo, pk):
+        _, claves = self.elementos.pop((tipo, pk), (None, ()))
+        for clave, posicion in claves:
+            entrada = (clave, posicion, tipo, pk)
+            i = bisect_left(self.entradas, entrada)
+            if i < len(self.entradas) and self.entradas[i] == entrada:
+                del self.entradas[i]
+
+    def registrar_cambio(self, tipo, pk, nombre=None, **extra):
+        """Alta o cambio (con nombre) o baja (sin nombre) de un elemento"""
+        pk = str(pk)
+
+        def aplicar():
+            self._quitar(tipo, pk)
+            if nombre is not None:
+                self._añadir(tipo, pk, nombre, extra)
+        super().registrar_cambio(aplicar)
+
+    def buscar(self, consulta, limite=LIMITE_POR_DEFECTO):
+        """
+        Elementos cuyo nombre tiene alguna palabra que empieza por la consulta.
+        Primero los que coinciden desde la primera palabra y, a igualdad, los
+        nombres más cortos.
+        """
+        self.sincronizar()
+        prefijo = ' '.join(normalizar(consulta).split())
+        if not prefijo:
+            return []
+
+        with self.lock:
+            entradas = self.entradas
+            encontrados = {}
+            i = bisect_left(entradas, (prefijo,))
+            # Se recogen candidatos de más para poder ordenar por relevancia
+            while i < len(entradas) and len(encontrados) < limite * 5:
+                clave, posicion, tipo, pk = entradas[i]
+                if not clave.startswith(prefijo):
+                    break
+                actual = encontrados.get((tipo, pk))
+                if actual is None or posicion < actual:
+                    encontrados[(tipo, pk)] = posicion
+                i += 1
+
+            ordenados = sorted(
+                encontrados.items(),
+                key=lambda item: (item[1] > 0, len(self.elementos[item[0]][0]['etiqueta']))
+            )
+            return [self.elementos[clave][0] for clave, _ in ordenados[:limite]]
+
+
+indice_prefijos = IndicePrefijos()
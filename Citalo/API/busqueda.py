@@ -0,0 +1,249 @@
+"""
+Búsqueda de texto completo de negocios.
+
+Cada negocio tiene un documento con cuatro partes ponderadas: nombre,
+nombres de sus servicios activos, categoría y resto (descripción, ciudad y
+dirección). El texto se normaliza en Python (minúsculas y sin acentos) y se
+indexa con el motor propio de cada base de datos:
+
+- PostgreSQL: columna ``tsvector`` en ``negocios`` con índice GIN y
+  configuración ``spanish`` (stemming de Snowball).
+- SQLite: tabla virtual FTS5 ``negocios_busqueda``; el stemming lo aplica
+  ``raiz()`` antes de indexar y de consultar.
+
+En otras bases de datos se busca cada término con icontains en los campos de
+CAMPOS_SIN_INDICE, sin orden por relevancia.
+"""
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.filters import SearchFilter
+
+
+TABLA_FTS = 'negocios_busqueda'
+COLUMNA_TSVECTOR = 'busqueda'
+PARTES_DOCUMENTO = ('nombre', 'servicios', 'categoria', 'resto')
+PESOS_POSTGRES = dict(zip(PARTES_DOCUMENTO, 'ABCD'))
+PESOS_BM25 = (10.0, 5.0, 3.0, 1.0)
+CAMPOS_SIN_INDICE = ('nombre', 'descripcion', 'ciudad', 'direccion')
+
+PALABRAS_VACIAS = frozenset({
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'para', 'por', 'un', 'una', 'y',
+})
+
+
+def normalizar(texto):
+    """Pasa a minúsculas y elimina acentos y diacríticos"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto):
+    return [
+        token for token in re.findall(r'[a-z0-9]+', normalizar(texto))
+        if token not in PALABRAS_VACIAS
+    ]
+
+
+def raiz(token):
+    """
+    Stemmer ligero para español: quita el plural y la vocal final de género
+    (peluquerías -> peluqueri, cortes -> cort, luces -> luz).
+    """
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith('ces'):
+        token = token[:-3] + 'z'
+    elif token.endswith('es') and len(token) > 4:
+        token = token[:-2]
+    elif token.endswith('s'):
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in 'aeo':
+        token = token[:-1]
+    return token
+
+
+def documento_negocio(negocio, nombres_servicios):
+    """Texto normalizado de cada parte del documento de un negocio"""
+    categoria = getattr(negocio, 'categoria', None)
+    return {
+        'nombre': normalizar(negocio.nombre),
+        'servicios': normalizar(' '.join(nombres_servicios)),
+        'categoria': normalizar(categoria.nombre if categoria else ''),
+        'resto': normalizar(' '.join([negocio.descripcion, negocio.ciudad, negocio.direccion])),
+    }
+
+
+class MotorBusqueda:
+    """
+    Motor de búsqueda asociado a una conexión de base de datos. Sin índice
+    propio no guarda nada y filtra con icontains.
+    """
+    soportado = False
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self.conexion = connections[alias]
+
+    def quote(self, nombre):
+        return self.conexion.ops.quote_name(nombre)
+
+    def crear_estructuras(self):
+        pass
+
+    def eliminar_estructuras(self):
+        pass
+
+    def guardar(self, negocio_pk, documento):
+        pass
+
+    def eliminar(self, negocio_pk):
+        pass
+
+    def filtrar(self, queryset, consulta):
+        """
+        Filtra el queryset de negocios; los motores con índice añaden además
+        la anotación extra rango_busqueda
+        """
+        for termino in consulta.split():
+            queryset = queryset.filter(
+                Q(*[Q(**{f'{campo}__icontains': termino}) for campo in CAMPOS_SIN_INDICE], _connector=Q.OR)
+            )
+        return queryset
+
+    def indexar(self, negocio):
+        from .models import ServicioNegocio
+
+        nombres = ServicioNegocio.objects.using(self.alias).filter(
+            negocio_id=negocio.pk, activo=True
+        ).values_list('nombre', flat=True)
+        self.guardar(negocio.pk, documento_negocio(negocio, nombres))
+
+    def reconstruir(self, negocios):
+        for negocio in negocios:
+            self.indexar(negocio)
+
+
+class MotorPostgres(MotorBusqueda):
+    soportado = True
+
+    def crear_estructuras(self):
+        tabla = self.quote('negocios')
+        with self.conexion.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS {COLUMNA_TSVECTOR} tsvector')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS negocios_busqueda_gin '
+                f'ON {tabla} USING GIN ({COLUMNA_TSVECTOR})'
+            )
+
+    def eliminar_estructuras(self):
+        with self.conexion.cursor() as cursor:
+            cursor.execute('DROP INDEX IF EXISTS negocios_busqueda_gin')
+            cursor.execute(f'ALTER TABLE {self.quote("negocios")} DROP COLUMN IF EXISTS {COLUMNA_TSVECTOR}')
+
+    def guardar(self, negocio_pk, documento):
+        vector = ' || '.join(
+            f"setweight(to_tsvector('spanish', %s), '{PESOS_POSTGRES[parte]}')"
+            for parte in PARTES_DOCUMENTO
+        )
+        with self.conexion.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {self.quote("negocios")} SET {COLUMNA_TSVECTOR} = {vector} WHERE id = %s',
+                [documento[parte] for parte in PARTES_DOCUMENTO] + [negocio_pk],
+            )
+
+    def filtrar(self, queryset, consulta):
+        tokens = tokenizar(consulta)
+        if not tokens:
+            return queryset
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        columna = f'{self.quote("negocios")}.{COLUMNA_TSVECTOR}'
+        return queryset.extra(
+            select={'rango_busqueda': f"ts_rank_cd({columna}, to_tsquery('spanish', %s))"},
+            select_params=[tsquery],
+            where=[f"{columna} @@ to_tsquery('spanish', %s)"],
+            params=[tsquery],
+        )
+
+
+class MotorSQLite(MotorBusqueda):
+    soportado = True
+
+    def crear_estructuras(self):
+        columnas = ', '.join(PARTES_DOCUMENTO)
+        with self.conexion.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5('
+                f"negocio_id UNINDEXED, {columnas}, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+
+    def eliminar_estructuras(self):
+        with self.conexion.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLA_FTS}')
+
+    def _clave(self, negocio_pk):
+        # Django guarda los UUID en SQLite como 32 caracteres hexadecimales
+        return getattr(negocio_pk, 'hex', str(negocio_pk))
+
+    def guardar(self, negocio_pk, documento):
+        valores = [
+            ' '.join(raiz(token) for token in documento[parte].split())
+            for parte in PARTES_DOCUMENTO
+        ]
+        with self.conexion.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLA_FTS} WHERE negocio_id = %s', [self._clave(negocio_pk)])
+            cursor.execute(
+                f'INSERT INTO {TABLA_FTS} (negocio_id, {", ".join(PARTES_DOCUMENTO)}) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                [self._clave(negocio_pk)] + valores,
+            )
+
+    def eliminar(self, negocio_pk):
+        with self.conexion.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLA_FTS} WHERE negocio_id = %s', [self._clave(negocio_pk)])
+
+    def filtrar(self, queryset, consulta):
+        tokens = tokenizar(consulta)
+        if not tokens:
+            return queryset
+        expresion = ' '.join(f'"{raiz(token)}"*' for token in tokens)
+        pesos = ', '.join(str(peso) for peso in (0.0,) + PESOS_BM25)
+        return queryset.extra(
+            select={'rango_busqueda': f'-bm25({TABLA_FTS}, {pesos})'},
+            tables=[TABLA_FTS],
+            where=[
+                f'{TABLA_FTS}.negocio_id = {self.quote("negocios")}.id',
+                f'{TABLA_FTS} MATCH %s',
+            ],
+            params=[expresion],
+        )
+
+
+MOTORES = {
+    'postgresql': MotorPostgres,
+    'sqlite': MotorSQLite,
+}
+
+
+def obtener_motor(alias='default'):
+    return MOTORES.get(connections[alias].vendor, MotorBusqueda)(alias)
+
+
+class BusquedaTextoCompletoFilter(SearchFilter):
+    """
+    SearchFilter sobre el índice de texto completo de negocios.
+
+    Añade la anotación `rango_busqueda`, que RelevanciaOrderingFilter usa como
+    orden por defecto. Si la base de datos no tiene motor propio se filtra
+    con icontains y se conserva el orden por defecto.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        consulta = request.query_params.get(self.search_param, '').strip()
+        if not consulta:
+            return queryset
+
+        return obtener_motor(queryset.db).filtrar(queryset, consulta)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+CACHES_POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def comprobar_cache_compartida(app_configs, **kwargs):
+    """Las invalidaciones por versión (series, índices, facetas) necesitan una caché compartida"""
+    if settings.CACHES['default']['BACKEND'] not in CACHES_POR_PROCESO:
+        return []
+    return [Warning(
+        'La caché por defecto es local a cada proceso.',
+        hint=(
+            'Con varios workers las series, los índices de búsqueda y las facetas no se '
+            'invalidan en los demás procesos. Configure CACHE_BACKEND y CACHE_LOCATION '
+            '(Redis o Memcached).'
+        ),
+        id='API.W001',
+    )]
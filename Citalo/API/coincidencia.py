@@ -0,0 +1,239 @@
+"""
+Búsqueda difusa de clientes por nombre y teléfono.
+
+Los modelos guardan columnas normalizadas (nombre sin acentos en minúsculas y
+teléfono solo con dígitos) y la búsqueda se resuelve por similitud de
+trigramas:
+
+- PostgreSQL: extensión pg_trgm con índice GIN sobre la columna normalizada.
+- SQLite: índice invertido de trigramas en memoria por proceso (ver
+  indices.py), mantenido desde las señales de guardado y borrado. Los
+  candidatos se cruzan por lotes con el queryset de la vista.
+
+En ambos casos se devuelven como mucho MAXIMO_COINCIDENCIAS filas, las más
+similares.
+
+Los teléfonos se buscan por prefijo con un rango sobre la columna indexada.
+"""
+import re
+from collections import Counter, defaultdict
+
+from django.db import connections, transaction
+from django.db.models import Case, FloatField, Value, When
+from rest_framework.filters import SearchFilter
+
+from .busqueda import normalizar
+from .indices import IndiceEnMemoria
+
+
+UMBRAL_SIMILITUD = 0.5
+MIN_DIGITOS_TELEFONO = 3
+PREFIJOS_INTERNACIONALES = ('0034', '+34')
+MAXIMO_COINCIDENCIAS = 200
+LOTE_CANDIDATOS = 1000
+
+
+def normalizar_nombre(*partes):
+    """Nombre en minúsculas, sin acentos y con espacios simples"""
+    return ' '.join(re.findall(r'[a-z0-9]+', normalizar(' '.join(p for p in partes if p))))
+
+
+def normalizar_telefono(telefono):
+    """Solo dígitos y sin prefijo internacional español"""
+    telefono = (telefono or '').strip()
+    for prefijo in PREFIJOS_INTERNACIONALES:
+        if telefono.startswith(prefijo):
+            telefono = telefono[len(prefijo):]
+            break
+    return re.sub(r'\D', '', telefono)
+
+
+def es_telefono(consulta):
+    """La consulta son dígitos con separadores habituales de teléfono"""
+    return bool(re.fullmatch(r'[\d\s+().-]+', consulta)) and \
+        len(re.sub(r'\D', '', consulta)) >= MIN_DIGITOS_TELEFONO
+
+
+def trigramas(texto):
+    """Trigramas por palabra con el mismo relleno que pg_trgm"""
+    resultado = set()
+    for palabra in texto.split():
+        palabra = f'  {palabra} '
+        resultado.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return resultado
+
+
+def filtrar_por_prefijo_telefono(queryset, campo, consulta):
+    """
+    Prefijo como rango [digitos, digitos + ':') para usar el índice b-tree.
+    Con menos de MIN_DIGITOS_TELEFONO dígitos no hay coincidencias: un prefijo
+    vacío abarcaría todos los teléfonos.
+    """
+    digitos = normalizar_telefono(consulta)
+    if len(digitos) < MIN_DIGITOS_TELEFONO:
+        return queryset.none()
+    return queryset.filter(**{f'{campo}__gte': digitos, f'{campo}__lt': digitos + ':'})
+
+
+class IndiceTrigramas(IndiceEnMemoria):
+    """Índice invertido trigrama -> pks de una columna normalizada"""
+
+    def __init__(self, modelo, campo):
+        super().__init__()
+        self.modelo = modelo
+        self.campo = campo
+        self.por_trigrama = defaultdict(set)
+        self.por_pk = {}
+
+    @property
+    def clave_version(self):
+        return f'trigramas:{self.modelo._meta.label_lower}:{self.campo}'
+
+    def reconstruir(self):
+        self.por_trigrama = defaultdict(set)
+        self.por_pk = {}
+        for pk, texto in self.modelo._default_manager.values_list('pk', self.campo).iterator():
+            self._añadir(pk, texto)
+
+    def _añadir(self, pk, texto):
+        grams = trigramas(texto)
+        self.por_pk[pk] = grams
+        for gram in grams:
+            self.por_trigrama[gram].add(pk)
+
+    def _quitar(self, pk):
+        for gram in self.por_pk.pop(pk, ()):
+            self.por_trigrama[gram].discard(pk)
+
+    def registrar_cambio(self, pk, texto=None):
+        """
+        Alta o cambio (con texto) o baja (sin texto) de una fila. Si la copia
+        local está al día y ya tiene esos trigramas no se sube la versión, para
+        que guardados que no tocan el nombre (p. ej. el login) no obliguen a
+        reconstruir el índice en los demás procesos.
+        """
+        if texto is not None and self.version is not None and self.por_pk.get(pk) == trigramas(texto) \
+                and self.version == self.version_compartida():
+            return
+
+        def aplicar():
+            self._quitar(pk)
+            if texto is not None:
+                self._añadir(pk, texto)
+        super().registrar_cambio(aplicar)
+
+    def buscar(self, consulta, umbral=UMBRAL_SIMILITUD):
+        """{pk: similitud} con la fracción de trigramas de la consulta presentes"""
+        self.sincronizar()
+        grams = trigramas(consulta)
+        if not grams:
+            return {}
+        coincidencias = Counter()
+        with self.lock:
+            for gram in grams:
+                coincidencias.update(self.por_trigrama.get(gram, ()))
+        return {
+            pk: comunes / len(grams)
+            for pk, comunes in coincidencias.items()
+            if comunes / len(grams) >= umbral
+        }
+
+
+_indices = {}
+
+
+def obtener_indice(modelo, campo):
+    clave = (modelo._meta.label_lower, campo)
+    if clave not in _indices:
+        _indices[clave] = IndiceTrigramas(modelo, campo)
+    return _indices[clave]
+
+
+def usa_indice_en_memoria(alias='default'):
+    return connections[alias].vendor == 'sqlite'
+
+
+def anotar_similitud(queryset, similitudes):
+    """Restringe a los pks de `similitudes` ({pk: similitud}) y anota `similitud`"""
+    if not similitudes:
+        return queryset.none()
+    return queryset.filter(pk__in=list(similitudes)).annotate(similitud=Case(
+        *[When(pk=pk, then=Value(valor)) for pk, valor in similitudes.items()],
+        default=Value(0.0),
+        output_field=FloatField(),
+    ))
+
+
+def mejores_en_ambito(queryset, similitudes):
+    """
+    Las MAXIMO_COINCIDENCIAS más similares de `similitudes` que están en el
+    queryset, comprobando los candidatos por lotes de mayor a menor similitud
+    """
+    candidatos = sorted(similitudes, key=similitudes.get, reverse=True)
+    elegidos = []
+    for inicio in range(0, len(candidatos), LOTE_CANDIDATOS):
+        lote = candidatos[inicio:inicio + LOTE_CANDIDATOS]
+        en_ambito = set(queryset.filter(pk__in=lote).order_by().values_list('pk', flat=True))
+        elegidos.extend(pk for pk in lote if pk in en_ambito)
+        if len(elegidos) >= MAXIMO_COINCIDENCIAS:
+            break
+    return {pk: similitudes[pk] for pk in elegidos[:MAXIMO_COINCIDENCIAS]}
+
+
+def filtrar_por_nombre(queryset, campo, consulta):
+    """
+    Filtra por similitud de trigramas y anota `similitud`. Se quedan las
+    MAXIMO_COINCIDENCIAS filas del queryset más similares, de modo que la
+    consulta final no crece con el número de coincidencias.
+    """
+    consulta = normalizar_nombre(consulta)
+    if not consulta:
+        return queryset
+
+    conexion = connections[queryset.db]
+    if conexion.vendor == 'postgresql':
+        columna = f'{conexion.ops.quote_name(queryset.model._meta.db_table)}.{conexion.ops.quote_name(campo)}'
+        candidatos = queryset.extra(
+            select={'similitud': f'word_similarity(%s, {columna})'},
+            select_params=[consulta],
+            where=[f'%s <%% {columna}'],
+            params=[consulta],
+        ).order_by('-similitud').values_list('pk', 'similitud')[:MAXIMO_COINCIDENCIAS]
+        # El umbral solo vale para esta transacción: no se filtra a otras
+        # consultas de la misma conexión
+        with transaction.atomic(using=queryset.db), conexion.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", [str(UMBRAL_SIMILITUD)]
+            )
+            similitudes = dict(candidatos)
+        return anotar_similitud(queryset, similitudes)
+
+    if conexion.vendor == 'sqlite':
+        similitudes = obtener_indice(queryset.model, campo).buscar(consulta)
+        return anotar_similitud(queryset, mejores_en_ambito(queryset, similitudes))
+
+    for palabra in consulta.split():
+        queryset = queryset.filter(**{f'{campo}__icontains': palabra})
+    return queryset
+
+
+class BusquedaClienteFilter(SearchFilter):
+    """
+    SearchFilter para buscar clientes: emails por prefijo, teléfonos por
+    prefijo de la columna normalizada y nombres por similitud.
+
+    La vista indica las columnas en `busqueda_cliente_campos`, con las claves
+    'nombre', 'telefono' y 'email'.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        consulta = request.query_params.get(self.search_param, '').strip()
+        campos = getattr(view, 'busqueda_cliente_campos', None)
+        if not consulta or not campos:
+            return super().filter_queryset(request, queryset, view)
+
+        if '@' in consulta:
+            return queryset.filter(**{f"{campos['email']}__istartswith": consulta})
+        if es_telefono(consulta):
+            return filtrar_por_prefijo_telefono(queryset, campos['telefono'], consulta)
+        return filtrar_por_nombre(queryset, campos['nombre'], consulta)
@@ -0,0 +1,176 @@
+"""
+Próximo hueco libre de cada negocio.
+
+`Negocio.proxima_disponibilidad` guarda el inicio del primer hueco reservable
+(en pasos de INTERVALO_MINUTOS, respetando la antelación mínima) en el que cabe
+el servicio más corto del negocio. Un hueco está libre si ningún bloqueo del
+negocio lo toca y las citas activas y bloqueos de empleados que lo solapan no
+llegan a la capacidad, que es el número de empleados activos (al menos uno).
+
+Se recalcula al cambiar citas, bloqueos, horarios, empleados o servicios del
+negocio, y el comando `recalcular_proxima_disponibilidad` barre los valores
+que el paso del tiempo deja vencidos.
+
+`resumen_dia` calcula los huecos de un día para muchos negocios a la vez (la
+vista de mapa) con una consulta por tabla agrupada por negocio.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db.models import Count
+from django.utils import timezone
+
+from .apertura import horario_vigente
+from .fechas import inicio_dia, obtener_zona_horaria
+
+
+INTERVALO_MINUTOS = 30
+HORIZONTE_DIAS = 14
+ESTADOS_ACTIVOS = ('pendiente', 'confirmada', 'en_curso')
+
+
+def tramos_del_dia(horarios, fecha, zona):
+    """(inicio, fin) aware de los horarios vigentes de un día local"""
+    for horario in horarios:
+        if horario.dia_semana != fecha.weekday() or not horario_vigente(horario, fecha):
+            continue
+        inicio = datetime.combine(fecha, horario.hora_inicio, tzinfo=zona)
+        fin = datetime.combine(fecha, horario.hora_fin, tzinfo=zona)
+        if fin <= inicio:
+            fin += timedelta(days=1)
+        yield inicio, fin
+
+
+def _ocupacion(intervalos, inicio, fin):
+    return sum(1 for desde, hasta in intervalos if desde < fin and hasta > inicio)
+
+
+def huecos_libres(horarios, citas, bloqueos, capacidad, duracion, desde, hasta, zona):
+    """
+    Inicios de hueco libres en [desde, hasta), en orden.
+
+    `citas` son intervalos (inicio, fin) activos y `bloqueos` ternas
+    (inicio, fin, de_empleado); basta con las que solapan la ventana.
+    """
+    paso = timedelta(minutes=INTERVALO_MINUTOS)
+    duracion = timedelta(minutes=duracion)
+    de_negocio = [(i, f) for i, f, de_empleado in bloqueos if not de_empleado]
+    ocupados = list(citas) + [(i, f) for i, f, de_empleado in bloqueos if de_empleado]
+
+    # Un día antes por los horarios nocturnos que empiezan la víspera
+    fecha = desde.astimezone(zona).date() - timedelta(days=1)
+    while inicio_dia(fecha, zona) < hasta:
+        for inicio, fin in sorted(tramos_del_dia(horarios, fecha, zona)):
+            hueco = inicio
+            if hueco < desde:
+                # Primer paso del tramo que no sea anterior a `desde`
+                hueco += -((inicio - desde) // paso) * paso
+            while hueco + duracion <= fin and hueco < hasta:
+                final = hueco + duracion
+                if not _ocupacion(de_negocio, hueco, final) and _ocupacion(ocupados, hueco, final) < capacidad:
+                    yield hueco
+                hueco += paso
+        fecha += timedelta(days=1)
+
+
+def primer_hueco(horarios, citas, bloqueos, capacidad, duracion, desde, zona, hasta=None):
+    """Primer hueco libre a partir de `desde` (por defecto, dentro del horizonte)"""
+    hasta = hasta or desde + timedelta(days=HORIZONTE_DIAS)
+    return next(huecos_libres(horarios, citas, bloqueos, capacidad, duracion, desde, hasta, zona), None)
+
+
+def calcular_proxima_disponibilidad(negocio, ahora=None):
+    """Próximo hueco libre del negocio o None si no hay en el horizonte"""
+    horarios = list(negocio.horarios.all())
+    if not negocio.activo or not horarios:
+        return None
+    ahora = ahora or timezone.now()
+    desde = ahora + timedelta(minutes=negocio.tiempo_anticipacion_minimo)
+    hasta = desde + timedelta(days=HORIZONTE_DIAS)
+
+    citas = negocio.citas.filter(
+        estado__in=ESTADOS_ACTIVOS,
+        fecha_hora_inicio__lt=hasta, fecha_hora_fin__gt=desde,
+    ).values_list('fecha_hora_inicio', 'fecha_hora_fin')
+    bloqueos = [
+        (inicio, fin, empleado_id is not None)
+        for inicio, fin, empleado_id in negocio.bloqueos.filter(
+            activo=True, fecha_inicio__lt=hasta, fecha_fin__gt=desde,
+        ).values_list('fecha_inicio', 'fecha_fin', 'empleado_id')
+    ]
+    capacidad = max(negocio.empleados.filter(activo=True).count(), 1)
+
+    return primer_hueco(
+        horarios, list(citas), bloqueos, capacidad,
+        negocio.duracion_min or INTERVALO_MINUTOS, desde,
+        obtener_zona_horaria(negocio.zona_horaria), hasta,
+    )
+
+
+def actualizar_proxima_disponibilidad(negocio_id, ahora=None):
+    """Recalcula y guarda el valor de un negocio sin pasar por save()"""
+    from .models import Negocio
+
+    negocio = Negocio.objects.filter(pk=negocio_id).first()
+    if negocio is None:
+        return None
+    proxima = calcular_proxima_disponibilidad(negocio, ahora)
+    if proxima != negocio.proxima_disponibilidad:
+        Negocio.objects.filter(pk=negocio_id).update(
+            proxima_disponibilidad=proxima, fecha_actualizacion=timezone.now()
+        )
+    return proxima
+
+
+def resumen_dia(negocios, fecha, ahora=None):
+    """
+    {negocio_id: {'huecos_libres': n, 'primer_hueco': datetime | None}} para el
+    día local `fecha` de cada negocio, con cuatro consultas en total.
+    """
+    from .models import BloqueoHorario, Cita, EmpleadoNegocio, HorarioNegocio
+
+    if not negocios:
+        return {}
+    ahora = ahora or timezone.now()
+    ventanas = {}
+    for negocio in negocios:
+        zona = obtener_zona_horaria(negocio.zona_horaria)
+        inicio, fin = inicio_dia(fecha, zona), inicio_dia(fecha + timedelta(days=1), zona)
+        desde = max(inicio, ahora + timedelta(minutes=negocio.tiempo_anticipacion_minimo))
+        ventanas[negocio.pk] = (desde, fin, zona)
+
+    ids = list(ventanas)
+    desde_global = min(desde for desde, _, _ in ventanas.values())
+    # Los huecos que empiezan antes de medianoche pueden terminar al día siguiente
+    hasta_global = max(fin for _, fin, _ in ventanas.values()) + timedelta(days=1)
+
+    horarios, citas, bloqueos = defaultdict(list), defaultdict(list), defaultdict(list)
+    for horario in HorarioNegocio.objects.filter(negocio_id__in=ids, activo=True):
+        horarios[horario.negocio_id].append(horario)
+    for negocio_id, inicio, fin in Cita.objects.filter(
+        negocio_id__in=ids, estado__in=ESTADOS_ACTIVOS,
+        fecha_hora_inicio__lt=hasta_global, fecha_hora_fin__gt=desde_global,
+    ).values_list('negocio_id', 'fecha_hora_inicio', 'fecha_hora_fin'):
+        citas[negocio_id].append((inicio, fin))
+    for negocio_id, inicio, fin, empleado_id in BloqueoHorario.objects.filter(
+        negocio_id__in=ids, activo=True, fecha_inicio__lt=hasta_global, fecha_fin__gt=desde_global,
+    ).values_list('negocio_id', 'fecha_inicio', 'fecha_fin', 'empleado_id'):
+        bloqueos[negocio_id].append((inicio, fin, empleado_id is not None))
+    empleados = dict(
+        EmpleadoNegocio.objects.filter(negocio_id__in=ids, activo=True)
+        .values('negocio_id').annotate(total=Count('pk')).values_list('negocio_id', 'total')
+    )
+
+    resumen = {}
+    for negocio in negocios:
+        desde, hasta, zona = ventanas[negocio.pk]
+        huecos = [] if desde >= hasta else list(huecos_libres(
+            horarios[negocio.pk], citas[negocio.pk], bloqueos[negocio.pk],
+            max(empleados.get(negocio.pk, 0), 1), negocio.duracion_min or INTERVALO_MINUTOS,
+            desde, hasta, zona,
+        ))
+        resumen[negocio.pk] = {
+            'huecos_libres': len(huecos),
+            'primer_hueco': huecos[0] if huecos else None,
+        }
+    return resumen
@@ -0,0 +1,114 @@
+"""
+Estadísticas de citas de un negocio.
+
+Los conteos e ingresos se leen de ResumenDiarioCitas con un único aggregate()
+de agregados condicionales (`Sum(filter=...)`), de modo que el coste depende
+de los días y estados con actividad y no del número de citas. Los clientes
+distintos no se pueden sumar por días: se estiman uniendo los sketches
+HyperLogLog mensuales (ClientesMesNegocio) y solo los meses incompletos de los
+extremos de la ventana se leen de las citas, con un rango semiabierto de
+fecha_hora_inicio que aprovecha el índice (negocio, fecha_hora_inicio). Con
+`exacto` se cuentan todos sobre las citas.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from . import hll
+from .fechas import inicio_dia, obtener_zona_horaria
+
+
+ESTADOS_CANCELADA = ('cancelada_cliente', 'cancelada_negocio')
+
+
+def q_ventana(desde, hasta, zona):
+    """Q de citas que empiezan entre los días locales `desde` y `hasta` (incluidos)"""
+    ventana = Q()
+    if desde:
+        ventana &= Q(fecha_hora_inicio__gte=inicio_dia(desde, zona))
+    if hasta:
+        ventana &= Q(fecha_hora_inicio__lt=inicio_dia(hasta + timedelta(days=1), zona))
+    return ventana
+
+
+def q_ventana_dias(desde, hasta, campo='fecha'):
+    """Q sobre una columna de fecha local entre `desde` y `hasta` (incluidos)"""
+    ventana = Q()
+    if desde:
+        ventana &= Q(**{f'{campo}__gte': desde})
+    if hasta:
+        ventana &= Q(**{f'{campo}__lte': hasta})
+    return ventana
+
+
+def contar_clientes(negocio, desde, hasta, zona, exacto=False):
+    """Clientes distintos con citas entre los días locales `desde` y `hasta`"""
+    citas = negocio.citas.order_by()
+    # Meses completos de la ventana: [primer_mes, fin_meses)
+    primer_mes = desde if not desde or desde.day == 1 else (desde.replace(day=1) + timedelta(days=31)).replace(day=1)
+    fin_meses = hasta and (hasta + timedelta(days=1)).replace(day=1)
+    if exacto or (desde and hasta and primer_mes >= fin_meses):
+        return citas.filter(q_ventana(desde, hasta, zona)).aggregate(total=Count('cliente', distinct=True))['total']
+
+    sketches = negocio.clientes_mensuales.all()
+    if primer_mes:
+        sketches = sketches.filter(mes__gte=primer_mes)
+    if fin_meses:
+        sketches = sketches.filter(mes__lt=fin_meses)
+    registros = hll.vacio()
+    for otro in sketches.values_list('registros', flat=True):
+        hll.unir(registros, otro)
+
+    extremos = []
+    if desde and desde != primer_mes:
+        extremos.append(q_ventana(desde, primer_mes - timedelta(days=1), zona))
+    if hasta and fin_meses <= hasta:
+        extremos.append(q_ventana(fin_meses, hasta, zona))
+    if extremos:
+        for cliente_id in citas.filter(reduce(or_, extremos)).values_list('cliente_id', flat=True).distinct():
+            hll.añadir(registros, cliente_id)
+    return hll.estimar(registros)
+
+
+def calcular_estadisticas(negocio, desde=None, hasta=None, hoy=None, exacto=False):
+    """
+    Métricas de las citas del negocio en la ventana [desde, hasta] (días
+    locales; sin ventana, todo el historial). `ingresos_mes_actual` se refiere
+    siempre al mes en curso; `total_clientes` es una estimación salvo con
+    `exacto`.
+    """
+    zona = obtener_zona_horaria(negocio.zona_horaria)
+    hoy = hoy or timezone.now().astimezone(zona).date()
+    inicio_mes = hoy.replace(day=1)
+    en_mes = Q(fecha__gte=inicio_mes, fecha__lt=(inicio_mes + timedelta(days=31)).replace(day=1))
+    ventana = q_ventana_dias(desde, hasta)
+
+    resumen = negocio.resumenes_diarios.order_by()
+    if ventana:
+        resumen = resumen.filter(ventana | en_mes)
+
+    datos = resumen.aggregate(
+        total_citas=Sum('total', filter=ventana),
+        citas_pendientes=Sum('total', filter=ventana & Q(estado='pendiente')),
+        citas_confirmadas=Sum('total', filter=ventana & Q(estado='confirmada')),
+        citas_completadas=Sum('total', filter=ventana & Q(estado='completada')),
+        citas_canceladas=Sum('total', filter=ventana & Q(estado__in=ESTADOS_CANCELADA)),
+        ingresos_periodo=Sum('ingresos', filter=ventana & Q(estado='completada')),
+        ingresos_mes_actual=Sum('ingresos', filter=en_mes & Q(estado='completada')),
+    )
+    # El alias no puede coincidir con la columna 'ingresos'
+    datos['ingresos'] = datos.pop('ingresos_periodo')
+    for clave, valor in datos.items():
+        if valor is None:
+            datos[clave] = Decimal('0') if clave.startswith('ingresos') else 0
+
+    datos['total_clientes'] = contar_clientes(negocio, desde, hasta, zona, exacto)
+    datos['clientes_exacto'] = exacto
+    datos['calificacion_promedio'] = negocio.calificacion_promedio
+    datos['desde'] = desde
+    datos['hasta'] = hasta
+    return datos
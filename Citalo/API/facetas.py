@@ -0,0 +1,156 @@
+"""
+Conteos por faceta (categoría, ciudad, verificado y rango de precio) del
+listado filtrado de negocios.
+
+Se calculan con una sola consulta agrupada: GROUPING SETS en PostgreSQL y, en
+el resto, un GROUP BY por la combinación de las cuatro columnas que se suma
+después en Python. El resultado se guarda en caché por conjunto de filtros
+normalizado e invalidado por versión al cambiar negocios, servicios o
+categorías.
+"""
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Case, CharField, Count, F, Value, When
+
+
+FACETAS_POR_DEFECTO = {
+    'TIMEOUT_CACHE': 120,
+}
+
+# (desde, hasta, etiqueta) sobre precio_min; desde incluido, hasta excluido
+RANGOS_PRECIO = (
+    (None, 20, '0-20'),
+    (20, 50, '20-50'),
+    (50, 100, '50-100'),
+    (100, None, '100+'),
+)
+
+PARAMETROS_IGNORADOS = {'page', 'page_size', 'cursor', 'ordering', 'facetas', 'format'}
+
+CLAVE_VERSION = 'facetas:version'
+
+COLUMNAS = {
+    'f_categoria': F('categoria_id'),
+    'f_categoria_nombre': F('categoria__nombre'),
+    'f_ciudad': F('ciudad'),
+    'f_verificado': F('verificado'),
+}
+
+
+def _config():
+    return {**FACETAS_POR_DEFECTO, **getattr(settings, 'FACETAS', {})}
+
+
+def expresion_rango_precio():
+    casos = []
+    for desde, hasta, etiqueta in RANGOS_PRECIO:
+        condicion = {}
+        if desde is not None:
+            condicion['precio_min__gte'] = desde
+        if hasta is not None:
+            condicion['precio_min__lt'] = hasta
+        casos.append(When(then=Value(etiqueta), **condicion))
+    return Case(*casos, default=Value(None), output_field=CharField())
+
+
+def clave_filtros(query_params):
+    """Clave de caché independiente del orden y de los parámetros de paginación"""
+    partes = sorted(
+        (nombre, ','.join(sorted(query_params.getlist(nombre))))
+        for nombre in query_params
+        if nombre not in PARAMETROS_IGNORADOS
+    )
+    version = cache.get_or_set(CLAVE_VERSION, 0, None)
+    huella = hashlib.md5(repr(partes).encode('utf-8')).hexdigest()
+    return f'facetas:{version}:{huella}'
+
+
+def invalidar_facetas():
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.set(CLAVE_VERSION, 1, None)
+
+
+def _filas_agrupadas(queryset):
+    return queryset.order_by().values(
+        **COLUMNAS, f_rango_precio=expresion_rango_precio()
+    )
+
+
+def _contar_grouping_sets(queryset):
+    sql, params = _filas_agrupadas(queryset).query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            'SELECT f_categoria, f_categoria_nombre, f_ciudad, f_verificado, f_rango_precio, '
+            'GROUPING(f_categoria), GROUPING(f_ciudad), GROUPING(f_verificado), COUNT(*) '
+            f'FROM ({sql}) AS filtrados '
+            'GROUP BY GROUPING SETS ((f_categoria, f_categoria_nombre), (f_ciudad), '
+            '(f_verificado), (f_rango_precio))',
+            params,
+        )
+        filas = cursor.fetchall()
+
+    conteos = defaultdict(dict)
+    for categoria, nombre, ciudad, verificado, rango, sin_cat, sin_ciudad, sin_verif, total in filas:
+        if not sin_cat:
+            conteos['categoria'][(categoria, nombre)] = total
+        elif not sin_ciudad:
+            conteos['ciudad'][ciudad] = total
+        elif not sin_verif:
+            conteos['verificado'][verificado] = total
+        else:
+            conteos['rango_precio'][rango] = total
+    return conteos
+
+
+def _contar_agrupando(queryset):
+    conteos = defaultdict(lambda: defaultdict(int))
+    for fila in _filas_agrupadas(queryset).annotate(total=Count('pk')):
+        total = fila['total']
+        conteos['categoria'][(fila['f_categoria'], fila['f_categoria_nombre'])] += total
+        conteos['ciudad'][fila['f_ciudad']] += total
+        conteos['verificado'][fila['f_verificado']] += total
+        conteos['rango_precio'][fila['f_rango_precio']] += total
+    return conteos
+
+
+def calcular_facetas(queryset):
+    if connections[queryset.db].vendor == 'postgresql':
+        conteos = _contar_grouping_sets(queryset)
+    else:
+        conteos = _contar_agrupando(queryset)
+
+    orden_rangos = [etiqueta for _, _, etiqueta in RANGOS_PRECIO]
+    return {
+        'categoria': sorted(
+            ({'valor': valor, 'nombre': nombre, 'total': total}
+             for (valor, nombre), total in conteos['categoria'].items()),
+            key=lambda faceta: (-faceta['total'], faceta['nombre'])
+        ),
+        'ciudad': sorted(
+            ({'valor': valor, 'total': total} for valor, total in conteos['ciudad'].items()),
+            key=lambda faceta: (-faceta['total'], faceta['valor'])
+        ),
+        'verificado': [
+            {'valor': valor, 'total': conteos['verificado'][valor]}
+            for valor in (True, False) if conteos['verificado'].get(valor)
+        ],
+        'rango_precio': [
+            {'valor': etiqueta, 'total': conteos['rango_precio'][etiqueta]}
+            for etiqueta in orden_rangos if conteos['rango_precio'].get(etiqueta)
+        ],
+    }
+
+
+def facetas_en_cache(queryset, query_params):
+    clave = clave_filtros(query_params)
+    facetas = cache.get(clave)
+    if facetas is None:
+        facetas = calcular_facetas(queryset)
+        cache.set(clave, facetas, _config()['TIMEOUT_CACHE'])
+    return facetas
@@ -0,0 +1,52 @@
+"""
+Rangos de fechas semiabiertos [inicio, fin) en la zona horaria del negocio.
+
+Filtrar con `campo__gte=inicio, campo__lt=fin` deja la columna sin envolver en
+funciones (a diferencia de __date, __month o __year), de modo que la base de
+datos puede usar los índices que empiezan por ella.
+"""
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.utils import timezone
+
+
+ZONA_HORARIA_POR_DEFECTO = 'Europe/Madrid'
+
+
+def obtener_zona_horaria(nombre=None):
+    """ZoneInfo a partir de su nombre; la zona por defecto si no es válido"""
+    try:
+        return ZoneInfo(nombre or ZONA_HORARIA_POR_DEFECTO)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(ZONA_HORARIA_POR_DEFECTO)
+
+
+def inicio_dia(fecha, zona):
+    """Medianoche local de `fecha` como datetime aware"""
+    return datetime.combine(fecha, time.min, tzinfo=zona)
+
+
+def rango_dias(desde, hasta, zona):
+    """Del inicio de `desde` al inicio del día siguiente a `hasta`"""
+    return inicio_dia(desde, zona), inicio_dia(hasta + timedelta(days=1), zona)
+
+
+def rango_mes(año, mes, zona):
+    siguiente = (año + 1, 1) if mes == 12 else (año, mes + 1)
+    return (
+        datetime(año, mes, 1, tzinfo=zona),
+        datetime(*siguiente, 1, tzinfo=zona),
+    )
+
+
+def rango_año(año, zona):
+    return datetime(año, 1, 1, tzinfo=zona), datetime(año + 1, 1, 1, tzinfo=zona)
+
+
+def dia_actual(zona):
+    return timezone.now().astimezone(zona).date()
+
+
+def año_actual(zona):
+    return timezone.now().astimezone(zona).year
@@ -1,5 +1,15 @@
 import django_filters
-from django.db.models import Q
+from django.db.models import Exists, F, OuterRef, Q
+from datetime import datetime
+
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+
+from .apertura import q_abierto_dia, q_abierto_en, q_abierto_hoy
+from .coincidencia import filtrar_por_nombre, filtrar_por_prefijo_telefono
+from .fechas import año_actual, inicio_dia, obtener_zona_horaria, rango_año, rango_dias, rango_mes
+from .geo import caja_delimitadora, distancia_haversine
 from .models import (
     Usuario, CategoriaNegocio, Negocio, EmpleadoNegocio, 
     ServicioNegocio, HorarioNegocio, BloqueoHorario, Cita,
@@ -10,6 +20,7 @@ from .models import (
 class UsuarioFilter(django_filters.FilterSet):
     """Filtros para Usuario"""
     nombre = django_filters.CharFilter(method='filter_by_name', label='Nombre completo')
+    telefono = django_filters.CharFilter(method='filter_by_phone', label='Teléfono (prefijo)')
     ciudad_provincia = django_filters.CharFilter(method='filter_by_location', label='Ciudad o Provincia')
     fecha_registro_desde = django_filters.DateFilter(field_name='fecha_creacion', lookup_expr='gte')
     fecha_registro_hasta = django_filters.DateFilter(field_name='fecha_creacion', lookup_expr='lte')
@@ -26,12 +37,12 @@ class UsuarioFilter(django_filters.FilterSet):
         }
 
     def filter_by_name(self, queryset, name, value):
-        """Filtrar por nombre completo o partes del nombre"""
-        return queryset.filter(
-            Q(first_name__icontains=value) | 
-            Q(last_name__icontains=value) |
-            Q(username__icontains=value)
-        )
+        """Filtrar por nombre completo o partes del nombre, tolerando erratas"""
+        return filtrar_por_nombre(queryset, 'nombre_normalizado', value)
+
+    def filter_by_phone(self, queryset, name, value):
+        """Filtrar por prefijo del teléfono, ignorando espacios y prefijo +34"""
+        return filtrar_por_prefijo_telefono(queryset, 'telefono_normalizado', value)
 
     def filter_by_location(self, queryset, name, value):
         """Filtrar por ciudad o provincia"""
@@ -40,14 +51,34 @@ class UsuarioFilter(django_filters.FilterSet):
         )
 
 
+RADIO_POR_DEFECTO_KM = 10
+RADIO_MAXIMO_KM = 200
+
+
 class NegocioFilter(django_filters.FilterSet):
     """Filtros para Negocio"""
     nombre = django_filters.CharFilter(lookup_expr='icontains', label='Nombre del negocio')
     cerca_de = django_filters.CharFilter(method='filter_by_proximity', label='Cerca de (ciudad/provincia)')
+    lat = django_filters.NumberFilter(method='filter_by_distance', min_value=-90, max_value=90, label='Latitud')
+    lon = django_filters.NumberFilter(method='filter_by_distance', min_value=-180, max_value=180, label='Longitud')
+    radio_km = django_filters.NumberFilter(
+        method='filter_by_distance', min_value=0, max_value=RADIO_MAXIMO_KM,
+        label=f'Radio en km (por defecto {RADIO_POR_DEFECTO_KM})'
+    )
     precio_desde = django_filters.NumberFilter(method='filter_by_min_price', label='Precio mínimo de servicios')
     precio_hasta = django_filters.NumberFilter(method='filter_by_max_price', label='Precio máximo de servicios')
+    duracion_desde = django_filters.NumberFilter(field_name='duracion_max', lookup_expr='gte', label='Duración mínima de servicios')
+    duracion_hasta = django_filters.NumberFilter(field_name='duracion_min', lookup_expr='lte', label='Duración máxima de servicios')
     calificacion_minima = django_filters.NumberFilter(field_name='calificacion_promedio', lookup_expr='gte')
     con_disponibilidad = django_filters.BooleanFilter(method='filter_with_availability', label='Con disponibilidad hoy')
+    abierto_ahora = django_filters.BooleanFilter(method='filter_open_now', label='Abierto ahora')
+    abierto_en = django_filters.CharFilter(method='filter_open_at', label='Abierto en (fecha y hora ISO 8601)')
+    abierto_dia = django_filters.NumberFilter(
+        method='filter_open_on_weekday', min_value=0, max_value=6, label='Abierto el día (0=lunes)'
+    )
+    disponible_antes = django_filters.CharFilter(
+        method='filter_available_before', label='Con hueco libre antes de (fecha y hora ISO 8601)'
+    )
 
     class Meta:
         model = Negocio
@@ -68,26 +99,95 @@ class NegocioFilter(django_filters.FilterSet):
             Q(direccion__icontains=value)
         )
 
+    def filter_by_distance(self, queryset, name, value):
+        """
+        Negocios a menos de radio_km de (lat, lon), anotados con distancia_km.
+
+        lat, lon y radio_km comparten método: se aplica una sola vez, desde
+        `lat`, y solo si también llega `lon`.
+        """
+        datos = self.form.cleaned_data
+        lat, lon = datos.get('lat'), datos.get('lon')
+        if name != 'lat' or lat is None or lon is None:
+            return queryset
+
+        lat, lon = float(lat), float(lon)
+        radio = datos.get('radio_km')
+        radio = RADIO_POR_DEFECTO_KM if radio is None else float(radio)
+        if radio <= 0:
+            raise ValidationError({'radio_km': 'El radio debe ser mayor que 0'})
+        return queryset.filter(caja_delimitadora(lat, lon, radio)).annotate(
+            distancia_km=distancia_haversine(lat, lon)
+        ).filter(distancia_km__lte=radio)
+
     def filter_by_min_price(self, queryset, name, value):
         """Filtrar por precio mínimo de servicios"""
-        return queryset.filter(servicios__precio__gte=value).distinct()
+        return self.filter_by_price_range(queryset, value, self.form.cleaned_data.get('precio_hasta'))
 
     def filter_by_max_price(self, queryset, name, value):
         """Filtrar por precio máximo de servicios"""
-        return queryset.filter(servicios__precio__lte=value).distinct()
+        if self.form.cleaned_data.get('precio_desde') is not None:
+            # Ya aplicado junto con precio_desde en filter_by_min_price
+            return queryset
+        return self.filter_by_price_range(queryset, None, value)
+
+    def filter_by_price_range(self, queryset, desde, hasta):
+        """
+        Negocios con algún servicio activo dentro del rango de precios.
+
+        Con un solo extremo basta con precio_min/precio_max desnormalizados.
+        Con ambos, las columnas hacen de prefiltro indexado y un EXISTS
+        garantiza que un mismo servicio cumple los dos extremos.
+        """
+        if desde is not None:
+            queryset = queryset.filter(precio_max__gte=desde)
+        if hasta is not None:
+            queryset = queryset.filter(precio_min__lte=hasta)
+        if desde is not None and hasta is not None:
+            queryset = queryset.filter(Exists(ServicioNegocio.objects.filter(
+                negocio=OuterRef('pk'),
+                activo=True,
+                precio__gte=desde,
+                precio__lte=hasta,
+            )))
+        return queryset
 
     def filter_with_availability(self, queryset, name, value):
-        """Filtrar negocios con disponibilidad (simplificado)"""
+        """Filtrar negocios que abren hoy (día local de cada negocio)"""
         if value:
-            from django.utils import timezone
-            hoy = timezone.now().date()
-            dia_semana = hoy.weekday()
-            return queryset.filter(
-                horarios__dia_semana=dia_semana,
-                horarios__activo=True
-            ).distinct()
+            return queryset.filter(q_abierto_hoy())
         return queryset
 
+    def filter_open_now(self, queryset, name, value):
+        """Filtrar negocios abiertos (o cerrados) en este momento"""
+        condicion = q_abierto_en(timezone.now())
+        return queryset.filter(condicion if value else ~condicion)
+
+    def filter_open_at(self, queryset, name, value):
+        """
+        Filtrar negocios abiertos en un instante. Con zona horaria se convierte
+        a la hora local de cada negocio; sin ella se toma como hora local.
+        """
+        try:
+            instante = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValidationError({name: 'Fecha y hora inválida (ISO 8601)'})
+        return queryset.filter(q_abierto_en(instante))
+
+    def filter_open_on_weekday(self, queryset, name, value):
+        """Filtrar negocios que abren algún tramo del día de la semana"""
+        return queryset.filter(q_abierto_dia(int(value)))
+
+    def filter_available_before(self, queryset, name, value):
+        """Filtrar negocios cuyo próximo hueco libre empieza antes de un instante"""
+        try:
+            instante = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValidationError({name: 'Fecha y hora inválida (ISO 8601)'})
+        if timezone.is_naive(instante):
+            instante = timezone.make_aware(instante)
+        return queryset.filter(proxima_disponibilidad__lt=instante)
+
 
 class ServicioNegocioFilter(django_filters.FilterSet):
     """Filtros para ServicioNegocio"""
@@ -107,12 +207,29 @@ class ServicioNegocioFilter(django_filters.FilterSet):
         }
 
 
-class CitaFilter(django_filters.FilterSet):
+class ZonaHorariaFilterMixin:
+    """
+    Las fechas de los filtros se interpretan en la zona horaria del negocio
+    filtrado o, si no hay, en la del usuario.
+    """
+
+    def get_zona_horaria(self):
+        negocio = self.form.cleaned_data.get('negocio')
+        if negocio is not None:
+            return obtener_zona_horaria(negocio.zona_horaria)
+        usuario = getattr(self.request, 'user', None)
+        if usuario is not None and usuario.is_authenticated:
+            return obtener_zona_horaria(usuario.zona_horaria)
+        return obtener_zona_horaria()
+
+
+class CitaFilter(ZonaHorariaFilterMixin, django_filters.FilterSet):
     """Filtros para Cita"""
-    fecha_desde = django_filters.DateFilter(field_name='fecha_hora_inicio', lookup_expr='date__gte')
-    fecha_hasta = django_filters.DateFilter(field_name='fecha_hora_inicio', lookup_expr='date__lte')
-    mes = django_filters.NumberFilter(field_name='fecha_hora_inicio', lookup_expr='month')
-    año = django_filters.NumberFilter(field_name='fecha_hora_inicio', lookup_expr='year')
+    fecha_desde = django_filters.DateFilter(method='filter_by_date_range')
+    fecha_hasta = django_filters.DateFilter(method='filter_by_date_range')
+    mes = django_filters.NumberFilter(method='filter_by_month', min_value=1, max_value=12,
+                                      label='Mes (del año indicado o del actual)')
+    año = django_filters.NumberFilter(method='filter_by_year', min_value=1, max_value=9998)
     cliente_nombre = django_filters.CharFilter(lookup_expr='icontains', field_name='nombre_cliente')
     precio_desde = django_filters.NumberFilter(field_name='precio_final', lookup_expr='gte')
     precio_hasta = django_filters.NumberFilter(field_name='precio_final', lookup_expr='lte')
@@ -127,6 +244,28 @@ class CitaFilter(django_filters.FilterSet):
             'servicio': ['exact'],
         }
 
+    def filter_by_date_range(self, queryset, name, value):
+        """Filtrar por día local, ambos extremos incluidos"""
+        inicio, fin = rango_dias(value, value, self.get_zona_horaria())
+        if name == 'fecha_desde':
+            return queryset.filter(fecha_hora_inicio__gte=inicio)
+        return queryset.filter(fecha_hora_inicio__lt=fin)
+
+    def filter_by_month(self, queryset, name, value):
+        """Filtrar por mes; sin `año` se usa el año en curso"""
+        zona = self.get_zona_horaria()
+        año = self.form.cleaned_data.get('año')
+        inicio, fin = rango_mes(int(año) if año else año_actual(zona), int(value), zona)
+        return queryset.filter(fecha_hora_inicio__gte=inicio, fecha_hora_inicio__lt=fin)
+
+    def filter_by_year(self, queryset, name, value):
+        """Filtrar por año"""
+        if self.form.cleaned_data.get('mes'):
+            # Ya aplicado junto con mes en filter_by_month
+            return queryset
+        inicio, fin = rango_año(int(value), self.get_zona_horaria())
+        return queryset.filter(fecha_hora_inicio__gte=inicio, fecha_hora_inicio__lt=fin)
+
 
 class ReseñaNegocioFilter(django_filters.FilterSet):
     """Filtros para ReseñaNegocio"""
@@ -193,10 +332,10 @@ class HorarioNegocioFilter(django_filters.FilterSet):
         }
 
 
-class BloqueoHorarioFilter(django_filters.FilterSet):
+class BloqueoHorarioFilter(ZonaHorariaFilterMixin, django_filters.FilterSet):
     """Filtros para BloqueoHorario"""
-    fecha_desde = django_filters.DateFilter(field_name='fecha_inicio', lookup_expr='date__gte')
-    fecha_hasta = django_filters.DateFilter(field_name='fecha_fin', lookup_expr='date__lte')
+    fecha_desde = django_filters.DateFilter(method='filter_by_start_date')
+    fecha_hasta = django_filters.DateFilter(method='filter_by_end_date')
     activos_en_fecha = django_filters.DateFilter(method='filter_active_on_date')
 
     class Meta:
@@ -208,15 +347,22 @@ class BloqueoHorarioFilter(django_filters.FilterSet):
             'activo': ['exact'],
         }
 
+    def filter_by_start_date(self, queryset, name, value):
+        """Bloqueos que empiezan en la fecha indicada o después"""
+        return queryset.filter(fecha_inicio__gte=inicio_dia(value, self.get_zona_horaria()))
+
+    def filter_by_end_date(self, queryset, name, value):
+        """Bloqueos que terminan en la fecha indicada o antes"""
+        # fecha_fin es exclusiva: un bloqueo que acaba a medianoche acaba ese día
+        _, fin = rango_dias(value, value, self.get_zona_horaria())
+        return queryset.filter(fecha_fin__lte=fin)
+
     def filter_active_on_date(self, queryset, name, value):
         """Filtrar bloqueos activos en una fecha específica"""
-        from django.utils import timezone
-        fecha = timezone.make_aware(timezone.datetime.combine(value, timezone.datetime.min.time()))
-        fecha_fin = fecha.replace(hour=23, minute=59, second=59)
-        
+        inicio, fin = rango_dias(value, value, self.get_zona_horaria())
         return queryset.filter(
-            fecha_inicio__lte=fecha_fin,
-            fecha_fin__gte=fecha,
+            fecha_inicio__lt=fin,
+            fecha_fin__gt=inicio,
             activo=True
         )
 
@@ -244,4 +390,43 @@ class EmpleadoNegocioFilter(django_filters.FilterSet):
 
     def filter_by_specialty(self, queryset, name, value):
         """Filtrar por especialidad"""
-        return queryset.filter(especialidades__icontains=value)
\ No newline at end of file
+        return queryset.filter(especialidades__icontains=value)
+
+
+class RelevanciaOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter que, sin `ordering` explícito, ordena por las columnas de
+    relevancia de la vista (`ordering_relevancia`) que el queryset tenga
+    calculadas, p. ej. rango_busqueda tras una búsqueda de texto.
+    """
+
+    def get_campos_relevancia(self, queryset, view):
+        calculados = set(queryset.query.annotations) | set(queryset.query.extra_select)
+        return [
+            campo for campo in getattr(view, 'ordering_relevancia', ())
+            if campo.lstrip('-') in calculados
+        ]
+
+    def get_valid_fields(self, queryset, view, context={}):
+        validos = super().get_valid_fields(queryset, view, context)
+        campos = [campo.lstrip('-') for campo in self.get_campos_relevancia(queryset, view)]
+        return validos + [(campo, campo) for campo in campos]
+
+    def get_ordering(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param):
+            relevancia = self.get_campos_relevancia(queryset, view)
+            if relevancia:
+                return relevancia + list(self.get_default_ordering(view) or [])
+        return super().get_ordering(request, queryset, view)
+
+    def filter_queryset(self, request, queryset, view):
+        """Los campos de `ordering_nulos_al_final` dejan los nulos al final en ambos sentidos"""
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+        nulos = set(getattr(view, 'ordering_nulos_al_final', ()))
+        return queryset.order_by(*[
+            (F(campo[1:]).desc(nulls_last=True) if campo.startswith('-') else F(campo).asc(nulls_last=True))
+            if isinstance(campo, str) and campo.lstrip('-') in nulos else campo
+            for campo in ordering
+        ])
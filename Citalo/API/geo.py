@@ -0,0 +1,61 @@
+"""
+Búsqueda por proximidad sin PostGIS.
+
+Primero se acota con una caja delimitadora sobre el índice (latitud, longitud)
+y después se calcula la distancia exacta con la fórmula de haversine usando
+funciones matemáticas del ORM, disponibles en PostgreSQL y SQLite.
+"""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
+
+
+RADIO_TIERRA_KM = 6371.0088
+
+
+def caja_delimitadora(lat, lon, radio_km):
+    """
+    Devuelve un Q con la caja que contiene el círculo de `radio_km` alrededor
+    del punto. Cerca de los polos se usa toda la franja de longitudes y si la
+    caja cruza el antimeridiano se parte en dos rangos.
+    """
+    delta_lat = math.degrees(radio_km / RADIO_TIERRA_KM)
+    lat_min, lat_max = lat - delta_lat, lat + delta_lat
+    q = Q(latitud__gte=max(lat_min, -90), latitud__lte=min(lat_max, 90))
+
+    if lat_min <= -90 or lat_max >= 90:
+        return q & Q(longitud__isnull=False)
+
+    delta_lon = math.degrees(radio_km / (RADIO_TIERRA_KM * math.cos(math.radians(lat))))
+    lon_min, lon_max = lon - delta_lon, lon + delta_lon
+    if delta_lon >= 180:
+        return q & Q(longitud__isnull=False)
+    if lon_min < -180:
+        return q & (Q(longitud__gte=lon_min + 360) | Q(longitud__lte=lon_max))
+    if lon_max > 180:
+        return q & (Q(longitud__gte=lon_min) | Q(longitud__lte=lon_max - 360))
+    return q & Q(longitud__gte=lon_min, longitud__lte=lon_max)
+
+
+def distancia_haversine(lat, lon):
+    """Expresión con la distancia en km desde (lat, lon) a latitud/longitud"""
+    lat_fila = Radians(Cast(F('latitud'), FloatField()))
+    lon_fila = Radians(Cast(F('longitud'), FloatField()))
+    a = (
+        Power(Sin((lat_fila - Value(math.radians(lat))) / 2), 2)
+        + Value(math.cos(math.radians(lat))) * Cos(lat_fila)
+        * Power(Sin((lon_fila - Value(math.radians(lon))) / 2), 2)
+    )
+    # Least evita salir del dominio de ASin por errores de redondeo
+    return Value(2 * RADIO_TIERRA_KM) * ASin(Sqrt(Least(a, Value(1.0))))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distancia en km entre dos puntos, calculada en Python"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(a)))
@@ -0,0 +1,59 @@
+"""
+Índices en memoria por proceso.
+
+Cada proceso mantiene su copia y la actualiza con sus propios cambios; una
+versión guardada en la caché (que debe ser compartida entre procesos) avisa
+a los demás de que su copia ha quedado atrás y deben reconstruirla.
+"""
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+class IndiceEnMemoria:
+    """Base de los índices en memoria sincronizados por versión"""
+
+    def __init__(self):
+        self.version = None
+        self.lock = threading.RLock()
+
+    @property
+    def clave_version(self):
+        raise NotImplementedError
+
+    def reconstruir(self):
+        raise NotImplementedError
+
+    def version_compartida(self):
+        cache.add(self.clave_version, 0, None)
+        return cache.get(self.clave_version, 0)
+
+    def sincronizar(self):
+        version = self.version_compartida()
+        if version != self.version:
+            with self.lock:
+                self.reconstruir()
+                self.version = version
+
+    def registrar_cambio(self, aplicar):
+        """Aplica el cambio cuando la transacción en curso se confirma"""
+        transaction.on_commit(lambda: self.aplicar_cambio(aplicar))
+
+    def aplicar_cambio(self, aplicar):
+        """
+        Sube la versión compartida y aplica el cambio en la copia local solo
+        si la nueva versión es justo la siguiente a la suya, es decir, si
+        ningún otro proceso ha subido la versión entretanto. Si no, la copia
+        local queda desfasada y se reconstruirá entera en la próxima consulta.
+        """
+        try:
+            version = cache.incr(self.clave_version)
+        except ValueError:
+            cache.add(self.clave_version, 0, None)
+            version = cache.incr(self.clave_version)
+        with self.lock:
+            if self.version is None or version != self.version + 1:
+                return
+            aplicar()
+            self.version = version
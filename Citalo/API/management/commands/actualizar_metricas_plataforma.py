@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from API.metricas import actualizar_metricas
+
+
+class Command(BaseCommand):
+    help = (
+        'Actualiza las métricas globales de la plataforma (suscripciones, MRR, citas por día '
+        'y categorías y ciudades con más citas). Ejecutar periódicamente, p. ej. cada hora.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo', action='store_true',
+            help='Recalcula las citas de todos los días, no solo las recientes'
+        )
+
+    def handle(self, *args, **options):
+        cambiadas = actualizar_metricas(completo=options['completo'])
+        self.stdout.write(self.style.SUCCESS(f'{cambiadas} métricas actualizadas'))
@@ -0,0 +1,108 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from API.estadisticas import ESTADOS_CANCELADA, calcular_estadisticas
+from API.models import CategoriaNegocio, Cita, Negocio, ServicioNegocio, Usuario
+from API.resumenes import reconstruir
+
+
+ESTADOS = ['pendiente', 'confirmada', 'completada', 'completada', 'cancelada_cliente', 'cancelada_negocio']
+
+
+def estadisticas_por_consultas(negocio):
+    """Cálculo anterior (una consulta por métrica), solo como referencia"""
+    hoy = timezone.now().date()
+    citas = negocio.citas.all()
+    citas_mes = citas.filter(fecha_hora_inicio__date__gte=hoy.replace(day=1))
+    return {
+        'total_citas': citas.count(),
+        'citas_pendientes': citas.filter(estado='pendiente').count(),
+        'citas_confirmadas': citas.filter(estado='confirmada').count(),
+        'citas_completadas': citas.filter(estado='completada').count(),
+        'citas_canceladas': citas.filter(estado__in=ESTADOS_CANCELADA).count(),
+        'ingresos_mes_actual': citas_mes.filter(estado='completada').aggregate(
+            total=Sum('precio_final'))['total'] or Decimal('0'),
+        'total_clientes': citas.values('cliente').distinct().count(),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el cálculo de estadísticas de negocio sobre el resumen diario con el '
+        'anterior (una consulta por métrica) sobre datos sintéticos. Los datos se '
+        'crean en una transacción que se deshace al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--citas', type=int, default=100000, help='Citas del negocio de prueba')
+        parser.add_argument('--clientes', type=int, default=2000)
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def medir(self, nombre, funcion, repeticiones):
+        with CaptureQueriesContext(connection) as consultas:
+            funcion()
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = perf_counter()
+            funcion()
+            tiempos.append((perf_counter() - inicio) * 1000)
+        self.stdout.write(
+            f'{nombre}: {len(consultas)} consultas, mediana {sorted(tiempos)[len(tiempos) // 2]:.1f} ms'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            negocio = self.crear_datos(options['citas'], options['clientes'])
+            repeticiones = options['repeticiones']
+            self.medir('Resumen diario', lambda: calcular_estadisticas(negocio), repeticiones)
+            hoy = timezone.localdate()
+            self.medir(
+                'Resumen diario (últimos 90 días)',
+                lambda: calcular_estadisticas(negocio, hoy - timedelta(days=90), hoy),
+                repeticiones,
+            )
+            self.medir(
+                'Resumen diario (clientes exactos)',
+                lambda: calcular_estadisticas(negocio, exacto=True),
+                repeticiones,
+            )
+            self.medir('Una consulta por métrica', lambda: estadisticas_por_consultas(negocio), repeticiones)
+            transaction.set_rollback(True)
+
+    def crear_datos(self, total_citas, total_clientes):
+        self.stdout.write(f'Creando {total_citas} citas de {total_clientes} clientes...')
+        propietario = Usuario.objects.create_user(username='benchmark_propietario', tipo_usuario='negocio')
+        categoria = CategoriaNegocio.objects.create(nombre='Benchmark')
+        negocio = Negocio.objects.create(
+            propietario=propietario, categoria=categoria, nombre='Benchmark', slug='benchmark-estadisticas',
+            telefono='600000000', email='benchmark@example.com', direccion='Benchmark', ciudad='Madrid'
+        )
+        servicio = ServicioNegocio.objects.create(
+            negocio=negocio, nombre='Servicio', duracion_minutos=30, precio=Decimal('20.00')
+        )
+        clientes = Usuario.objects.bulk_create([
+            Usuario(username=f'benchmark_cliente_{i}', tipo_usuario='cliente') for i in range(total_clientes)
+        ])
+
+        ahora = timezone.now()
+        citas = []
+        for _ in range(total_citas):
+            inicio = ahora - timedelta(minutes=random.randrange(0, 3 * 365 * 24 * 60))
+            citas.append(Cita(
+                negocio=negocio, cliente=random.choice(clientes), servicio=servicio,
+                fecha_hora_inicio=inicio, fecha_hora_fin=inicio + timedelta(minutes=30),
+                estado=random.choice(ESTADOS), precio_final=servicio.precio,
+                nombre_cliente='Cliente', telefono_cliente='600000000', email_cliente='cliente@example.com',
+            ))
+        Cita.objects.bulk_create(citas, batch_size=5000)
+        # bulk_create no dispara las señales que mantienen el resumen
+        reconstruir([negocio.pk])
+        return negocio
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from API.valoraciones import reconstruir_valoraciones
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula desde las reseñas activas los contadores de valoraciones y la '
+        'calificación media de los negocios (reparación tras cambios masivos).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--negocio', action='append', dest='negocios', help='Solo este negocio (repetible)')
+
+    def handle(self, *args, **options):
+        corregidos = reconstruir_valoraciones(options['negocios'])
+        self.stdout.write(self.style.SUCCESS(f'{corregidos} negocios corregidos'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from API.apertura import calcular_mascara
+from API.fechas import dia_actual, obtener_zona_horaria
+from API.models import HorarioNegocio, Negocio
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula la máscara semanal de apertura de los negocios. Ejecutar a diario '
+        'para aplicar los horarios con fechas de vigencia.'
+    )
+
+    def handle(self, *args, **options):
+        horarios = {}
+        for horario in HorarioNegocio.objects.all():
+            horarios.setdefault(horario.negocio_id, []).append(horario)
+
+        actualizados = 0
+        for negocio in Negocio.objects.only('pk', 'zona_horaria', 'mascara_apertura', 'dias_apertura').iterator():
+            hoy = dia_actual(obtener_zona_horaria(negocio.zona_horaria))
+            mascara, dias = calcular_mascara(horarios.get(negocio.pk, []), hoy)
+            if (mascara, dias) != (negocio.mascara_apertura, negocio.dias_apertura):
+                Negocio.objects.filter(pk=negocio.pk).update(
+                    mascara_apertura=mascara, dias_apertura=dias, fecha_actualizacion=timezone.now()
+                )
+                actualizados += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{actualizados} negocios actualizados'))
@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from API.disponibilidad import actualizar_proxima_disponibilidad
+from API.models import Negocio
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula el próximo hueco libre de los negocios cuyo valor ha vencido o '
+        'que no tenían hueco en el horizonte. Ejecutar cada pocos minutos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true', help='Recalcular todos los negocios activos')
+
+    def handle(self, *args, **options):
+        ahora = timezone.now()
+        negocios = Negocio.objects.filter(activo=True, horarios__isnull=False).distinct().values_list(
+            'pk', 'proxima_disponibilidad', 'tiempo_anticipacion_minimo'
+        )
+
+        actualizados = 0
+        for pk, anterior, anticipacion in negocios.iterator():
+            # Vigente: el hueco sigue fuera de la antelación mínima
+            vigente = anterior is not None and anterior >= ahora + timedelta(minutes=anticipacion)
+            if vigente and not options['todos']:
+                continue
+            if actualizar_proxima_disponibilidad(pk, ahora) != anterior:
+                actualizados += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{actualizados} negocios actualizados'))
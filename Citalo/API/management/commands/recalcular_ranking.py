@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from API.ranking import reconstruir_ranking
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula la media global de calificaciones y la puntuación de ranking de '
+        'todos los negocios (decaimiento por recencia). Ejecutar a diario.'
+    )
+
+    def handle(self, *args, **options):
+        cambiados = reconstruir_ranking()
+        self.stdout.write(self.style.SUCCESS(f'{cambiados} negocios actualizados'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from API.resumenes import reconstruir
+
+
+class Command(BaseCommand):
+    help = 'Regenera el resumen diario de citas, los sketches de clientes y las visitas por cliente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--negocio', action='append', dest='negocios', help='Solo este negocio (repetible)')
+
+    def handle(self, *args, **options):
+        filas = reconstruir(options['negocios'])
+        self.stdout.write(self.style.SUCCESS(f'{filas} filas de resumen generadas'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from API.busqueda import obtener_motor
+from API.models import Negocio
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de texto completo de negocios'
+
+    def handle(self, *args, **options):
+        motor = obtener_motor()
+        if not motor.soportado:
+            self.stdout.write(self.style.WARNING(
+                'La base de datos no tiene motor de texto completo; se usa icontains'
+            ))
+            return
+
+        motor.eliminar_estructuras()
+        motor.crear_estructuras()
+        negocios = Negocio.objects.select_related('categoria')
+        motor.reconstruir(negocios.iterator())
+        self.stdout.write(self.style.SUCCESS(f'{negocios.count()} negocios indexados'))
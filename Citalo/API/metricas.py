@@ -0,0 +1,175 @@
+"""
+Métricas globales de la plataforma para el panel de administración.
+
+Calcularlas al vuelo recorre las tablas más grandes, así que el comando
+programado `actualizar_metricas_plataforma` las materializa en
+MetricaPlataforma y tanto el endpoint como el admin leen solo de ahí:
+
+- suscripciones: negocios por estado_suscripcion (foto del día).
+- mrr: ingresos recurrentes mensuales por moneda de las facturas pagadas
+  cuyo periodo [inicio, fin) incluye el día, prorrateadas a un mes (foto).
+- citas: citas por día y estado, sumadas de ResumenDiarioCitas.
+- categoria / ciudad: las LIMITE_TOP con más citas en curso o completadas
+  en los últimos VENTANA_TOP_DIAS días (foto).
+
+La actualización es incremental: las citas se recalculan desde MARGEN_DIAS
+días antes de la última foto (los días anteriores ya no cambian; `--completo`
+recoge correcciones) y solo se escriben las filas que cambian.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .models import FacturacionSuscripcion, MetricaPlataforma, Negocio, ResumenDiarioCitas
+
+
+TIPOS_FOTO = ('suscripciones', 'mrr', 'categoria', 'ciudad')
+ESTADOS_EFECTIVOS = ('pendiente', 'confirmada', 'en_curso', 'completada')
+MARGEN_DIAS = 7
+VENTANA_TOP_DIAS = 30
+LIMITE_TOP = 10
+DIAS_POR_DEFECTO = 30
+MAXIMO_DIAS = 366
+CENTIMO = Decimal('0.01')
+
+
+def meses_periodo(inicio, fin):
+    return max(round((fin - inicio).days / 30.4), 1)
+
+
+def contar_suscripciones():
+    return dict(Negocio.objects.order_by().values_list('estado_suscripcion').annotate(total=Count('pk')))
+
+
+def calcular_mrr(hoy):
+    totales = defaultdict(Decimal)
+    for moneda, monto, inicio, fin in FacturacionSuscripcion.objects.filter(
+        estado_pago='pagado', periodo_inicio__lte=hoy, periodo_fin__gt=hoy
+    ).values_list('moneda', 'monto', 'periodo_inicio', 'periodo_fin'):
+        totales[moneda] += monto / meses_periodo(inicio, fin)
+    return {moneda: total.quantize(CENTIMO) for moneda, total in totales.items()}
+
+
+def top_citas(campo, hoy):
+    """Las LIMITE_TOP claves de `campo` con más citas de la ventana"""
+    return dict(
+        ResumenDiarioCitas.objects.filter(
+            fecha__gt=hoy - timedelta(days=VENTANA_TOP_DIAS), fecha__lte=hoy, estado__in=ESTADOS_EFECTIVOS
+        )
+        .order_by()
+        .values_list(campo)
+        .annotate(total=Sum('total'))
+        .filter(total__gt=0)
+        .order_by('-total', campo)[:LIMITE_TOP]
+    )
+
+
+def citas_por_dia(desde=None):
+    """{(fecha, estado): total} de todos los negocios desde `desde` (o desde el principio)"""
+    filas = ResumenDiarioCitas.objects.order_by()
+    if desde is not None:
+        filas = filas.filter(fecha__gte=desde)
+    return {
+        (fecha, estado): total
+        for fecha, estado, total in filas.values_list('fecha', 'estado').annotate(total=Sum('total'))
+        if total
+    }
+
+
+def guardar(actuales, existentes, ahora):
+    """
+    Deja en `existentes` (queryset) las métricas `actuales`
+    {(fecha, tipo, clave): valor}: borra las que sobran y crea o actualiza solo
+    las que cambian. Devuelve cuántas filas cambian.
+    """
+    guardadas = {
+        (fecha, tipo, clave): (pk, valor)
+        for pk, fecha, tipo, clave, valor in existentes.values_list('pk', 'fecha', 'tipo', 'clave', 'valor')
+    }
+    sobran = [pk for metrica, (pk, _) in guardadas.items() if metrica not in actuales]
+    cambios = [
+        MetricaPlataforma(fecha=fecha, tipo=tipo, clave=clave, valor=valor, fecha_actualizacion=ahora)
+        for (fecha, tipo, clave), valor in actuales.items()
+        if guardadas.get((fecha, tipo, clave), (None, None))[1] != valor
+    ]
+    with transaction.atomic():
+        MetricaPlataforma.objects.filter(pk__in=sobran).delete()
+        MetricaPlataforma.objects.bulk_create(
+            cambios, batch_size=1000, update_conflicts=True,
+            unique_fields=['fecha', 'tipo', 'clave'], update_fields=['valor', 'fecha_actualizacion'],
+        )
+    return len(sobran) + len(cambios)
+
+
+def actualizar_metricas(hoy=None, completo=False):
+    """Materializa la foto de `hoy` y las citas por día; devuelve cuántas filas cambian"""
+    hoy = hoy or timezone.localdate()
+    metricas = MetricaPlataforma.objects.order_by()
+    ultima = None
+    if not completo:
+        ultima = metricas.filter(tipo__in=TIPOS_FOTO).aggregate(ultima=Max('fecha'))['ultima']
+    desde = min(ultima, hoy) - timedelta(days=MARGEN_DIAS) if ultima else None
+
+    foto = {
+        'suscripciones': contar_suscripciones(),
+        'mrr': calcular_mrr(hoy),
+        'categoria': top_citas('negocio__categoria__nombre', hoy),
+        'ciudad': top_citas('negocio__ciudad', hoy),
+    }
+    actuales = {
+        (hoy, tipo, clave): Decimal(valor).quantize(CENTIMO)
+        for tipo, valores in foto.items() for clave, valor in valores.items()
+    }
+    actuales.update({
+        (fecha, 'citas', estado): Decimal(total).quantize(CENTIMO)
+        for (fecha, estado), total in citas_por_dia(desde).items()
+    })
+
+    ambito_citas = Q(tipo='citas') if desde is None else Q(tipo='citas', fecha__gte=desde)
+    existentes = metricas.filter(Q(fecha=hoy, tipo__in=TIPOS_FOTO) | ambito_citas)
+    return guardar(actuales, existentes, timezone.now())
+
+
+def leer_metricas(hoy=None, dias=DIAS_POR_DEFECTO):
+    """Panel de la última foto hasta `hoy` y las citas de los últimos `dias` días (dos consultas)"""
+    hoy = hoy or timezone.localdate()
+    desde = hoy - timedelta(days=dias - 1)
+    metricas = MetricaPlataforma.objects.order_by()
+    ultima = metricas.aggregate(
+        foto=Max('fecha', filter=Q(tipo__in=TIPOS_FOTO, fecha__lte=hoy)),
+        actualizada=Max('fecha_actualizacion'),
+    )
+
+    suscripciones = {estado: 0 for estado, _ in Negocio.ESTADO_SUSCRIPCION_CHOICES}
+    mrr, tops = {}, {'categoria': [], 'ciudad': []}
+    citas = defaultdict(dict)
+    for fecha, tipo, clave, valor in metricas.filter(
+        Q(tipo__in=TIPOS_FOTO, fecha=ultima['foto']) | Q(tipo='citas', fecha__gte=desde, fecha__lte=hoy)
+    ).values_list('fecha', 'tipo', 'clave', 'valor'):
+        if tipo == 'suscripciones':
+            suscripciones[clave] = int(valor)
+        elif tipo == 'mrr':
+            mrr[clave] = valor
+        elif tipo == 'citas':
+            citas[fecha][clave] = int(valor)
+        else:
+            tops[tipo].append({'nombre': clave, 'citas': int(valor)})
+
+    for filas in tops.values():
+        filas.sort(key=lambda fila: (-fila['citas'], fila['nombre']))
+    return {
+        'fecha': ultima['foto'],
+        'fecha_actualizacion': ultima['actualizada'],
+        'suscripciones': suscripciones,
+        'mrr': mrr,
+        'citas_por_dia': [
+            {'fecha': fecha, 'total': sum(citas[fecha].values()), 'estados': citas[fecha]}
+            for fecha in (desde + timedelta(days=n) for n in range(dias))
+        ],
+        'top_categorias': tops['categoria'],
+        'top_ciudades': tops['ciudad'],
+    }
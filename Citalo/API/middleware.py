@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se negocia gzip
+    brotli = None
+
+
+CONFIGURACION_POR_DEFECTO = {
+    'TAMANO_MINIMO': 1024,
+    'NIVEL_GZIP': 6,
+    'NIVEL_BROTLI': 5,
+    'TIPOS_CONTENIDO': ('application/json', 'text/'),
+    'CACHE': 'default',
+    'TIMEOUT_CACHE': 300,
+}
+
+
+def parsear_accept_encoding(cabecera):
+    """Devuelve un dict {codificacion: q} a partir de la cabecera Accept-Encoding"""
+    preferencias = {}
+    for parte in cabecera.split(','):
+        trozos = [trozo.strip() for trozo in parte.split(';')]
+        codificacion = trozos[0].lower()
+        if not codificacion:
+            continue
+        q = 1.0
+        for parametro in trozos[1:]:
+            if parametro.startswith('q='):
+                try:
+                    q = float(parametro[2:])
+                except ValueError:
+                    q = 0.0
+        preferencias[codificacion] = q
+    return preferencias
+
+
+class CompresionRespuestaMiddleware:
+    """
+    Comprime respuestas con brotli o gzip según Accept-Encoding.
+
+    Solo comprime cuerpos por encima de TAMANO_MINIMO. Si la respuesta trae un
+    ETag (ver ConditionalGetMixin), el cuerpo comprimido se guarda en caché con
+    ese ETag como clave, de modo que las respuestas repetidas no se vuelven a
+    comprimir en cada petición.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = {
+            **CONFIGURACION_POR_DEFECTO,
+            **getattr(settings, 'COMPRESION_RESPUESTAS', {}),
+        }
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def elegir_codificacion(self, request):
+        preferencias = parsear_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        comodin = preferencias.get('*', 0.0)
+        candidatas = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+        mejor, mejor_q = None, 0.0
+        for codificacion in candidatas:
+            q = preferencias.get(codificacion, comodin)
+            if q > mejor_q:
+                mejor, mejor_q = codificacion, q
+        return mejor
+
+    def comprimir(self, contenido, codificacion):
+        if codificacion == 'br':
+            return brotli.compress(contenido, quality=self.config['NIVEL_BROTLI'])
+        return gzip.compress(contenido, compresslevel=self.config['NIVEL_GZIP'], mtime=0)
+
+    def comprimir_con_cache(self, request, response, codificacion):
+        etag = response.get('ETag')
+        if not etag:
+            return self.comprimir(response.content, codificacion)
+
+        huella = hashlib.md5(f'{request.path}|{etag}'.encode('utf-8')).hexdigest()
+        clave = f'compresion:{codificacion}:{huella}'
+        cache = caches[self.config['CACHE']]
+        contenido = cache.get(clave)
+        if contenido is None:
+            contenido = self.comprimir(response.content, codificacion)
+            cache.set(clave, contenido, self.config['TIMEOUT_CACHE'])
+        return contenido
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+
+        if len(response.content) < self.config['TAMANO_MINIMO']:
+            return response
+
+        tipo_contenido = response.get('Content-Type', '')
+        if not tipo_contenido.startswith(tuple(self.config['TIPOS_CONTENIDO'])):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        codificacion = self.elegir_codificacion(request)
+        if codificacion is None:
+            return response
+
+        contenido = self.comprimir_con_cache(request, response, codificacion)
+        if len(contenido) >= len(response.content):
+            return response
+
+        response.content = contenido
+        response.headers['Content-Length'] = str(len(contenido))
+        response.headers['Content-Encoding'] = codificacion
+
+        # El cuerpo comprimido es otra representación: el ETag pasa a ser débil
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+
+        return response
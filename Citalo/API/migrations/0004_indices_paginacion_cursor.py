@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0003_categoria_servicio_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha_hora_inicio', 'id'], name='citas_fecha_h_d69db9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['cliente', 'fecha_hora_inicio', 'id'], name='citas_cliente_c0bc19_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='citas_fecha_c_ab8fa6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facturacionsuscripcion',
+            index=models.Index(fields=['negocio', 'fecha_creacion', 'id'], name='facturacion_negocio_ba758b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reseñanegocio',
+            index=models.Index(fields=['negocio', 'fecha_creacion', 'id'], name='reseñas_neg_negocio_59c357_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reseñanegocio',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='reseñas_neg_fecha_c_542632_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:57
+
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+
+def calcular_rangos(apps, schema_editor):
+    Negocio = apps.get_model('API', 'Negocio')
+    ServicioNegocio = apps.get_model('API', 'ServicioNegocio')
+    rangos = (
+        ServicioNegocio.objects.filter(activo=True)
+        .values('negocio_id')
+        .annotate(
+            precio_min=Min('precio'),
+            precio_max=Max('precio'),
+            duracion_min=Min('duracion_minutos'),
+            duracion_max=Max('duracion_minutos'),
+        )
+    )
+    for rango in rangos:
+        negocio_id = rango.pop('negocio_id')
+        Negocio.objects.filter(pk=negocio_id).update(**rango)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0004_indices_paginacion_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='negocio',
+            name='duracion_max',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='duracion_min',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='precio_max',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='precio_min',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='negocio',
+            index=models.Index(fields=['precio_min'], name='negocios_precio__28c20c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='negocio',
+            index=models.Index(fields=['precio_max'], name='negocios_precio__f9b1dc_idx'),
+        ),
+        migrations.RunPython(calcular_rangos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,115 @@
+import unicodedata
+from collections import defaultdict
+
+from django.db import migrations
+
+
+# Copia congelada de la lógica de API.busqueda en esta migración: los cambios
+# posteriores del módulo no deben alterar lo que hace al aplicarse.
+TABLA_FTS = 'negocios_busqueda'
+COLUMNA_TSVECTOR = 'busqueda'
+PARTES_DOCUMENTO = ('nombre', 'servicios', 'categoria', 'resto')
+PESOS_POSTGRES = dict(zip(PARTES_DOCUMENTO, 'ABCD'))
+
+
+def normalizar(texto):
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def raiz(token):
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith('ces'):
+        token = token[:-3] + 'z'
+    elif token.endswith('es') and len(token) > 4:
+        token = token[:-2]
+    elif token.endswith('s'):
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in 'aeo':
+        token = token[:-1]
+    return token
+
+
+def documento_negocio(negocio, nombres_servicios):
+    categoria = negocio.categoria
+    return {
+        'nombre': normalizar(negocio.nombre),
+        'servicios': normalizar(' '.join(nombres_servicios)),
+        'categoria': normalizar(categoria.nombre if categoria else ''),
+        'resto': normalizar(' '.join([negocio.descripcion, negocio.ciudad, negocio.direccion])),
+    }
+
+
+def guardar_postgres(cursor, tabla, negocio_pk, documento):
+    vector = ' || '.join(
+        f"setweight(to_tsvector('spanish', %s), '{PESOS_POSTGRES[parte]}')"
+        for parte in PARTES_DOCUMENTO
+    )
+    cursor.execute(
+        f'UPDATE {tabla} SET {COLUMNA_TSVECTOR} = {vector} WHERE id = %s',
+        [documento[parte] for parte in PARTES_DOCUMENTO] + [negocio_pk],
+    )
+
+
+def guardar_sqlite(cursor, tabla, negocio_pk, documento):
+    valores = [
+        ' '.join(raiz(token) for token in documento[parte].split())
+        for parte in PARTES_DOCUMENTO
+    ]
+    # Django guarda los UUID en SQLite como 32 caracteres hexadecimales
+    cursor.execute(
+        f'INSERT INTO {TABLA_FTS} (negocio_id, {", ".join(PARTES_DOCUMENTO)}) '
+        f'VALUES (%s, %s, %s, %s, %s)',
+        [negocio_pk.hex] + valores,
+    )
+
+
+def crear_indice(apps, schema_editor):
+    Negocio = apps.get_model('API', 'Negocio')
+    ServicioNegocio = apps.get_model('API', 'ServicioNegocio')
+    conexion = schema_editor.connection
+    tabla = conexion.ops.quote_name(Negocio._meta.db_table)
+
+    if conexion.vendor == 'postgresql':
+        schema_editor.execute(f'ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS {COLUMNA_TSVECTOR} tsvector')
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS negocios_busqueda_gin ON {tabla} USING GIN ({COLUMNA_TSVECTOR})'
+        )
+        guardar = guardar_postgres
+    elif conexion.vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5('
+            f"negocio_id UNINDEXED, {', '.join(PARTES_DOCUMENTO)}, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        guardar = guardar_sqlite
+    else:
+        return
+
+    servicios = defaultdict(list)
+    for negocio_id, nombre in ServicioNegocio.objects.filter(activo=True).values_list('negocio_id', 'nombre'):
+        servicios[negocio_id].append(nombre)
+    with conexion.cursor() as cursor:
+        for negocio in Negocio.objects.select_related('categoria'):
+            guardar(cursor, tabla, negocio.pk, documento_negocio(negocio, servicios[negocio.pk]))
+
+
+def eliminar_indice(apps, schema_editor):
+    conexion = schema_editor.connection
+    if conexion.vendor == 'postgresql':
+        tabla = conexion.ops.quote_name(apps.get_model('API', 'Negocio')._meta.db_table)
+        schema_editor.execute('DROP INDEX IF EXISTS negocios_busqueda_gin')
+        schema_editor.execute(f'ALTER TABLE {tabla} DROP COLUMN IF EXISTS {COLUMNA_TSVECTOR}')
+    elif conexion.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLA_FTS}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0005_rangos_precio_duracion_negocio'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0006_indice_busqueda_negocios'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='negocio',
+            index=models.Index(fields=['latitud', 'longitud'], name='negocios_latitud_e2e6e4_idx'),
+        ),
+    ]
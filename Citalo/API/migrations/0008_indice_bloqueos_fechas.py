@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0007_indice_ubicacion_negocio'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bloqueohorario',
+            index=models.Index(fields=['negocio', 'fecha_inicio', 'fecha_fin'], name='bloqueos_ho_negocio_84d859_idx'),
+        ),
+    ]
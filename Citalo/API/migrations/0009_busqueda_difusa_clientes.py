@@ -0,0 +1,115 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:10
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Copia congelada de la normalización de API.coincidencia en esta migración
+PREFIJOS_INTERNACIONALES = ('0034', '+34')
+TAMAÑO_LOTE = 2000
+
+
+def normalizar_nombre(*partes):
+    descompuesto = unicodedata.normalize('NFKD', ' '.join(p for p in partes if p))
+    texto = ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', texto))
+
+
+def normalizar_telefono(telefono):
+    telefono = (telefono or '').strip()
+    for prefijo in PREFIJOS_INTERNACIONALES:
+        if telefono.startswith(prefijo):
+            telefono = telefono[len(prefijo):]
+            break
+    return re.sub(r'\D', '', telefono)
+
+
+INDICES_TRIGRAMAS = (
+    ('usuarios_nombre_trgm', 'usuarios', 'nombre_normalizado'),
+    ('citas_nombre_cliente_trgm', 'citas', 'nombre_cliente_normalizado'),
+)
+
+
+def actualizar_por_lotes(queryset, campos, calcular):
+    """Recorre el queryset por pk en lotes y guarda `campos` de cada lote"""
+    lote = list(queryset.order_by('pk')[:TAMAÑO_LOTE])
+    while lote:
+        for objeto in lote:
+            calcular(objeto)
+        queryset.model.objects.bulk_update(lote, campos)
+        lote = list(queryset.filter(pk__gt=lote[-1].pk).order_by('pk')[:TAMAÑO_LOTE])
+
+
+def normalizar_usuario(usuario):
+    usuario.nombre_normalizado = normalizar_nombre(usuario.first_name, usuario.last_name, usuario.username)
+    usuario.telefono_normalizado = normalizar_telefono(usuario.telefono)
+
+
+def normalizar_cita(cita):
+    cita.nombre_cliente_normalizado = normalizar_nombre(cita.nombre_cliente)
+    cita.telefono_cliente_normalizado = normalizar_telefono(cita.telefono_cliente)
+
+
+def normalizar_existentes(apps, schema_editor):
+    Usuario = apps.get_model('API', 'Usuario')
+    Cita = apps.get_model('API', 'Cita')
+
+    actualizar_por_lotes(
+        Usuario.objects.only('first_name', 'last_name', 'username', 'telefono'),
+        ['nombre_normalizado', 'telefono_normalizado'], normalizar_usuario,
+    )
+    actualizar_por_lotes(
+        Cita.objects.only('nombre_cliente', 'telefono_cliente'),
+        ['nombre_cliente_normalizado', 'telefono_cliente_normalizado'], normalizar_cita,
+    )
+
+
+def crear_indices_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for nombre, tabla, columna in INDICES_TRIGRAMAS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} USING GIN ({columna} gin_trgm_ops)'
+        )
+
+
+def eliminar_indices_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, _, _ in INDICES_TRIGRAMAS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0008_indice_bloqueos_fechas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cita',
+            name='nombre_cliente_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='cita',
+            name='telefono_cliente_normalizado',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='nombre_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=320),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='telefono_normalizado',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.RunPython(normalizar_existentes, migrations.RunPython.noop),
+        migrations.RunPython(crear_indices_trigramas, eliminar_indices_trigramas),
+    ]
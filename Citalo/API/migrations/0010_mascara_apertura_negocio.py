@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:18
+
+from collections import defaultdict
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Copia congelada de API.apertura.calcular_mascara en esta migración
+CUARTOS_POR_DIA = 96
+CUARTOS_POR_SEMANA = 7 * CUARTOS_POR_DIA
+MASCARA_CERRADO = '0' * CUARTOS_POR_SEMANA
+
+
+def cuarto(hora, redondear_arriba=False):
+    minutos = hora.hour * 60 + hora.minute + (1 if hora.second or hora.microsecond else 0)
+    indice, resto = divmod(minutos, 15)
+    return indice + 1 if redondear_arriba and resto else indice
+
+
+def horario_vigente(horario, fecha):
+    if not horario.activo:
+        return False
+    if horario.fecha_inicio_vigencia and fecha < horario.fecha_inicio_vigencia:
+        return False
+    if horario.fecha_fin_vigencia and fecha > horario.fecha_fin_vigencia:
+        return False
+    return True
+
+
+def calcular_mascara(horarios, fecha):
+    mascara = bytearray(MASCARA_CERRADO, 'ascii')
+    for horario in horarios:
+        if not horario_vigente(horario, fecha):
+            continue
+        base = horario.dia_semana * CUARTOS_POR_DIA
+        inicio = base + cuarto(horario.hora_inicio, redondear_arriba=True)
+        fin = base + cuarto(horario.hora_fin)
+        if horario.hora_fin <= horario.hora_inicio:
+            fin += CUARTOS_POR_DIA
+        for i in range(inicio, fin):
+            mascara[i % CUARTOS_POR_SEMANA] = ord('1')
+
+    mascara = mascara.decode('ascii')
+    dias = 0
+    for dia in range(7):
+        if '1' in mascara[dia * CUARTOS_POR_DIA:(dia + 1) * CUARTOS_POR_DIA]:
+            dias |= 1 << dia
+    return mascara, dias
+
+
+def fecha_local(nombre_zona):
+    try:
+        zona = ZoneInfo(nombre_zona or 'Europe/Madrid')
+    except (ZoneInfoNotFoundError, ValueError):
+        zona = ZoneInfo('Europe/Madrid')
+    return timezone.now().astimezone(zona).date()
+
+
+def calcular_mascaras(apps, schema_editor):
+    Negocio = apps.get_model('API', 'Negocio')
+    HorarioNegocio = apps.get_model('API', 'HorarioNegocio')
+    horarios = defaultdict(list)
+    for horario in HorarioNegocio.objects.all():
+        horarios[horario.negocio_id].append(horario)
+    zonas = dict(Negocio.objects.filter(pk__in=horarios).values_list('pk', 'zona_horaria'))
+    for negocio_id, del_negocio in horarios.items():
+        mascara, dias = calcular_mascara(del_negocio, fecha_local(zonas[negocio_id]))
+        Negocio.objects.filter(pk=negocio_id).update(mascara_apertura=mascara, dias_apertura=dias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0009_busqueda_difusa_clientes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='negocio',
+            name='dias_apertura',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='mascara_apertura',
+            field=models.CharField(default=MASCARA_CERRADO, editable=False, max_length=672),
+        ),
+        migrations.RunPython(calcular_mascaras, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0010_mascara_apertura_negocio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='negocio',
+            name='proxima_disponibilidad',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        # Sin cálculo inicial: el comando programado recalcular_proxima_disponibilidad
+        # rellena los negocios con el valor a NULL en su siguiente ejecución.
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:33
+
+import django.db.models.deletion
+from collections import defaultdict
+from decimal import Decimal
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from django.db import migrations, models
+
+
+# Copia congelada de la agregación de API.resumenes en esta migración
+CAMPOS_CITA = (
+    'negocio_id', 'empleado_id', 'servicio_id', 'fecha_hora_inicio', 'fecha_hora_fin',
+    'estado', 'precio_final',
+)
+
+
+def obtener_zona_horaria(nombre):
+    try:
+        return ZoneInfo(nombre or 'Europe/Madrid')
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo('Europe/Madrid')
+
+
+def construir_resumen(apps, schema_editor):
+    Cita = apps.get_model('API', 'Cita')
+    Negocio = apps.get_model('API', 'Negocio')
+    ResumenDiarioCitas = apps.get_model('API', 'ResumenDiarioCitas')
+    zonas = {pk: obtener_zona_horaria(nombre) for pk, nombre in Negocio.objects.values_list('pk', 'zona_horaria')}
+
+    totales = defaultdict(lambda: [0, Decimal('0'), 0])
+    for valores in Cita.objects.values(*CAMPOS_CITA).iterator(chunk_size=2000):
+        fecha = valores['fecha_hora_inicio'].astimezone(zonas[valores['negocio_id']]).date()
+        clave = (valores['negocio_id'], valores['empleado_id'], valores['servicio_id'], fecha, valores['estado'])
+        acumulado = totales[clave]
+        acumulado[0] += 1
+        acumulado[1] += valores['precio_final'] or Decimal('0')
+        acumulado[2] += int((valores['fecha_hora_fin'] - valores['fecha_hora_inicio']).total_seconds() // 60)
+
+    ResumenDiarioCitas.objects.bulk_create(
+        [
+            ResumenDiarioCitas(
+                negocio_id=negocio_id, empleado_id=empleado_id, servicio_id=servicio_id,
+                fecha=fecha, estado=estado, total=total, ingresos=ingresos, minutos=minutos,
+            )
+            for (negocio_id, empleado_id, servicio_id, fecha, estado), (total, ingresos, minutos) in totales.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0011_proxima_disponibilidad_negocio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiarioCitas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Día local del negocio en que empiezan las citas')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente de Confirmación'), ('confirmada', 'Confirmada'), ('en_curso', 'En Curso'), ('completada', 'Completada'), ('cancelada_cliente', 'Cancelada por Cliente'), ('cancelada_negocio', 'Cancelada por Negocio'), ('no_asistio', 'No Asistió')], max_length=20)),
+                ('total', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('minutos', models.IntegerField(default=0)),
+                ('empleado', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='API.empleadonegocio')),
+                ('negocio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='API.negocio')),
+                ('servicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='API.servicionegocio')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Citas',
+                'verbose_name_plural': 'Resúmenes Diarios de Citas',
+                'db_table': 'resumen_diario_citas',
+                'indexes': [models.Index(fields=['negocio', 'fecha', 'estado'], name='resumen_dia_negocio_9c3000_idx')],
+            },
+        ),
+        migrations.RunPython(construir_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:45
+
+import django.db.models.deletion
+from collections import defaultdict
+from hashlib import blake2b
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from django.db import migrations, models
+
+
+# Copia congelada del sketch de API.hll (precisión 12) y de su agregación en
+# API.resumenes: el formato de los registros guardados depende de ella.
+PRECISION = 12
+REGISTROS = 1 << PRECISION
+BITS_RESTO = 64 - PRECISION
+
+
+def obtener_zona_horaria(nombre):
+    try:
+        return ZoneInfo(nombre or 'Europe/Madrid')
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo('Europe/Madrid')
+
+
+def añadir(registros, valor):
+    resumen = int.from_bytes(blake2b(str(valor).encode(), digest_size=8).digest(), 'big')
+    resto = resumen & ((1 << BITS_RESTO) - 1)
+    indice, rango = resumen >> BITS_RESTO, BITS_RESTO - resto.bit_length() + 1
+    if registros[indice] < rango:
+        registros[indice] = rango
+
+
+def construir_sketches(apps, schema_editor):
+    Cita = apps.get_model('API', 'Cita')
+    Negocio = apps.get_model('API', 'Negocio')
+    ClientesMesNegocio = apps.get_model('API', 'ClientesMesNegocio')
+    zonas = {pk: obtener_zona_horaria(nombre) for pk, nombre in Negocio.objects.values_list('pk', 'zona_horaria')}
+
+    sketches = defaultdict(lambda: bytearray(REGISTROS))
+    citas = Cita.objects.filter(cliente__isnull=False).values_list('negocio_id', 'cliente_id', 'fecha_hora_inicio')
+    for negocio_id, cliente_id, inicio in citas.iterator(chunk_size=2000):
+        mes = inicio.astimezone(zonas[negocio_id]).date().replace(day=1)
+        añadir(sketches[(negocio_id, mes)], cliente_id)
+
+    ClientesMesNegocio.objects.bulk_create(
+        [
+            ClientesMesNegocio(negocio_id=negocio_id, mes=mes, registros=bytes(registros))
+            for (negocio_id, mes), registros in sketches.items()
+        ],
+        batch_size=200,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0012_resumen_diario_citas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientesMesNegocio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primer día del mes local del negocio')),
+                ('registros', models.BinaryField()),
+                ('negocio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clientes_mensuales', to='API.negocio')),
+            ],
+            options={
+                'verbose_name': 'Clientes del Mes',
+                'verbose_name_plural': 'Clientes por Mes',
+                'db_table': 'clientes_mes_negocio',
+                'unique_together': {('negocio', 'mes')},
+            },
+        ),
+        migrations.RunPython(construir_sketches, migrations.RunPython.noop),
+    ]
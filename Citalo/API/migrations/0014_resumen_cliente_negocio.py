@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:49
+
+import django.db.models.deletion
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Copia congelada de la agregación de visitas de API.resumenes en esta migración
+def obtener_zona_horaria(nombre):
+    try:
+        return ZoneInfo(nombre or 'Europe/Madrid')
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo('Europe/Madrid')
+
+
+def construir_visitas(apps, schema_editor):
+    Cita = apps.get_model('API', 'Cita')
+    Negocio = apps.get_model('API', 'Negocio')
+    ResumenClienteNegocio = apps.get_model('API', 'ResumenClienteNegocio')
+    zonas = {pk: obtener_zona_horaria(nombre) for pk, nombre in Negocio.objects.values_list('pk', 'zona_horaria')}
+
+    visitas = {}
+    citas = Cita.objects.filter(estado='completada', cliente__isnull=False).values_list(
+        'negocio_id', 'cliente_id', 'fecha_hora_inicio'
+    )
+    for negocio_id, cliente_id, inicio in citas.iterator(chunk_size=2000):
+        fecha = inicio.astimezone(zonas[negocio_id]).date()
+        clave = (negocio_id, cliente_id)
+        if clave in visitas:
+            acumulado = visitas[clave]
+            acumulado[0], acumulado[1] = min(acumulado[0], fecha), max(acumulado[1], fecha)
+            acumulado[2] += 1
+        else:
+            visitas[clave] = [fecha, fecha, 1]
+
+    ResumenClienteNegocio.objects.bulk_create(
+        [
+            ResumenClienteNegocio(
+                negocio_id=negocio_id, cliente_id=cliente_id,
+                primera_visita=primera, ultima_visita=ultima, visitas=total,
+            )
+            for (negocio_id, cliente_id), (primera, ultima, total) in visitas.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0013_clientes_mes_negocio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenClienteNegocio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('primera_visita', models.DateField(help_text='Día local del negocio')),
+                ('ultima_visita', models.DateField(help_text='Día local del negocio')),
+                ('visitas', models.IntegerField(default=0)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('negocio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_clientes', to='API.negocio')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Cliente',
+                'verbose_name_plural': 'Resúmenes de Clientes',
+                'db_table': 'resumen_cliente_negocio',
+                'indexes': [models.Index(fields=['negocio', 'primera_visita'], name='resumen_cli_negocio_023e89_idx')],
+                'unique_together': {('negocio', 'cliente')},
+            },
+        ),
+        migrations.RunPython(construir_visitas, migrations.RunPython.noop),
+    ]
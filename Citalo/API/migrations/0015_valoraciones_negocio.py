@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:53
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+
+# Copia congelada de API.valoraciones.reconstruir_valoraciones con los
+# contadores que existen en esta migración
+ASPECTOS = ('servicio', 'atencion', 'instalaciones')
+
+
+def media(suma, total):
+    if not total:
+        return Decimal('0.00')
+    return (Decimal(suma) / total).quantize(Decimal('0.01'))
+
+
+def calcular_valoraciones(apps, schema_editor):
+    Negocio = apps.get_model('API', 'Negocio')
+    ReseñaNegocio = apps.get_model('API', 'ReseñaNegocio')
+    ValoracionesNegocio = apps.get_model('API', 'ValoracionesNegocio')
+
+    agregados = {'total': Count('pk'), 'suma': Sum('calificacion')}
+    for aspecto in ASPECTOS:
+        agregados[f'total_{aspecto}'] = Count(f'calificacion_{aspecto}')
+        agregados[f'suma_{aspecto}'] = Sum(f'calificacion_{aspecto}')
+    contadores = {
+        fila.pop('negocio'): {contador: valor or 0 for contador, valor in fila.items()}
+        for fila in ReseñaNegocio.objects.filter(activa=True).order_by().values('negocio').annotate(**agregados)
+    }
+
+    ahora = timezone.now()
+    filas, cambiados = [], []
+    for negocio in Negocio.objects.only('pk', 'total_reseñas', 'calificacion_promedio'):
+        fila = ValoracionesNegocio(negocio_id=negocio.pk, **contadores.get(negocio.pk, {}))
+        filas.append(fila)
+        calificacion = media(fila.suma, fila.total)
+        if (negocio.total_reseñas, negocio.calificacion_promedio) != (fila.total, calificacion):
+            negocio.total_reseñas, negocio.calificacion_promedio = fila.total, calificacion
+            negocio.fecha_actualizacion = ahora
+            cambiados.append(negocio)
+
+    ValoracionesNegocio.objects.bulk_create(filas, batch_size=1000)
+    Negocio.objects.bulk_update(
+        cambiados, ['total_reseñas', 'calificacion_promedio', 'fecha_actualizacion'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0014_resumen_cliente_negocio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValoracionesNegocio',
+            fields=[
+                ('negocio', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='valoraciones', serialize=False, to='API.negocio')),
+                ('total', models.IntegerField(default=0)),
+                ('suma', models.IntegerField(default=0)),
+                ('total_servicio', models.IntegerField(default=0)),
+                ('suma_servicio', models.IntegerField(default=0)),
+                ('total_atencion', models.IntegerField(default=0)),
+                ('suma_atencion', models.IntegerField(default=0)),
+                ('total_instalaciones', models.IntegerField(default=0)),
+                ('suma_instalaciones', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Valoraciones de Negocio',
+                'verbose_name_plural': 'Valoraciones de Negocios',
+                'db_table': 'valoraciones_negocio',
+            },
+        ),
+        migrations.RunPython(calcular_valoraciones, migrations.RunPython.noop),
+    ]
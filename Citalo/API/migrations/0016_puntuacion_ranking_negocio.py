@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:57
+
+from datetime import timedelta
+from decimal import Decimal
+from math import log1p
+from django.db import migrations, models
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+
+# Copia congelada de API.ranking.reconstruir_ranking en esta migración
+PESO_PREVIO = 10
+MEDIA_PREVIA = 4.0
+BONO_VERIFICADO = 0.25
+BONO_VOLUMEN = 0.5
+TOPE_VOLUMEN = 500
+VENTANA_VOLUMEN_DIAS = 90
+BONO_RECENCIA = 0.25
+VIDA_MEDIA_RECENCIA_DIAS = 30
+
+
+def puntuacion(suma, total, media, verificado, completadas, ultima_visita, hoy):
+    bayesiana = (PESO_PREVIO * media + suma) / (PESO_PREVIO + total)
+    volumen = BONO_VOLUMEN * min(log1p(completadas) / log1p(TOPE_VOLUMEN), 1)
+    recencia = 0
+    if ultima_visita:
+        recencia = BONO_RECENCIA * 0.5 ** (max((hoy - ultima_visita).days, 0) / VIDA_MEDIA_RECENCIA_DIAS)
+    valor = bayesiana + (BONO_VERIFICADO if verificado else 0) + volumen + recencia
+    return Decimal(valor).quantize(Decimal('0.001'))
+
+
+def calcular_ranking(apps, schema_editor):
+    Negocio = apps.get_model('API', 'Negocio')
+    ResumenDiarioCitas = apps.get_model('API', 'ResumenDiarioCitas')
+    ValoracionesNegocio = apps.get_model('API', 'ValoracionesNegocio')
+
+    hoy = timezone.localdate()
+    totales = ValoracionesNegocio.objects.aggregate(suma=Sum('suma'), total=Sum('total'))
+    media = totales['suma'] / totales['total'] if totales['total'] else MEDIA_PREVIA
+    valoraciones = {pk: (suma, total) for pk, suma, total in ValoracionesNegocio.objects.values_list(
+        'negocio_id', 'suma', 'total'
+    )}
+    actividad = {
+        fila['negocio_id']: fila
+        for fila in ResumenDiarioCitas.objects.order_by().filter(
+            estado='completada', total__gt=0, fecha__gte=hoy - timedelta(days=VENTANA_VOLUMEN_DIAS)
+        ).values('negocio_id').annotate(completadas=Sum('total'), ultima=Max('fecha'))
+    }
+
+    ahora = timezone.now()
+    cambiados = []
+    for negocio in Negocio.objects.only('pk', 'verificado', 'puntuacion_ranking').iterator(chunk_size=2000):
+        suma, total = valoraciones.get(negocio.pk, (0, 0))
+        datos = actividad.get(negocio.pk, {})
+        valor = puntuacion(
+            suma, total, media, negocio.verificado, datos.get('completadas') or 0, datos.get('ultima'), hoy
+        )
+        if valor != negocio.puntuacion_ranking:
+            negocio.puntuacion_ranking = valor
+            negocio.fecha_actualizacion = ahora
+            cambiados.append(negocio)
+    Negocio.objects.bulk_update(cambiados, ['puntuacion_ranking', 'fecha_actualizacion'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0015_valoraciones_negocio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='negocio',
+            name='puntuacion_ranking',
+            field=models.DecimalField(db_index=True, decimal_places=3, default=Decimal('0.000'), editable=False, max_digits=5),
+        ),
+        migrations.RunPython(calcular_ranking, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:01
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def contar_estrellas(apps, schema_editor):
+    ReseñaNegocio = apps.get_model('API', 'ReseñaNegocio')
+    ValoracionesNegocio = apps.get_model('API', 'ValoracionesNegocio')
+
+    agregados = {f'estrellas_{estrellas}': Count('pk', filter=Q(calificacion=estrellas)) for estrellas in range(1, 6)}
+    agregados['respondidas'] = Count('pk', filter=~Q(respuesta_negocio=''))
+    contadores = {
+        fila.pop('negocio'): fila
+        for fila in ReseñaNegocio.objects.filter(activa=True).order_by().values('negocio').annotate(**agregados)
+    }
+
+    filas = list(ValoracionesNegocio.objects.filter(pk__in=contadores))
+    for fila in filas:
+        for contador, valor in contadores[fila.pk].items():
+            setattr(fila, contador, valor)
+    ValoracionesNegocio.objects.bulk_update(filas, list(agregados), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0016_puntuacion_ranking_negocio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='valoracionesnegocio',
+            name='estrellas_1',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='valoracionesnegocio',
+            name='estrellas_2',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='valoracionesnegocio',
+            name='estrellas_3',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='valoracionesnegocio',
+            name='estrellas_4',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='valoracionesnegocio',
+            name='estrellas_5',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='valoracionesnegocio',
+            name='respondidas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='reseñanegocio',
+            index=models.Index(fields=['negocio', 'activa', 'calificacion'], name='reseñas_neg_negocio_be49b7_idx'),
+        ),
+        migrations.RunPython(contar_estrellas, migrations.RunPython.noop),
+    ]
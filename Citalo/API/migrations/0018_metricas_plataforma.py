@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:06
+
+import django.utils.timezone
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('API', '0017_histograma_resenas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricaPlataforma',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Día de la foto o, en las citas, día de las citas')),
+                ('tipo', models.CharField(choices=[('suscripciones', 'Negocios por Estado de Suscripción'), ('mrr', 'Ingresos Recurrentes Mensuales'), ('citas', 'Citas por Día y Estado'), ('categoria', 'Citas por Categoría'), ('ciudad', 'Citas por Ciudad')], max_length=20)),
+                ('clave', models.CharField(blank=True, max_length=100)),
+                ('valor', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('fecha_actualizacion', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Métrica de Plataforma',
+                'verbose_name_plural': 'Métricas de Plataforma',
+                'db_table': 'metricas_plataforma',
+                'indexes': [models.Index(fields=['tipo', 'fecha'], name='metricas_pl_tipo_a69fc3_idx')],
+                'unique_together': {('fecha', 'tipo', 'clave')},
+            },
+        ),
+    ]
@@ -0,0 +1,169 @@
+import hashlib
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied, ValidationError
+from rest_framework.response import Response
+
+from .facetas import facetas_en_cache
+
+
+class ConditionalGetMixin:
+    """
+    Soporte de GET condicional (ETag / Last-Modified) para viewsets de catálogo.
+
+    Las respuestas 304 se resuelven antes de serializar: en detalle con el
+    timestamp del objeto y en listados con una huella MAX()/COUNT() del
+    queryset filtrado. `conditional_related_timestamp_fields` añade los
+    timestamps de las relaciones (claves foráneas) que se serializan
+    anidadas, p. ej. 'categoria__fecha_actualizacion'.
+    """
+    conditional_timestamp_field = 'fecha_actualizacion'
+    conditional_related_timestamp_fields = ()
+
+    def get_instance_timestamp(self, instance):
+        """Timestamp más reciente del objeto y de sus relaciones anidadas"""
+        timestamps = [getattr(instance, self.conditional_timestamp_field)]
+        for campo in self.conditional_related_timestamp_fields:
+            valor = instance
+            for parte in campo.split('__'):
+                valor = getattr(valor, parte, None) if valor is not None else None
+            timestamps.append(valor)
+        return max((valor for valor in timestamps if valor is not None), default=None)
+
+    def get_conditional_etag(self, request, *partes):
+        """Construye un ETag fuerte a partir de la vista, el usuario y la huella"""
+        usuario = request.user.pk if request.user.is_authenticated else ''
+        contenido = '|'.join(str(parte) for parte in (
+            self.basename, self.action, usuario, request.get_full_path(), *partes
+        ))
+        return quote_etag(hashlib.md5(contenido.encode('utf-8')).hexdigest())
+
+    def finalize_conditional_response(self, response, etag, ultima_modificacion=None):
+        response['ETag'] = etag
+        if ultima_modificacion is not None:
+            response['Last-Modified'] = http_date(ultima_modificacion.timestamp())
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        huella = queryset.order_by().aggregate(
+            ultima=Max(self.conditional_timestamp_field),
+            total=Count('pk'),
+            **{
+                f'relacionada_{i}': Max(campo)
+                for i, campo in enumerate(self.conditional_related_timestamp_fields)
+            },
+        )
+        etag = self.get_conditional_etag(request, *huella.values())
+
+        # Last-Modified no se usa en listados: una baja no mueve el MAX()
+        no_modificado = get_conditional_response(request, etag=etag)
+        if no_modificado is not None:
+            return self.finalize_conditional_response(no_modificado, etag)
+
+        response = super().list(request, *args, **kwargs)
+        return self.finalize_conditional_response(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        ultima_modificacion = self.get_instance_timestamp(instance)
+        etag = self.get_conditional_etag(request, instance.pk, ultima_modificacion)
+
+        no_modificado = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(ultima_modificacion.timestamp()) if ultima_modificacion else None,
+        )
+        if no_modificado is not None:
+            return self.finalize_conditional_response(no_modificado, etag, ultima_modificacion)
+
+        serializer = self.get_serializer(instance)
+        response = Response(serializer.data)
+        return self.finalize_conditional_response(response, etag, ultima_modificacion)
+
+
+class BatchGetMixin:
+    """
+    Multi-get en el listado: `?ids=a,b,c` devuelve esos objetos con una única
+    consulta IN sobre get_queryset(), que ya aplica el alcance del usuario.
+
+    Los ids que no existen o a los que el usuario no tiene acceso se devuelven
+    en `no_encontrados`, sin distinguir entre ambos casos.
+    """
+    batch_query_param = 'ids'
+    batch_max_ids = 100
+    batch_select_related = ()
+    batch_prefetch_related = ()
+
+    def list(self, request, *args, **kwargs):
+        if self.batch_query_param not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        return self.batch_list(request)
+
+    def get_batch_ids(self, request, maximo=None):
+        maximo = maximo or self.batch_max_ids
+        crudos = request.query_params.get(self.batch_query_param, '')
+        ids = list(dict.fromkeys(valor.strip() for valor in crudos.split(',') if valor.strip()))
+        if not ids:
+            raise ValidationError({self.batch_query_param: 'Debe indicar al menos un id'})
+        if len(ids) > maximo:
+            raise ValidationError({
+                self.batch_query_param: f'Máximo {maximo} ids por petición'
+            })
+
+        campo_pk = self.get_queryset().model._meta.pk
+        try:
+            return [(valor, campo_pk.to_python(valor)) for valor in ids]
+        except DjangoValidationError:
+            raise ValidationError({self.batch_query_param: 'Identificadores inválidos'})
+
+    def get_batch_queryset(self, pks):
+        queryset = self.get_queryset().filter(pk__in=pks)
+        if self.batch_select_related:
+            queryset = queryset.select_related(*self.batch_select_related)
+        if self.batch_prefetch_related:
+            queryset = queryset.prefetch_related(*self.batch_prefetch_related)
+        return queryset
+
+    def filter_batch_permissions(self, request, objetos):
+        """Aplica has_object_permission en memoria sobre el lote ya cargado"""
+        permitidos = []
+        for objeto in objetos:
+            try:
+                self.check_object_permissions(request, objeto)
+            except (PermissionDenied, NotAuthenticated):
+                continue
+            permitidos.append(objeto)
+        return permitidos
+
+    def batch_list(self, request):
+        ids = self.get_batch_ids(request)
+        objetos = self.get_batch_queryset([pk for _, pk in ids])
+        por_pk = {objeto.pk: objeto for objeto in self.filter_batch_permissions(request, objetos)}
+
+        encontrados = [por_pk[pk] for _, pk in ids if pk in por_pk]
+        serializer = self.get_serializer(encontrados, many=True)
+        return Response({
+            'results': serializer.data,
+            'no_encontrados': [valor for valor, pk in ids if pk not in por_pk],
+        })
+
+
+class FacetasMixin:
+    """
+    `?facetas=true` añade al listado paginado los conteos por faceta del
+    queryset filtrado (ver facetas.py).
+    """
+    facetas_query_param = 'facetas'
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        pedidas = request.query_params.get(self.facetas_query_param, '').lower() in ('1', 'true')
+        if pedidas and response.status_code == 200 and 'results' in getattr(response, 'data', {}):
+            queryset = self.filter_queryset(self.get_queryset())
+            response.data['facetas'] = facetas_en_cache(queryset, request.query_params)
+        return response
@@ -1,10 +1,13 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from decimal import Decimal
 import uuid
 
+from .apertura import MASCARA_CERRADO
+from .coincidencia import normalizar_nombre, normalizar_telefono
+
 
 class Usuario(AbstractUser):
     """
@@ -95,6 +98,10 @@ class Usuario(AbstractUser):
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     ultima_actividad = models.DateTimeField(blank=True, null=True)
     
+    # Columnas normalizadas para la búsqueda difusa (ver coincidencia.py)
+    nombre_normalizado = models.CharField(max_length=320, blank=True, editable=False)
+    telefono_normalizado = models.CharField(max_length=20, blank=True, editable=False, db_index=True)
+    
     
     # Configuración adicional del modelo
     class Meta:
@@ -156,6 +163,12 @@ class Usuario(AbstractUser):
         if self.email:
             self.email = self.email.lower()
         
+        self.nombre_normalizado = normalizar_nombre(self.first_name, self.last_name, self.username)
+        self.telefono_normalizado = normalizar_telefono(self.telefono)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'first_name', 'last_name', 'username', 'telefono'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'nombre_normalizado', 'telefono_normalizado'}
+        
         # Actualizar última actividad si el usuario está haciendo login
         if self.pk and self.last_login != Usuario.objects.filter(pk=self.pk).values_list('last_login', flat=True).first():
             self.ultima_actividad = timezone.now()
@@ -181,6 +194,8 @@ class CategoriaNegocio(models.Model):
     permite_citas_online = models.BooleanField(default=True)
     requiere_confirmacion = models.BooleanField(default=False)
     
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
     class Meta:
         verbose_name = 'Categoría de Negocio'
         verbose_name_plural = 'Categorías de Negocio'
@@ -268,6 +283,24 @@ class Negocio(models.Model):
     activo = models.BooleanField(default=True)
     verificado = models.BooleanField(default=False)
     
+    # Rangos de precio y duración de los servicios activos (desnormalizados)
+    precio_min = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
+    precio_max = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
+    duracion_min = models.PositiveIntegerField(blank=True, null=True)
+    duracion_max = models.PositiveIntegerField(blank=True, null=True)
+    
+    # Horario semanal precalculado a partir de los horarios (ver apertura.py)
+    mascara_apertura = models.CharField(max_length=672, default=MASCARA_CERRADO, editable=False)
+    dias_apertura = models.PositiveSmallIntegerField(default=0, editable=False)
+    
+    # Inicio del próximo hueco reservable (ver disponibilidad.py)
+    proxima_disponibilidad = models.DateTimeField(blank=True, null=True, editable=False, db_index=True)
+    
+    # Orden por defecto del listado (ver ranking.py)
+    puntuacion_ranking = models.DecimalField(
+        max_digits=5, decimal_places=3, default=Decimal('0.000'), editable=False, db_index=True
+    )
+    
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
@@ -279,6 +312,9 @@ class Negocio(models.Model):
             models.Index(fields=['ciudad', 'categoria']),
             models.Index(fields=['estado_suscripcion']),
             models.Index(fields=['activo', 'verificado']),
+            models.Index(fields=['precio_min']),
+            models.Index(fields=['precio_max']),
+            models.Index(fields=['latitud', 'longitud']),
         ]
 
     def __str__(self):
@@ -297,6 +333,17 @@ class Negocio(models.Model):
             self.slug = unique_slug
         super().save(*args, **kwargs)
 
+    @classmethod
+    def recalcular_rangos_servicios(cls, negocio_id):
+        """Recalcula los rangos de precio y duración a partir de los servicios activos"""
+        rangos = ServicioNegocio.objects.filter(negocio_id=negocio_id, activo=True).aggregate(
+            precio_min=models.Min('precio'),
+            precio_max=models.Max('precio'),
+            duracion_min=models.Min('duracion_minutos'),
+            duracion_max=models.Max('duracion_minutos'),
+        )
+        cls.objects.filter(pk=negocio_id).update(fecha_actualizacion=timezone.now(), **rangos)
+
     @property
     def suscripcion_activa(self):
         return (
@@ -373,6 +420,7 @@ class ServicioNegocio(models.Model):
     orden = models.PositiveIntegerField(default=0)
     activo = models.BooleanField(default=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = 'Servicio de Negocio'
@@ -451,6 +499,9 @@ class BloqueoHorario(models.Model):
         verbose_name = 'Bloqueo de Horario'
         verbose_name_plural = 'Bloqueos de Horario'
         db_table = 'bloqueos_horario'
+        indexes = [
+            models.Index(fields=['negocio', 'fecha_inicio', 'fecha_fin']),
+        ]
 
     def __str__(self):
         empleado_info = f" - {self.empleado}" if self.empleado else ""
@@ -496,6 +547,8 @@ class Cita(models.Model):
     nombre_cliente = models.CharField(max_length=200, help_text="Nombre completo del cliente para la cita")
     telefono_cliente = models.CharField(max_length=20)
     email_cliente = models.EmailField()
+    nombre_cliente_normalizado = models.CharField(max_length=200, blank=True, editable=False)
+    telefono_cliente_normalizado = models.CharField(max_length=20, blank=True, editable=False, db_index=True)
     
     # Notas y observaciones
     notas_cliente = models.TextField(blank=True, help_text="Notas adicionales del cliente")
@@ -529,6 +582,10 @@ class Cita(models.Model):
             models.Index(fields=['fecha_hora_inicio', 'estado']),
             models.Index(fields=['negocio', 'fecha_hora_inicio']),
             models.Index(fields=['cliente', 'estado']),
+            # Índices para paginación por cursor (campo de orden, id)
+            models.Index(fields=['fecha_hora_inicio', 'id']),
+            models.Index(fields=['cliente', 'fecha_hora_inicio', 'id']),
+            models.Index(fields=['fecha_creacion', 'id']),
         ]
 
     def __str__(self):
@@ -543,8 +600,91 @@ class Cita(models.Model):
         # Establecer precio final si no está definido
         if not self.precio_final and self.servicio:
             self.precio_final = self.servicio.precio
+        
+        self.nombre_cliente_normalizado = normalizar_nombre(self.nombre_cliente)
+        self.telefono_cliente_normalizado = normalizar_telefono(self.telefono_cliente)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'nombre_cliente', 'telefono_cliente'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {
+                'nombre_cliente_normalizado', 'telefono_cliente_normalizado'
+            }
             
-        super().save(*args, **kwargs)
+        # Las señales que mantienen ResumenDiarioCitas van en la misma transacción
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class ResumenDiarioCitas(models.Model):
+    """
+    Totales diarios de citas por negocio, empleado, servicio y estado
+    (mantenidos desde las señales de Cita, ver resumenes.py)
+    """
+    negocio = models.ForeignKey(Negocio, on_delete=models.CASCADE, related_name='resumenes_diarios')
+    empleado = models.ForeignKey(
+        EmpleadoNegocio, on_delete=models.SET_NULL, blank=True, null=True, related_name='+'
+    )
+    servicio = models.ForeignKey(ServicioNegocio, on_delete=models.CASCADE, related_name='+')
+    fecha = models.DateField(help_text="Día local del negocio en que empiezan las citas")
+    estado = models.CharField(max_length=20, choices=Cita.ESTADO_CITA_CHOICES)
+
+    total = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    minutos = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Resumen Diario de Citas'
+        verbose_name_plural = 'Resúmenes Diarios de Citas'
+        db_table = 'resumen_diario_citas'
+        indexes = [
+            models.Index(fields=['negocio', 'fecha', 'estado']),
+        ]
+
+    def __str__(self):
+        return f"{self.negocio_id} {self.fecha} {self.estado}: {self.total}"
+
+
+class ClientesMesNegocio(models.Model):
+    """
+    Sketch HyperLogLog de los clientes distintos con citas de un negocio en un
+    mes local (mantenido desde las señales de Cita, ver hll.py y resumenes.py)
+    """
+    negocio = models.ForeignKey(Negocio, on_delete=models.CASCADE, related_name='clientes_mensuales')
+    mes = models.DateField(help_text="Primer día del mes local del negocio")
+    registros = models.BinaryField()
+
+    class Meta:
+        verbose_name = 'Clientes del Mes'
+        verbose_name_plural = 'Clientes por Mes'
+        db_table = 'clientes_mes_negocio'
+        unique_together = ['negocio', 'mes']
+
+    def __str__(self):
+        return f"{self.negocio_id} {self.mes:%Y-%m}"
+
+
+class ResumenClienteNegocio(models.Model):
+    """
+    Primera y última visita y número de visitas (citas completadas) de cada
+    cliente en un negocio (mantenido desde las señales de Cita, ver
+    resumenes.py)
+    """
+    negocio = models.ForeignKey(Negocio, on_delete=models.CASCADE, related_name='resumenes_clientes')
+    cliente = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='+')
+    primera_visita = models.DateField(help_text="Día local del negocio")
+    ultima_visita = models.DateField(help_text="Día local del negocio")
+    visitas = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Resumen de Cliente'
+        verbose_name_plural = 'Resúmenes de Clientes'
+        db_table = 'resumen_cliente_negocio'
+        unique_together = ['negocio', 'cliente']
+        indexes = [
+            models.Index(fields=['negocio', 'primera_visita']),
+        ]
+
+    def __str__(self):
+        return f"{self.negocio_id} {self.cliente_id}: {self.visitas}"
 
 
 class ReseñaNegocio(models.Model):
@@ -591,11 +731,49 @@ class ReseñaNegocio(models.Model):
         verbose_name_plural = 'Reseñas de Negocio'
         db_table = 'reseñas_negocio'
         unique_together = ['negocio', 'cliente', 'cita']
+        indexes = [
+            models.Index(fields=['negocio', 'fecha_creacion', 'id']),
+            models.Index(fields=['fecha_creacion', 'id']),
+            models.Index(fields=['negocio', 'activa', 'calificacion']),
+        ]
 
     def __str__(self):
         return f"Reseña de {self.cliente.get_full_name()} para {self.negocio.nombre} - {self.calificacion}⭐"
 
 
+class ValoracionesNegocio(models.Model):
+    """
+    Suma y número de calificaciones de las reseñas activas de un negocio, en
+    global y por aspecto, reseñas por estrellas y respondidas (mantenidos
+    desde las señales de ReseñaNegocio, ver valoraciones.py)
+    """
+    negocio = models.OneToOneField(
+        Negocio, on_delete=models.CASCADE, primary_key=True, related_name='valoraciones'
+    )
+    total = models.IntegerField(default=0)
+    suma = models.IntegerField(default=0)
+    total_servicio = models.IntegerField(default=0)
+    suma_servicio = models.IntegerField(default=0)
+    total_atencion = models.IntegerField(default=0)
+    suma_atencion = models.IntegerField(default=0)
+    total_instalaciones = models.IntegerField(default=0)
+    suma_instalaciones = models.IntegerField(default=0)
+    estrellas_1 = models.IntegerField(default=0)
+    estrellas_2 = models.IntegerField(default=0)
+    estrellas_3 = models.IntegerField(default=0)
+    estrellas_4 = models.IntegerField(default=0)
+    estrellas_5 = models.IntegerField(default=0)
+    respondidas = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Valoraciones de Negocio'
+        verbose_name_plural = 'Valoraciones de Negocios'
+        db_table = 'valoraciones_negocio'
+
+    def __str__(self):
+        return f"{self.negocio_id}: {self.suma}/{self.total}"
+
+
 class FacturacionSuscripcion(models.Model):
     """
     Registro de facturación y pagos de suscripciones
@@ -637,6 +815,9 @@ class FacturacionSuscripcion(models.Model):
         verbose_name_plural = 'Facturaciones de Suscripción'
         db_table = 'facturacion_suscripcion'
         ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['negocio', 'fecha_creacion', 'id']),
+        ]
 
     def __str__(self):
         return f"Factura {self.numero_factura or self.id} - {self.negocio.nombre}"
@@ -684,4 +865,36 @@ class ConfiguracionPlataforma(models.Model):
         elif self.tipo_dato == 'json':
             import json
             return json.loads(self.valor)
-        return self.valor
\ No newline at end of file
+        return self.valor
+
+
+class MetricaPlataforma(models.Model):
+    """
+    Métricas globales de la plataforma para el panel de administración
+    (materializadas por `actualizar_metricas_plataforma`, ver metricas.py)
+    """
+    TIPO_CHOICES = [
+        ('suscripciones', 'Negocios por Estado de Suscripción'),
+        ('mrr', 'Ingresos Recurrentes Mensuales'),
+        ('citas', 'Citas por Día y Estado'),
+        ('categoria', 'Citas por Categoría'),
+        ('ciudad', 'Citas por Ciudad'),
+    ]
+
+    fecha = models.DateField(help_text="Día de la foto o, en las citas, día de las citas")
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    clave = models.CharField(max_length=100, blank=True)
+    valor = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    fecha_actualizacion = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Métrica de Plataforma'
+        verbose_name_plural = 'Métricas de Plataforma'
+        db_table = 'metricas_plataforma'
+        unique_together = ['fecha', 'tipo', 'clave']
+        indexes = [
+            models.Index(fields=['tipo', 'fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo} {self.clave}: {self.valor}"
@@ -0,0 +1,262 @@
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+CONTEO_APROXIMADO_POR_DEFECTO = {
+    'UMBRAL_EXACTO': 10000,
+    'TIMEOUT_CACHE': 300,
+}
+
+
+def _config_conteo():
+    return {**CONTEO_APROXIMADO_POR_DEFECTO, **getattr(settings, 'CONTEO_APROXIMADO', {})}
+
+
+def estimar_conteo_postgres(queryset):
+    """
+    Estimación del planificador de PostgreSQL: reltuples para la tabla sin
+    filtrar y las filas estimadas por EXPLAIN para consultas filtradas.
+    """
+    conexion = connections[queryset.db]
+    with conexion.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            fila = cursor.fetchone()
+            return fila[0] if fila else None
+
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+def conteo_en_cache(queryset, timeout):
+    """COUNT(*) exacto guardado en caché durante `timeout` segundos"""
+    sql, params = queryset.query.sql_with_params()
+    huella = hashlib.md5(f'{queryset.db}|{sql}|{params!r}'.encode('utf-8')).hexdigest()
+    clave = f'conteo:{huella}'
+    total = cache.get(clave)
+    if total is None:
+        total = queryset.count()
+        cache.set(clave, total, timeout)
+    return total
+
+
+class PaginaAproximada(Page):
+    """Página cuya siguiente se conoce leyendo una fila de más, no por el conteo"""
+
+    def __init__(self, object_list, number, paginator, hay_siguiente):
+        super().__init__(object_list, number, paginator)
+        self.hay_siguiente = hay_siguiente
+
+    def has_next(self):
+        return self.hay_siguiente
+
+
+class ConteoAproximadoPaginator(Paginator):
+    """
+    Paginator que solo cuenta exactamente hasta UMBRAL_EXACTO filas.
+
+    Por encima del umbral usa la estimación del planificador en PostgreSQL y
+    un COUNT(*) cacheado con TTL en el resto de bases de datos. Como la
+    estimación puede quedarse corta, con conteo aproximado no se limita el
+    número de página: solo es un error una página vacía.
+    """
+    es_aproximado = False
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+
+        config = _config_conteo()
+        umbral = config['UMBRAL_EXACTO']
+        queryset = self.object_list.order_by()
+
+        # COUNT sobre un subquery con LIMIT: coste acotado por el umbral
+        total = queryset[:umbral + 1].count()
+        if total <= umbral:
+            return total
+
+        self.es_aproximado = True
+        estimacion = None
+        if connections[queryset.db].vendor == 'postgresql':
+            estimacion = estimar_conteo_postgres(queryset)
+        if estimacion is None or estimacion < 0:
+            estimacion = conteo_en_cache(queryset, config['TIMEOUT_CACHE'])
+        return max(estimacion, umbral + 1)
+
+    def validate_number(self, number):
+        if not self.count or not self.es_aproximado:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.es_aproximado:
+            return super().page(number)
+        inferior = (number - 1) * self.per_page
+        filas = list(self.object_list[inferior:inferior + self.per_page + 1])
+        if not filas:
+            raise EmptyPage(self.error_messages['no_results'])
+        return PaginaAproximada(filas[:self.per_page], number, self, len(filas) > self.per_page)
+
+
+class ConteoAproximadoPagination(PageNumberPagination):
+    """PageNumberPagination con conteo aproximado para tablas grandes"""
+    django_paginator_class = ConteoAproximadoPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_aproximado'] = self.page.paginator.es_aproximado
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        esquema = super().get_paginated_response_schema(schema)
+        esquema['properties']['count_aproximado'] = {'type': 'boolean', 'example': False}
+        return esquema
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Paginación por cursor sobre (campo de orden, pk).
+
+    A diferencia de CursorPagination, la posición incluye la pk como
+    desempate, por lo que no necesita OFFSET aunque haya valores repetidos.
+    El campo de orden sale del OrderingFilter de la vista y debe ser no nulo.
+    Si la petición trae `page`, se delega en paginación por número de página
+    (usada por el panel de administración).
+    """
+    ordering = '-fecha_creacion'
+    page_number_pagination_class = ConteoAproximadoPagination
+    page_number_query_param = 'page'
+    invalid_cursor_message = 'Cursor inválido'
+
+    delegado = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.page_number_query_param in request.query_params:
+            self.delegado = self.page_number_pagination_class()
+            return self.delegado.paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), self.page_number_query_param
+        )
+
+        orden = self.get_ordering(request, queryset, view)[0]
+        self.campo = orden.lstrip('-')
+        descendente = orden.startswith('-')
+        campo_modelo = queryset.model._meta.get_field(self.campo)
+        pk_modelo = queryset.model._meta.pk
+
+        cursor = self.decode_cursor(request)
+        reverso = bool(cursor and cursor['r'])
+        if reverso:
+            descendente = not descendente
+
+        prefijo = '-' if descendente else ''
+        queryset = queryset.order_by(f'{prefijo}{self.campo}', f'{prefijo}pk')
+
+        if cursor is not None:
+            try:
+                valor = campo_modelo.to_python(cursor['v'])
+                pk = pk_modelo.to_python(cursor['pk'])
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            lookup = 'lt' if descendente else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.campo}__{lookup}': valor}) |
+                Q(**{self.campo: valor, f'pk__{lookup}': pk})
+            )
+
+        resultados = list(queryset[:self.page_size + 1])
+        hay_mas = len(resultados) > self.page_size
+        resultados = resultados[:self.page_size]
+
+        if reverso:
+            resultados.reverse()
+            self.has_next = cursor is not None
+            self.has_previous = hay_mas
+        else:
+            self.has_next = hay_mas
+            self.has_previous = cursor is not None
+
+        self.page = resultados
+        return resultados
+
+    def _posicion(self, instancia, reverso):
+        valor = getattr(instancia, self.campo)
+        if isinstance(valor, datetime):
+            valor = valor.isoformat()
+        return {'v': str(valor), 'pk': str(instancia.pk), 'r': int(reverso)}
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._posicion(self.page[-1], reverso=False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self._posicion(self.page[0], reverso=True))
+
+    def decode_cursor(self, request):
+        codificado = request.query_params.get(self.cursor_query_param)
+        if codificado is None:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(codificado.encode('ascii')))
+            return {'v': cursor['v'], 'pk': cursor['pk'], 'r': bool(cursor.get('r'))}
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        codificado = urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, codificado)
+
+    def get_paginated_response(self, data):
+        if self.delegado is not None:
+            return self.delegado.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parametros = super().get_schema_operation_parameters(view)
+        return parametros + self.page_number_pagination_class().get_schema_operation_parameters(view)
+
+    def get_html_context(self):
+        if self.delegado is not None:
+            return self.delegado.get_html_context()
+        return super().get_html_context()
@@ -0,0 +1,124 @@
+"""
+Puntuación de ranking de los negocios (orden por defecto del listado).
+
+Parte de la media bayesiana de las calificaciones, que acerca a la media de la
+plataforma los negocios con pocas reseñas:
+
+    (PESO_PREVIO · media_global + suma) / (PESO_PREVIO + total)
+
+y le suma pequeños bonos por estar verificado, por el volumen de citas
+completadas en los últimos VENTANA_VOLUMEN_DIAS días (escala logarítmica) y
+por la actividad reciente (semivida de VIDA_MEDIA_RECENCIA_DIAS días). Se
+guarda en Negocio.puntuacion_ranking (indexada), así que ordenar no cuesta
+nada en consulta y, como se serializa, cada cambio mueve fecha_actualizacion
+(ETag del listado). Se recalcula al cambiar las reseñas, las citas completadas
+o la verificación de un negocio, y en bloque con `recalcular_ranking`, que
+además refresca la media global y el decaimiento por recencia.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from math import log1p
+
+from django.core.cache import cache
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+
+PESO_PREVIO = 10
+MEDIA_PREVIA = 4.0
+BONO_VERIFICADO = 0.25
+BONO_VOLUMEN = 0.5
+TOPE_VOLUMEN = 500
+VENTANA_VOLUMEN_DIAS = 90
+BONO_RECENCIA = 0.25
+VIDA_MEDIA_RECENCIA_DIAS = 30
+
+CLAVE_MEDIA_GLOBAL = 'ranking:media_global'
+TIMEOUT_MEDIA_GLOBAL = 24 * 3600
+
+
+def calcular_media_global():
+    """Media de todas las calificaciones activas (MEDIA_PREVIA si no hay ninguna)"""
+    from .models import ValoracionesNegocio
+
+    totales = ValoracionesNegocio.objects.aggregate(suma=Sum('suma'), total=Sum('total'))
+    return totales['suma'] / totales['total'] if totales['total'] else MEDIA_PREVIA
+
+
+def media_global():
+    return cache.get_or_set(CLAVE_MEDIA_GLOBAL, calcular_media_global, TIMEOUT_MEDIA_GLOBAL)
+
+
+def puntuacion(suma, total, media, verificado, completadas, ultima_visita, hoy):
+    bayesiana = (PESO_PREVIO * media + suma) / (PESO_PREVIO + total)
+    volumen = BONO_VOLUMEN * min(log1p(completadas) / log1p(TOPE_VOLUMEN), 1)
+    recencia = 0
+    if ultima_visita:
+        recencia = BONO_RECENCIA * 0.5 ** (max((hoy - ultima_visita).days, 0) / VIDA_MEDIA_RECENCIA_DIAS)
+    valor = bayesiana + (BONO_VERIFICADO if verificado else 0) + volumen + recencia
+    return Decimal(valor).quantize(Decimal('0.001'))
+
+
+def _actividad(resumenes, hoy):
+    """Filas de ResumenDiarioCitas con citas completadas recientes"""
+    return resumenes.filter(
+        estado='completada', total__gt=0, fecha__gte=hoy - timedelta(days=VENTANA_VOLUMEN_DIAS)
+    )
+
+
+def actualizar_ranking(negocio_id, hoy=None):
+    """Recalcula la puntuación de un negocio; devuelve el valor guardado"""
+    from .models import Negocio, ResumenDiarioCitas, ValoracionesNegocio
+
+    hoy = hoy or timezone.localdate()
+    verificado = Negocio.objects.filter(pk=negocio_id).values_list('verificado', flat=True).first()
+    if verificado is None:
+        return None
+    suma, total = ValoracionesNegocio.objects.filter(pk=negocio_id).values_list('suma', 'total').first() or (0, 0)
+    actividad = _actividad(ResumenDiarioCitas.objects.filter(negocio_id=negocio_id), hoy).aggregate(
+        completadas=Sum('total'), ultima=Max('fecha')
+    )
+    valor = puntuacion(
+        suma, total, media_global(), verificado, actividad['completadas'] or 0, actividad['ultima'], hoy
+    )
+    Negocio.objects.filter(pk=negocio_id).exclude(puntuacion_ranking=valor).update(
+        puntuacion_ranking=valor, fecha_actualizacion=timezone.now()
+    )
+    return valor
+
+
+def reconstruir_ranking(hoy=None):
+    """
+    Recalcula la media global y la puntuación de todos los negocios con tres
+    consultas y actualizaciones en bloque. Devuelve cuántos negocios cambian.
+    """
+    from .models import Negocio, ResumenDiarioCitas, ValoracionesNegocio
+
+    hoy = hoy or timezone.localdate()
+    media = calcular_media_global()
+    cache.set(CLAVE_MEDIA_GLOBAL, media, TIMEOUT_MEDIA_GLOBAL)
+
+    valoraciones = {pk: (suma, total) for pk, suma, total in ValoracionesNegocio.objects.values_list(
+        'negocio_id', 'suma', 'total'
+    )}
+    actividad = {
+        fila['negocio_id']: fila
+        for fila in _actividad(ResumenDiarioCitas.objects.order_by(), hoy).values('negocio_id').annotate(
+            completadas=Sum('total'), ultima=Max('fecha')
+        )
+    }
+    ahora = timezone.now()
+    cambiados = []
+    for negocio in Negocio.objects.only('pk', 'verificado', 'puntuacion_ranking').iterator(chunk_size=2000):
+        suma, total = valoraciones.get(negocio.pk, (0, 0))
+        datos = actividad.get(negocio.pk, {})
+        valor = puntuacion(
+            suma, total, media, negocio.verificado, datos.get('completadas') or 0, datos.get('ultima'), hoy
+        )
+        if valor != negocio.puntuacion_ranking:
+            negocio.puntuacion_ranking = valor
+            negocio.fecha_actualizacion = ahora
+            cambiados.append(negocio)
+    Negocio.objects.bulk_update(cambiados, ['puntuacion_ranking', 'fecha_actualizacion'], batch_size=500)
+    return len(cambiados)
+
@@ -0,0 +1,274 @@
+"""
+Resumen diario de citas por (negocio, empleado, servicio, día, estado).
+
+Cada cita aporta 1 al total, su precio_final a los ingresos y su duración a los
+minutos de la fila de su día local (zona horaria del negocio) y estado. Las
+señales de Cita suman y restan aportaciones con deltas F() dentro de la misma
+transacción que el cambio de la cita; `reconstruir_resumen_diario` lo regenera
+desde cero. Los informes leen de aquí en lugar de recorrer las citas; los
+cambios en días ya pasados invalidan las series en caché del negocio.
+
+Junto al resumen se mantiene un sketch HyperLogLog de clientes distintos por
+negocio y mes local (ClientesMesNegocio). Solo admite altas: un cliente cuyas
+citas del mes se borran o se mueven sigue contando hasta la reconstrucción.
+
+ResumenClienteNegocio guarda la primera y última visita y el número de
+visitas (citas completadas) de cada cliente. Pasar a completada suma una
+visita; salir de completada, borrar o mover una cita completada recalcula la
+fila de ese cliente desde sus citas.
+
+Los cambios masivos con QuerySet.update() no pasan por las señales: tras uno
+hay que reconstruir el resumen de los negocios afectados.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min
+from django.utils import timezone
+
+from . import hll
+from .fechas import obtener_zona_horaria
+from .series import invalidar_series
+
+
+CAMPOS_CITA = (
+    'negocio_id', 'empleado_id', 'servicio_id', 'fecha_hora_inicio', 'fecha_hora_fin',
+    'estado', 'precio_final', 'cliente_id',
+)
+
+
+def valores_cita(cita):
+    return {campo: getattr(cita, campo) for campo in CAMPOS_CITA}
+
+
+def aportacion(valores, zona):
+    """(clave, (total, ingresos, minutos)) de una cita dada por sus CAMPOS_CITA"""
+    clave = (
+        valores['negocio_id'],
+        valores['empleado_id'],
+        valores['servicio_id'],
+        valores['fecha_hora_inicio'].astimezone(zona).date(),
+        valores['estado'],
+    )
+    minutos = int((valores['fecha_hora_fin'] - valores['fecha_hora_inicio']).total_seconds() // 60)
+    return clave, (1, valores['precio_final'] or Decimal('0'), minutos)
+
+
+def acumular(citas, zonas):
+    """
+    Totales por clave de un iterable de citas (dicts con CAMPOS_CITA).
+    `zonas` relaciona cada negocio_id con el nombre de su zona horaria.
+    """
+    zonas = {negocio_id: obtener_zona_horaria(nombre) for negocio_id, nombre in zonas.items()}
+    totales = defaultdict(lambda: [0, Decimal('0'), 0])
+    for valores in citas:
+        clave, (total, ingresos, minutos) = aportacion(valores, zonas[valores['negocio_id']])
+        acumulado = totales[clave]
+        acumulado[0] += total
+        acumulado[1] += ingresos
+        acumulado[2] += minutos
+    return totales
+
+
+def filas_resumen(modelo, totales):
+    """Instancias sin guardar de `modelo` a partir de acumular()"""
+    return [
+        modelo(
+            negocio_id=negocio_id, empleado_id=empleado_id, servicio_id=servicio_id,
+            fecha=fecha, estado=estado, total=total, ingresos=ingresos, minutos=minutos,
+        )
+        for (negocio_id, empleado_id, servicio_id, fecha, estado), (total, ingresos, minutos) in totales.items()
+    ]
+
+
+def mes_cita(valores, zona):
+    return valores['fecha_hora_inicio'].astimezone(zona).date().replace(day=1)
+
+
+def acumular_clientes(citas, zonas):
+    """Sketches de clientes por (negocio_id, mes) de un iterable de citas"""
+    zonas = {negocio_id: obtener_zona_horaria(nombre) for negocio_id, nombre in zonas.items()}
+    sketches = defaultdict(hll.vacio)
+    for valores in citas:
+        if valores['cliente_id'] is not None:
+            clave = (valores['negocio_id'], mes_cita(valores, zonas[valores['negocio_id']]))
+            hll.añadir(sketches[clave], valores['cliente_id'])
+    return sketches
+
+
+def filas_clientes(modelo, sketches):
+    """Instancias sin guardar de `modelo` a partir de acumular_clientes()"""
+    return [
+        modelo(negocio_id=negocio_id, mes=mes, registros=bytes(registros))
+        for (negocio_id, mes), registros in sketches.items()
+    ]
+
+
+def registrar_cliente(valores, zona_horaria, anterior=None):
+    """
+    Añade el cliente de una cita al sketch de su mes; no hace nada si ya
+    estaba (mismo cliente y mes que los valores `anterior`)
+    """
+    from .models import ClientesMesNegocio
+
+    zona = obtener_zona_horaria(zona_horaria)
+    mes = mes_cita(valores, zona)
+    if valores['cliente_id'] is None:
+        return
+    if anterior is not None and (anterior['cliente_id'], mes_cita(anterior, zona)) == (valores['cliente_id'], mes):
+        return
+    with transaction.atomic():
+        fila, _ = ClientesMesNegocio.objects.select_for_update().get_or_create(
+            negocio_id=valores['negocio_id'], mes=mes,
+            defaults={'registros': bytes(hll.REGISTROS)},
+        )
+        registros = bytearray(fila.registros)
+        if hll.añadir(registros, valores['cliente_id']):
+            fila.registros = bytes(registros)
+            fila.save(update_fields=['registros'])
+
+
+def acumular_visitas(citas, zonas):
+    """[primera, última, visitas] por (negocio_id, cliente_id) de un iterable de citas"""
+    zonas = {negocio_id: obtener_zona_horaria(nombre) for negocio_id, nombre in zonas.items()}
+    visitas = {}
+    for valores in citas:
+        if valores['estado'] != 'completada' or valores['cliente_id'] is None:
+            continue
+        fecha = valores['fecha_hora_inicio'].astimezone(zonas[valores['negocio_id']]).date()
+        clave = (valores['negocio_id'], valores['cliente_id'])
+        if clave in visitas:
+            acumulado = visitas[clave]
+            acumulado[0], acumulado[1] = min(acumulado[0], fecha), max(acumulado[1], fecha)
+            acumulado[2] += 1
+        else:
+            visitas[clave] = [fecha, fecha, 1]
+    return visitas
+
+
+def filas_visitas(modelo, visitas):
+    """Instancias sin guardar de `modelo` a partir de acumular_visitas()"""
+    return [
+        modelo(negocio_id=negocio_id, cliente_id=cliente_id, primera_visita=primera, ultima_visita=ultima, visitas=total)
+        for (negocio_id, cliente_id), (primera, ultima, total) in visitas.items()
+    ]
+
+
+def recalcular_cliente(negocio_id, cliente_id, zona_horaria):
+    """Regenera la fila de visitas de un cliente desde sus citas completadas"""
+    from .models import Cita, ResumenClienteNegocio
+
+    datos = Cita.objects.filter(negocio_id=negocio_id, cliente_id=cliente_id, estado='completada').aggregate(
+        primera=Min('fecha_hora_inicio'), ultima=Max('fecha_hora_inicio'), visitas=Count('pk')
+    )
+    if not datos['visitas']:
+        ResumenClienteNegocio.objects.filter(negocio_id=negocio_id, cliente_id=cliente_id).delete()
+        return
+    zona = obtener_zona_horaria(zona_horaria)
+    ResumenClienteNegocio.objects.update_or_create(
+        negocio_id=negocio_id, cliente_id=cliente_id,
+        defaults={
+            'primera_visita': datos['primera'].astimezone(zona).date(),
+            'ultima_visita': datos['ultima'].astimezone(zona).date(),
+            'visitas': datos['visitas'],
+        },
+    )
+
+
+def registrar_visita(valores, zona_horaria, anterior=None):
+    """Actualiza el resumen de visitas del cliente tras guardar una cita"""
+    from .models import ResumenClienteNegocio
+
+    completada = valores['estado'] == 'completada' and valores['cliente_id'] is not None
+    lo_era = anterior is not None and anterior['estado'] == 'completada' and anterior['cliente_id'] is not None
+    if not completada and not lo_era:
+        return
+    if completada and not lo_era:
+        fecha = valores['fecha_hora_inicio'].astimezone(obtener_zona_horaria(zona_horaria)).date()
+        with transaction.atomic():
+            fila, creada = ResumenClienteNegocio.objects.select_for_update().get_or_create(
+                negocio_id=valores['negocio_id'], cliente_id=valores['cliente_id'],
+                defaults={'primera_visita': fecha, 'ultima_visita': fecha, 'visitas': 1},
+            )
+            if not creada:
+                fila.primera_visita = min(fila.primera_visita, fecha)
+                fila.ultima_visita = max(fila.ultima_visita, fecha)
+                fila.visitas += 1
+                fila.save(update_fields=['primera_visita', 'ultima_visita', 'visitas'])
+        return
+    if completada and (anterior['cliente_id'], anterior['fecha_hora_inicio']) == (
+        valores['cliente_id'], valores['fecha_hora_inicio']
+    ):
+        return
+    for cliente_id in {anterior['cliente_id'], valores['cliente_id'] if completada else None} - {None}:
+        recalcular_cliente(valores['negocio_id'], cliente_id, zona_horaria)
+
+
+def sumar(valores, zona_horaria, signo=1):
+    """Suma (signo=1) o resta (signo=-1) la aportación de una cita"""
+    from .models import ResumenDiarioCitas
+
+    (negocio_id, empleado_id, servicio_id, fecha, estado), (total, ingresos, minutos) = aportacion(
+        valores, obtener_zona_horaria(zona_horaria)
+    )
+    if fecha < timezone.now().astimezone(obtener_zona_horaria(zona_horaria)).date():
+        invalidar_series(negocio_id)
+
+    filas = ResumenDiarioCitas.objects.filter(
+        negocio_id=negocio_id, empleado_id=empleado_id, servicio_id=servicio_id, fecha=fecha, estado=estado
+    )
+    # Sin restricción única (empleado admite nulos): si una carrera duplica la
+    # fila, los informes suman todas y el delta se aplica solo a la primera
+    pk = filas.values_list('pk', flat=True).first()
+    if pk is None:
+        ResumenDiarioCitas.objects.create(
+            negocio_id=negocio_id, empleado_id=empleado_id, servicio_id=servicio_id, fecha=fecha,
+            estado=estado, total=signo * total, ingresos=signo * ingresos, minutos=signo * minutos,
+        )
+    else:
+        ResumenDiarioCitas.objects.filter(pk=pk).update(
+            total=F('total') + signo * total,
+            ingresos=F('ingresos') + signo * ingresos,
+            minutos=F('minutos') + signo * minutos,
+        )
+
+
+def reconstruir(negocio_ids=None):
+    """
+    Regenera los resúmenes y los sketches (de todos los negocios o de los
+    indicados) en una transacción: mientras tanto los informes siguen leyendo
+    los resúmenes anteriores y un fallo no los deja vacíos. Se bloquean las
+    filas de los negocios, así que las citas nuevas de esos negocios esperan
+    a que termine y se suman después sobre el resumen ya regenerado.
+    """
+    from .models import Cita, ClientesMesNegocio, Negocio, ResumenClienteNegocio, ResumenDiarioCitas
+
+    negocios = Negocio.objects.all()
+    resumenes = ResumenDiarioCitas.objects.all()
+    clientes = ClientesMesNegocio.objects.all()
+    visitas_clientes = ResumenClienteNegocio.objects.all()
+    citas = Cita.objects.all()
+    if negocio_ids is not None:
+        negocios = negocios.filter(pk__in=negocio_ids)
+        resumenes = resumenes.filter(negocio_id__in=negocio_ids)
+        clientes = clientes.filter(negocio_id__in=negocio_ids)
+        visitas_clientes = visitas_clientes.filter(negocio_id__in=negocio_ids)
+        citas = citas.filter(negocio_id__in=negocio_ids)
+
+    with transaction.atomic():
+        zonas = dict(negocios.select_for_update().order_by('pk').values_list('pk', 'zona_horaria'))
+        totales = acumular(citas.values(*CAMPOS_CITA).iterator(chunk_size=2000), zonas)
+        sketches = acumular_clientes(citas.values(*CAMPOS_CITA).iterator(chunk_size=2000), zonas)
+        visitas = acumular_visitas(
+            citas.filter(estado='completada').values(*CAMPOS_CITA).iterator(chunk_size=2000), zonas
+        )
+        resumenes.delete()
+        clientes.delete()
+        visitas_clientes.delete()
+        ResumenDiarioCitas.objects.bulk_create(filas_resumen(ResumenDiarioCitas, totales), batch_size=1000)
+        ClientesMesNegocio.objects.bulk_create(filas_clientes(ClientesMesNegocio, sketches), batch_size=200)
+        ResumenClienteNegocio.objects.bulk_create(filas_visitas(ResumenClienteNegocio, visitas), batch_size=1000)
+        for negocio_id in zonas:
+            transaction.on_commit(lambda negocio_id=negocio_id: invalidar_series(negocio_id))
+    return len(totales)
@@ -0,0 +1,96 @@
+"""
+Retención de clientes de un negocio por meses locales.
+
+Las cohortes y los intervalos entre visitas se leen de ResumenClienteNegocio
+(primera y última visita y número de visitas de cada cliente) con lecturas
+agrupadas, sin cruzar las citas consigo mismas. Un cliente de la cohorte del
+mes M sigue activo en M+k si su última visita es de ese mes o posterior. Los
+clientes con visitas en cada mes salen de una única consulta agrupada sobre
+las citas completadas de la ventana.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from statistics import median
+
+from django.db.models import Count, DateField
+from django.db.models.functions import TruncMonth
+
+from .estadisticas import q_ventana
+from .fechas import obtener_zona_horaria
+from .series import siguiente_tramo, tramos
+
+
+MAXIMO_MESES = 36
+RANGOS_INTERVALO = ((7, 'hasta_7_dias'), (30, 'hasta_30_dias'), (90, 'hasta_90_dias'))
+
+
+def _indice_mes(mes, base):
+    return (mes.year - base.year) * 12 + mes.month - base.month
+
+
+def distribucion_intervalos(dias):
+    """Clientes por rango de días medios entre visitas"""
+    distribucion = {clave: 0 for _, clave in RANGOS_INTERVALO}
+    distribucion['mas_de_90_dias'] = 0
+    for valor in dias:
+        clave = next((clave for limite, clave in RANGOS_INTERVALO if valor <= limite), 'mas_de_90_dias')
+        distribucion[clave] += 1
+    return distribucion
+
+
+def informe_retencion(negocio, desde, hasta):
+    """Informe de los meses completos que cubren los días locales [desde, hasta]"""
+    zona = obtener_zona_horaria(negocio.zona_horaria)
+    meses = tramos(desde, hasta, 'mes')
+    inicio, fin = meses[0], siguiente_tramo(meses[-1], 'mes')
+    clientes = negocio.resumenes_clientes.order_by()
+
+    nuevos = defaultdict(int)
+    retenidos = {mes: [0] * (len(meses) - n) for n, mes in enumerate(meses)}
+    for fila in clientes.filter(primera_visita__gte=inicio, primera_visita__lt=fin).values(
+        cohorte=TruncMonth('primera_visita'), ultimo=TruncMonth('ultima_visita')
+    ).annotate(total=Count('pk')):
+        nuevos[fila['cohorte']] += fila['total']
+        activos = retenidos[fila['cohorte']]
+        for k in range(min(_indice_mes(fila['ultimo'], fila['cohorte']) + 1, len(activos))):
+            activos[k] += fila['total']
+
+    con_visitas = dict(
+        negocio.citas.filter(q_ventana(inicio, fin - timedelta(days=1), zona), estado='completada')
+        .order_by()
+        .annotate(mes=TruncMonth('fecha_hora_inicio', output_field=DateField(), tzinfo=zona))
+        .values('mes')
+        .annotate(total=Count('cliente', distinct=True))
+        .values_list('mes', 'total')
+    )
+
+    dias = [
+        (ultima - primera).days / (visitas - 1)
+        for primera, ultima, visitas in clientes.filter(
+            visitas__gt=1, primera_visita__lt=fin, ultima_visita__gte=inicio
+        ).values_list('primera_visita', 'ultima_visita', 'visitas')
+    ]
+
+    return {
+        'desde': inicio,
+        'hasta': fin - timedelta(days=1),
+        'meses': [
+            {
+                'mes': mes,
+                'clientes': con_visitas.get(mes, 0),
+                'nuevos': nuevos[mes],
+                'recurrentes': max(con_visitas.get(mes, 0) - nuevos[mes], 0),
+            }
+            for mes in meses
+        ],
+        'cohortes': [
+            {'cohorte': mes, 'clientes': nuevos[mes], 'activos': retenidos[mes]}
+            for mes in meses if nuevos[mes]
+        ],
+        'intervalos': {
+            'clientes_recurrentes': len(dias),
+            'media_dias': round(sum(dias) / len(dias), 1) if dias else None,
+            'mediana_dias': round(median(dias), 1) if dias else None,
+            'distribucion': distribucion_intervalos(dias),
+        },
+    }
@@ -116,7 +116,11 @@ class CategoriaNegocioSerializer(serializers.ModelSerializer):
         ]
 
     def get_total_negocios(self, obj):
-        return obj.negocios.filter(activo=True).count()
+        # Memoizado en el contexto: en listados anidados la misma categoría se repite
+        totales = self.context.setdefault('_total_negocios_por_categoria', {})
+        if obj.pk not in totales:
+            totales[obj.pk] = obj.negocios.filter(activo=True).count()
+        return totales[obj.pk]
 
 
 class NegocioSerializer(serializers.ModelSerializer):
@@ -126,6 +130,8 @@ class NegocioSerializer(serializers.ModelSerializer):
     suscripcion_activa = serializers.BooleanField(read_only=True)
     total_empleados = serializers.SerializerMethodField()
     total_servicios = serializers.SerializerMethodField()
+    # Solo presente cuando se filtra por lat/lon
+    distancia_km = serializers.FloatField(read_only=True)
 
     class Meta:
         model = Negocio
@@ -135,20 +141,26 @@ class NegocioSerializer(serializers.ModelSerializer):
             'codigo_postal', 'latitud', 'longitud', 'logo', 'imagen_portada',
             'zona_horaria', 'tiempo_anticipacion_minimo', 'tiempo_cancelacion_limite',
             'permite_reservas_multiples', 'estado_suscripcion', 'fecha_inicio_suscripcion',
-            'fecha_fin_suscripcion', 'calificacion_promedio', 'total_reseñas',
-            'activo', 'verificado', 'fecha_creacion', 'fecha_actualizacion',
+            'fecha_fin_suscripcion', 'calificacion_promedio', 'total_reseñas', 'puntuacion_ranking',
+            'activo', 'verificado', 'precio_min', 'precio_max', 'duracion_min',
+            'duracion_max', 'proxima_disponibilidad', 'fecha_creacion', 'fecha_actualizacion',
             'propietario_info', 'categoria_info', 'suscripcion_activa',
-            'total_empleados', 'total_servicios'
+            'total_empleados', 'total_servicios', 'distancia_km'
         ]
         read_only_fields = [
-            'propietario', 'slug', 'calificacion_promedio', 'total_reseñas', 'verificado',
-            'fecha_creacion', 'fecha_actualizacion'
+            'propietario', 'slug', 'calificacion_promedio', 'total_reseñas', 'puntuacion_ranking', 'verificado',
+            'precio_min', 'precio_max', 'duracion_min', 'duracion_max',
+            'proxima_disponibilidad', 'fecha_creacion', 'fecha_actualizacion'
         ]
 
     def get_total_empleados(self, obj):
+        if hasattr(obj, 'empleados_activos'):
+            return len(obj.empleados_activos)
         return obj.empleados.filter(activo=True).count()
 
     def get_total_servicios(self, obj):
+        if hasattr(obj, 'servicios_activos'):
+            return len(obj.servicios_activos)
         return obj.servicios.filter(activo=True).count()
 
 
@@ -187,8 +199,10 @@ class ServicioNegocioSerializer(serializers.ModelSerializer):
             'id', 'negocio', 'nombre', 'descripcion', 'duracion_minutos', 'precio',
             'requiere_confirmacion', 'disponible_online', 'maximo_por_dia',
             'empleados_autorizados', 'orden', 'activo', 'fecha_creacion',
-            'negocio_info', 'empleados_autorizados_info', 'precio_formateado'
+            'fecha_actualizacion', 'negocio_info', 'empleados_autorizados_info',
+            'precio_formateado'
         ]
+        read_only_fields = ['fecha_creacion', 'fecha_actualizacion']
 
     def get_precio_formateado(self, obj):
         return f"€{obj.precio}"
@@ -342,14 +356,18 @@ class CitaCreateSerializer(serializers.ModelSerializer):
 
 class NegocioEstadisticasSerializer(serializers.Serializer):
     """Serializer para estadísticas del negocio"""
+    desde = serializers.DateField(allow_null=True)
+    hasta = serializers.DateField(allow_null=True)
     total_citas = serializers.IntegerField()
     citas_pendientes = serializers.IntegerField()
     citas_confirmadas = serializers.IntegerField()
     citas_completadas = serializers.IntegerField()
     citas_canceladas = serializers.IntegerField()
+    ingresos = serializers.DecimalField(max_digits=12, decimal_places=2)
     ingresos_mes_actual = serializers.DecimalField(max_digits=10, decimal_places=2)
     calificacion_promedio = serializers.DecimalField(max_digits=3, decimal_places=2)
     total_clientes = serializers.IntegerField()
+    clientes_exacto = serializers.BooleanField()
 
 
 class DisponibilidadSerializer(serializers.Serializer):
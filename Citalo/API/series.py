@@ -0,0 +1,120 @@
+"""
+Series temporales de citas de un negocio por día, semana o mes.
+
+Se calculan sobre ResumenDiarioCitas, cuyas fechas ya son días locales del
+negocio, agrupando con TruncWeek/TruncMonth en la base de datos. Cada tramo
+cerrado (que termina antes de hoy) se guarda en caché por separado y no se
+vuelve a calcular; solo el tramo en curso y los que falten en caché se piden a
+la base de datos, en una única consulta. Un cambio que afecta a días pasados
+(p. ej. marcar como no asistida una cita de ayer) sube la versión de las
+series del negocio; con varios procesos la caché tiene que ser compartida
+(CACHES en settings.py).
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .estadisticas import ESTADOS_CANCELADA
+
+
+INTERVALOS = ('dia', 'semana', 'mes')
+MAXIMO_TRAMOS = 400
+TIMEOUT_TRAMO_CERRADO = 30 * 24 * 3600
+
+
+def inicio_tramo(fecha, intervalo):
+    if intervalo == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if intervalo == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+
+def siguiente_tramo(inicio, intervalo):
+    if intervalo == 'semana':
+        return inicio + timedelta(days=7)
+    if intervalo == 'mes':
+        return (inicio + timedelta(days=31)).replace(day=1)
+    return inicio + timedelta(days=1)
+
+
+def tramos(desde, hasta, intervalo):
+    """Inicios de los tramos que cubren [desde, hasta]"""
+    inicio = inicio_tramo(desde, intervalo)
+    resultado = []
+    while inicio <= hasta:
+        resultado.append(inicio)
+        inicio = siguiente_tramo(inicio, intervalo)
+    return resultado
+
+
+def _clave_version(negocio_id):
+    return f'series:version:{negocio_id}'
+
+
+def invalidar_series(negocio_id):
+    try:
+        cache.incr(_clave_version(negocio_id))
+    except ValueError:
+        cache.set(_clave_version(negocio_id), 1, None)
+
+
+def _clave_tramo(negocio_id, version, intervalo, inicio):
+    return f'series:{negocio_id}:{version}:{intervalo}:{inicio.isoformat()}'
+
+
+def _vacio():
+    return {'reservas': 0, 'cancelaciones': 0, 'no_asistidas': 0, 'ingresos': Decimal('0')}
+
+
+def _calcular(negocio, intervalo, inicios):
+    """Métricas de los tramos indicados con una sola consulta agrupada"""
+    if not inicios:
+        return {}
+    resumen = negocio.resumenes_diarios.filter(
+        fecha__gte=min(inicios), fecha__lt=siguiente_tramo(max(inicios), intervalo)
+    ).order_by()
+    tramo = {'semana': TruncWeek('fecha'), 'mes': TruncMonth('fecha')}.get(intervalo, F('fecha'))
+
+    filas = resumen.annotate(tramo=tramo).values('tramo').annotate(
+        reservas=Sum('total'),
+        cancelaciones=Sum('total', filter=Q(estado__in=ESTADOS_CANCELADA)),
+        no_asistidas=Sum('total', filter=Q(estado='no_asistio')),
+        ingresos_tramo=Sum('ingresos', filter=Q(estado='completada')),
+    )
+    pedidos = set(inicios)
+    resultado = {inicio: _vacio() for inicio in inicios}
+    for fila in filas:
+        inicio = fila['tramo']
+        if not isinstance(inicio, date) or inicio not in pedidos:
+            continue
+        resultado[inicio] = {
+            'reservas': fila['reservas'] or 0,
+            'cancelaciones': fila['cancelaciones'] or 0,
+            'no_asistidas': fila['no_asistidas'] or 0,
+            'ingresos': fila['ingresos_tramo'] or Decimal('0'),
+        }
+    return resultado
+
+
+def calcular_series(negocio, desde, hasta, intervalo, hoy):
+    """Lista de tramos {inicio, reservas, cancelaciones, no_asistidas, ingresos}"""
+    inicios = tramos(desde, hasta, intervalo)
+    version = cache.get_or_set(_clave_version(negocio.pk), 0, None)
+    cerrados = {
+        inicio: _clave_tramo(negocio.pk, version, intervalo, inicio)
+        for inicio in inicios if siguiente_tramo(inicio, intervalo) <= hoy
+    }
+    en_cache = cache.get_many(cerrados.values())
+
+    valores = {inicio: en_cache[clave] for inicio, clave in cerrados.items() if clave in en_cache}
+    calculados = _calcular(negocio, intervalo, [inicio for inicio in inicios if inicio not in valores])
+    cache.set_many(
+        {cerrados[inicio]: datos for inicio, datos in calculados.items() if inicio in cerrados},
+        TIMEOUT_TRAMO_CERRADO,
+    )
+    valores.update(calculados)
+    return [{'inicio': inicio, **valores[inicio]} for inicio in inicios]
@@ -0,0 +1,231 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .apertura import actualizar_mascara, zonas_horarias
+from .autocompletar import indice_prefijos
+from .busqueda import obtener_motor
+from .disponibilidad import actualizar_proxima_disponibilidad
+from .ranking import actualizar_ranking
+from .facetas import invalidar_facetas
+from .resumenes import CAMPOS_CITA, recalcular_cliente, registrar_cliente, registrar_visita, sumar, valores_cita
+from .valoraciones import CAMPOS_RESEÑA, actualizar as actualizar_valoraciones, valores_reseña
+from .coincidencia import obtener_indice, usa_indice_en_memoria
+from .models import (
+    BloqueoHorario, Cita, CategoriaNegocio, Negocio, EmpleadoNegocio, HorarioNegocio,
+    ReseñaNegocio, ServicioNegocio, Usuario
+)
+
+
+def _tocar_negocio(negocio_id):
+    """Actualiza fecha_actualizacion del negocio sin disparar su save()"""
+    Negocio.objects.filter(pk=negocio_id).update(fecha_actualizacion=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=EmpleadoNegocio)
+def invalidar_negocio_por_cambio_empleado(sender, instance, **kwargs):
+    """total_empleados forma parte de la representación del negocio"""
+    _tocar_negocio(instance.negocio_id)
+
+
+@receiver([post_save, post_delete], sender=ServicioNegocio)
+def actualizar_rangos_servicios(sender, instance, **kwargs):
+    """Mantiene precio/duración min-max del negocio (también invalida su ETag)"""
+    Negocio.recalcular_rangos_servicios(instance.negocio_id)
+
+
+@receiver([post_save, post_delete], sender=Negocio)
+def invalidar_categoria_por_cambio_negocio(sender, instance, **kwargs):
+    """total_negocios forma parte de la representación de la categoría"""
+    CategoriaNegocio.objects.filter(pk=instance.categoria_id).update(
+        fecha_actualizacion=timezone.now()
+    )
+
+
+def _reindexar_negocio(negocio_id):
+    """Regenera el documento de búsqueda de un negocio"""
+    motor = obtener_motor()
+    negocio = Negocio.objects.select_related('categoria').filter(pk=negocio_id).first()
+    if negocio is None:
+        motor.eliminar(negocio_id)
+    else:
+        motor.indexar(negocio)
+
+
+@receiver(post_save, sender=Negocio)
+def indexar_negocio(sender, instance, **kwargs):
+    obtener_motor().indexar(instance)
+
+
+@receiver(post_save, sender=Negocio)
+def registrar_zona_horaria(sender, instance, **kwargs):
+    zonas_horarias.registrar_cambio(instance.zona_horaria)
+
+
+@receiver(post_delete, sender=Negocio)
+def desindexar_negocio(sender, instance, **kwargs):
+    obtener_motor().eliminar(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=ServicioNegocio)
+def reindexar_negocio_por_servicio(sender, instance, **kwargs):
+    _reindexar_negocio(instance.negocio_id)
+
+
+@receiver(post_save, sender=CategoriaNegocio)
+def reindexar_negocios_por_categoria(sender, instance, created, **kwargs):
+    if created:
+        return
+    obtener_motor().reconstruir(instance.negocios.select_related('categoria'))
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_save, sender=Cita)
+def actualizar_indice_trigramas(sender, instance, **kwargs):
+    """Mantiene el índice de trigramas en memoria (solo SQLite)"""
+    if usa_indice_en_memoria():
+        campo = 'nombre_normalizado' if sender is Usuario else 'nombre_cliente_normalizado'
+        obtener_indice(sender, campo).registrar_cambio(instance.pk, getattr(instance, campo))
+
+
+@receiver(post_delete, sender=Usuario)
+@receiver(post_delete, sender=Cita)
+def quitar_de_indice_trigramas(sender, instance, **kwargs):
+    if usa_indice_en_memoria():
+        campo = 'nombre_normalizado' if sender is Usuario else 'nombre_cliente_normalizado'
+        obtener_indice(sender, campo).registrar_cambio(instance.pk)
+
+
+@receiver(post_save, sender=Negocio)
+def autocompletar_negocio(sender, instance, **kwargs):
+    """Los servicios solo se sugieren mientras su negocio esté activo"""
+    if not instance.activo:
+        indice_prefijos.registrar_cambio('negocio', instance.pk)
+        for pk in instance.servicios.values_list('pk', flat=True):
+            indice_prefijos.registrar_cambio('servicio', pk)
+        return
+
+    indice_prefijos.registrar_cambio('negocio', instance.pk, instance.nombre, ciudad=instance.ciudad)
+    for pk, nombre in instance.servicios.filter(activo=True).values_list('pk', 'nombre'):
+        indice_prefijos.registrar_cambio('servicio', pk, nombre, negocio=str(instance.pk))
+
+
+@receiver(post_save, sender=ServicioNegocio)
+def autocompletar_servicio(sender, instance, **kwargs):
+    if instance.activo and instance.negocio.activo:
+        indice_prefijos.registrar_cambio(
+            'servicio', instance.pk, instance.nombre, negocio=str(instance.negocio_id)
+        )
+    else:
+        indice_prefijos.registrar_cambio('servicio', instance.pk)
+
+
+@receiver(post_save, sender=CategoriaNegocio)
+def autocompletar_categoria(sender, instance, **kwargs):
+    nombre = instance.nombre if instance.activa else None
+    indice_prefijos.registrar_cambio('categoria', instance.pk, nombre)
+
+
+@receiver(post_delete, sender=Negocio)
+@receiver(post_delete, sender=ServicioNegocio)
+@receiver(post_delete, sender=CategoriaNegocio)
+def quitar_de_autocompletar(sender, instance, **kwargs):
+    tipo = {Negocio: 'negocio', ServicioNegocio: 'servicio', CategoriaNegocio: 'categoria'}[sender]
+    indice_prefijos.registrar_cambio(tipo, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Negocio)
+@receiver([post_save, post_delete], sender=ServicioNegocio)
+@receiver([post_save, post_delete], sender=CategoriaNegocio)
+def invalidar_facetas_negocios(sender, instance, **kwargs):
+    invalidar_facetas()
+
+
+@receiver([post_save, post_delete], sender=HorarioNegocio)
+def actualizar_mascara_apertura(sender, instance, **kwargs):
+    actualizar_mascara(instance.negocio_id)
+
+
+@receiver([post_save, post_delete], sender=Cita)
+@receiver([post_save, post_delete], sender=BloqueoHorario)
+@receiver([post_save, post_delete], sender=HorarioNegocio)
+@receiver([post_save, post_delete], sender=EmpleadoNegocio)
+@receiver([post_save, post_delete], sender=ServicioNegocio)
+def actualizar_disponibilidad(sender, instance, **kwargs):
+    """Va después de actualizar_rangos_servicios: usa duracion_min"""
+    actualizar_proxima_disponibilidad(instance.negocio_id)
+
+
+@receiver(post_save, sender=Negocio)
+def actualizar_disponibilidad_negocio(sender, instance, created, **kwargs):
+    if not created:
+        actualizar_proxima_disponibilidad(instance.pk)
+
+
+@receiver(pre_save, sender=Cita)
+def recordar_cita_anterior(sender, instance, **kwargs):
+    """Guarda los valores previos para restar su aportación al resumen diario"""
+    instance._resumen_anterior = None
+    if not instance._state.adding:
+        instance._resumen_anterior = Cita.objects.filter(pk=instance.pk).values(*CAMPOS_CITA).first()
+
+
+@receiver(post_save, sender=Cita)
+def actualizar_resumen_diario(sender, instance, **kwargs):
+    anterior = getattr(instance, '_resumen_anterior', None)
+    actual = valores_cita(instance)
+    if anterior == actual:
+        return
+    zona = instance.negocio.zona_horaria
+    if anterior is not None:
+        sumar(anterior, zona, signo=-1)
+    sumar(actual, zona)
+    registrar_cliente(actual, zona, anterior)
+    registrar_visita(actual, zona, anterior)
+
+
+@receiver(post_save, sender=Cita)
+def actualizar_ranking_por_cita(sender, instance, **kwargs):
+    """Va después de actualizar_resumen_diario: el volumen sale del resumen"""
+    anterior = getattr(instance, '_resumen_anterior', None)
+    if 'completada' in (instance.estado, anterior and anterior['estado']):
+        actualizar_ranking(instance.negocio_id)
+
+
+@receiver(post_save, sender=Negocio)
+def actualizar_ranking_negocio(sender, instance, **kwargs):
+    """La verificación forma parte de la puntuación"""
+    actualizar_ranking(instance.pk)
+
+
+@receiver(post_delete, sender=Cita)
+def restar_de_resumen_diario(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Negocio):
+        # El resumen del negocio se borra con él
+        return
+    negocio = Negocio.objects.filter(pk=instance.negocio_id).values_list('zona_horaria', flat=True).first()
+    if negocio is not None:
+        sumar(valores_cita(instance), negocio, signo=-1)
+        if instance.estado == 'completada' and instance.cliente_id is not None:
+            recalcular_cliente(instance.negocio_id, instance.cliente_id, negocio)
+
+
+@receiver(pre_save, sender=ReseñaNegocio)
+def recordar_reseña_anterior(sender, instance, **kwargs):
+    """Guarda los valores previos para aplicar solo la diferencia a las valoraciones"""
+    instance._valoracion_anterior = None
+    if not instance._state.adding:
+        instance._valoracion_anterior = ReseñaNegocio.objects.filter(pk=instance.pk).values(*CAMPOS_RESEÑA).first()
+
+
+@receiver(post_save, sender=ReseñaNegocio)
+def actualizar_valoraciones_negocio(sender, instance, **kwargs):
+    actualizar_valoraciones(getattr(instance, '_valoracion_anterior', None), valores_reseña(instance))
+
+
+@receiver(post_delete, sender=ReseñaNegocio)
+def restar_de_valoraciones(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Negocio):
+        # Las valoraciones del negocio se borran con él
+        return
+    actualizar_valoraciones(valores_reseña(instance), None)
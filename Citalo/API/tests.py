@@ -1,17 +1,44 @@
-from django.test import TestCase
+import gzip
+from io import StringIO
+from unittest import mock
+
+from django.http import HttpResponse
+from django.db import connection
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.paginator import EmptyPage
 from rest_framework.test import APITestCase, APIClient
 from rest_framework.authtoken.models import Token
 from rest_framework import status
 from django.utils import timezone
-from datetime import datetime, timedelta, time
+from datetime import date, datetime, timedelta, time
+from time import perf_counter
+from zoneinfo import ZoneInfo
 from decimal import Decimal
 
+from .apertura import CUARTOS_POR_DIA, calcular_mascara, q_abierto_hoy, zonas_horarias
+from .autocompletar import indice_prefijos
+from .busqueda import MotorBusqueda, normalizar, raiz
+from .disponibilidad import primer_hueco
+from .estadisticas import calcular_estadisticas
+from .coincidencia import MAXIMO_COINCIDENCIAS, normalizar_nombre, normalizar_telefono, obtener_indice
+from .filters import BloqueoHorarioFilter, CitaFilter, UsuarioFilter
+from .geo import caja_delimitadora, haversine_km
+from .metricas import actualizar_metricas, leer_metricas
+from .ranking import puntuacion, reconstruir_ranking
+from .resumenes import reconstruir
+from . import hll
+from .pagination import ConteoAproximadoPaginator
+from .middleware import CompresionRespuestaMiddleware, parsear_accept_encoding
+from .utilizacion import calcular_utilizacion, intersecar, repartir, restar, unir
 from .models import (
     Usuario, CategoriaNegocio, Negocio, EmpleadoNegocio, 
-    ServicioNegocio, HorarioNegocio, BloqueoHorario, Cita,
-    ReseñaNegocio, FacturacionSuscripcion, ConfiguracionPlataforma
+    ServicioNegocio, HorarioNegocio, BloqueoHorario, Cita, ResumenClienteNegocio, ResumenDiarioCitas,
+    ReseñaNegocio, ValoracionesNegocio, FacturacionSuscripcion, ConfiguracionPlataforma, MetricaPlataforma
 )
 
 User = get_user_model()
@@ -202,6 +229,57 @@ class UsuarioAPITestCase(BaseAPITestCase):
         self.assertTrue(self.cliente_user.check_password('nuevapass123'))
 
 
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ConteoAproximadoTestCase(BaseAPITestCase):
+    """Tests para la paginación con conteo aproximado"""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            User.objects.create(username=f'extra_{i}', email=f'extra_{i}@test.com')
+        self.authenticate_as_cliente()
+
+    def test_conteo_exacto_por_debajo_del_umbral(self):
+        """Test que por debajo del umbral el conteo es exacto"""
+        response = self.client.get(reverse('api:usuario-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 5)
+        self.assertFalse(response.data['count_aproximado'])
+
+    @override_settings(CONTEO_APROXIMADO={'UMBRAL_EXACTO': 2, 'TIMEOUT_CACHE': 60})
+    def test_conteo_aproximado_por_encima_del_umbral(self):
+        """Test que por encima del umbral se usa el conteo cacheado"""
+        url = reverse('api:usuario-list')
+        response = self.client.get(url)
+        self.assertTrue(response.data['count_aproximado'])
+        self.assertEqual(response.data['count'], 5)
+
+        # El conteo cacheado no se recalcula hasta que expira el TTL
+        User.objects.create(username='extra_nuevo', email='extra_nuevo@test.com')
+        response = self.client.get(url)
+        self.assertEqual(response.data['count'], 5)
+
+    @override_settings(CONTEO_APROXIMADO={'UMBRAL_EXACTO': 2, 'TIMEOUT_CACHE': 60})
+    def test_paginas_mas_alla_de_una_estimacion_corta(self):
+        """Test que un conteo estimado por debajo del real no deja páginas inalcanzables"""
+        cache.clear()
+        usuarios = Usuario.objects.order_by('username')
+        self.assertEqual(ConteoAproximadoPaginator(usuarios, 2).count, 5)
+        for i in range(3, 6):
+            User.objects.create(username=f'extra_{i}', email=f'extra_{i}@test.com')
+
+        paginator = ConteoAproximadoPaginator(usuarios, 2)
+        self.assertEqual(paginator.num_pages, 3)
+        self.assertTrue(paginator.page(3).has_next())
+        ultima = paginator.page(4)
+        self.assertEqual([usuario.username for usuario in ultima], ['extra_5', 'negocio_test'])
+        self.assertFalse(ultima.has_next())
+        with self.assertRaises(EmptyPage):
+            paginator.page(5)
+
+
+
 class CategoriaNegocioAPITestCase(BaseAPITestCase):
     """Tests para la API de categorías de negocio"""
     
@@ -293,6 +371,1556 @@ class NegocioAPITestCase(BaseAPITestCase):
         self.assertIn('horarios_disponibles', response.data)
 
 
+class ConditionalGetTestCase(BaseAPITestCase):
+    """Tests para GET condicional en endpoints de catálogo"""
+
+    def test_detalle_negocio_devuelve_304_con_etag(self):
+        """Test If-None-Match en detalle de negocio"""
+        url = reverse('api:negocio-detail', kwargs={'pk': self.negocio.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_listado_categorias_cambia_etag_al_modificar(self):
+        """Test que el ETag del listado cambia cuando cambia el catálogo"""
+        url = reverse('api:categoria-negocio-list')
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        CategoriaNegocio.objects.create(nombre='Spa', activa=True)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cambios_en_relaciones_anidadas_invalidan_etag(self):
+        """Test que renombrar la categoría o editar el propietario cambia el ETag del negocio"""
+        pasado = timezone.now() - timedelta(days=1)
+        Negocio.objects.update(fecha_actualizacion=pasado)
+        CategoriaNegocio.objects.update(fecha_actualizacion=pasado)
+        Usuario.objects.update(fecha_actualizacion=pasado)
+        listado = reverse('api:negocio-list')
+        detalle = reverse('api:negocio-detail', kwargs={'pk': self.negocio.pk})
+        etags = {url: self.client.get(url)['ETag'] for url in (listado, detalle)}
+
+        self.categoria.nombre = 'Peluquería y Barbería'
+        self.categoria.save()
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            etags[url] = response['ETag']
+
+        self.negocio_user.first_name = 'Otro'
+        self.negocio_user.save()
+        for url, etag in etags.items():
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_nuevo_servicio_invalida_etag_del_negocio(self):
+        """Test que crear un servicio invalida el ETag del negocio"""
+        url = reverse('api:negocio-detail', kwargs={'pk': self.negocio.pk})
+        etag = self.client.get(url)['ETag']
+
+        ServicioNegocio.objects.create(
+            negocio=self.negocio,
+            nombre='Peinado',
+            duracion_minutos=30,
+            precio=Decimal('12.00')
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_servicios'], 1)
+
+
+class CompresionRespuestaTestCase(TestCase):
+    """Tests para el middleware de compresión"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.cuerpo = b'{"results": [' + b'{"nombre": "Peluqueria"},' * 200 + b'{}]}'
+
+    def procesar(self, cuerpo, accept_encoding='gzip', etag=None):
+        response = HttpResponse(cuerpo, content_type='application/json')
+        if etag:
+            response['ETag'] = etag
+        middleware = CompresionRespuestaMiddleware(lambda request: response)
+        request = self.factory.get('/api/negocios/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return middleware(request)
+
+    def test_comprime_respuestas_grandes(self):
+        """Test que las respuestas por encima del umbral se comprimen con gzip"""
+        response = self.procesar(self.cuerpo)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), self.cuerpo)
+
+    def test_no_comprime_por_debajo_del_umbral(self):
+        """Test que las respuestas pequeñas no se comprimen"""
+        response = self.procesar(b'{"ok": true}')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_respeta_codificaciones_rechazadas(self):
+        """Test que gzip;q=0 desactiva la compresión"""
+        response = self.procesar(self.cuerpo, accept_encoding='gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(parsear_accept_encoding('br;q=0.5, gzip'), {'br': 0.5, 'gzip': 1.0})
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_reutiliza_cuerpo_comprimido_por_etag(self):
+        """Test que un ETag repetido reutiliza el cuerpo comprimido en caché"""
+        primera = self.procesar(self.cuerpo, etag='"abc"')
+        self.assertEqual(primera['ETag'], 'W/"abc"')
+
+        # Mismo ETag: se sirve lo cacheado aunque el cuerpo original difiera
+        segunda = self.procesar(self.cuerpo + b' ', etag='"abc"')
+        self.assertEqual(segunda.content, primera.content)
+
+
+class BatchGetTestCase(BaseAPITestCase):
+    """Tests para el multi-get con ?ids="""
+
+    def setUp(self):
+        super().setUp()
+        self.otro_negocio = Negocio.objects.create(
+            propietario=self.negocio_user,
+            categoria=self.categoria,
+            nombre='Barbería Test',
+            telefono='123456789',
+            email='barberia@test.com',
+            direccion='Calle Test 456',
+            ciudad='Madrid'
+        )
+        self.servicio = ServicioNegocio.objects.create(
+            negocio=self.negocio,
+            nombre='Corte de Cabello',
+            duracion_minutos=30,
+            precio=Decimal('15.00')
+        )
+
+    def test_batch_negocios_respeta_orden_y_no_encontrados(self):
+        """Test que se devuelven en el orden pedido y se informan los ausentes"""
+        inexistente = '00000000-0000-0000-0000-000000000000'
+        ids = [str(self.otro_negocio.pk), inexistente, str(self.negocio.pk)]
+        url = reverse('api:negocio-list')
+
+        response = self.client.get(url, {'ids': ','.join(ids)})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [negocio['id'] for negocio in response.data['results']],
+            [str(self.otro_negocio.pk), str(self.negocio.pk)]
+        )
+        self.assertEqual(response.data['no_encontrados'], [inexistente])
+        self.assertEqual(response.data['results'][1]['total_servicios'], 1)
+
+    def test_batch_negocios_consultas_constantes(self):
+        """Test que el número de consultas no depende del número de ids"""
+        url = reverse('api:negocio-list')
+        ids = f'{self.negocio.pk},{self.otro_negocio.pk}'
+        # negocios + empleados + servicios + total_negocios de la categoría
+        with self.assertNumQueries(4):
+            self.client.get(url, {'ids': ids})
+
+    def test_batch_servicios_y_citas_consultas_constantes(self):
+        """Test que servicios y citas cargan los empleados autorizados con consultas fijas"""
+        empleado = EmpleadoNegocio.objects.create(usuario=self.cliente_user, negocio=self.negocio)
+        servicios = [self.servicio] + [
+            ServicioNegocio.objects.create(
+                negocio=self.negocio, nombre=f'Servicio {i}', duracion_minutos=30, precio=Decimal('10.00')
+            )
+            for i in range(5)
+        ]
+        citas = []
+        for i, servicio in enumerate(servicios):
+            servicio.empleados_autorizados.add(empleado)
+            citas.append(Cita.objects.create(
+                negocio=self.negocio, cliente=self.cliente_user, servicio=servicio,
+                fecha_hora_inicio=timezone.now() + timedelta(days=i + 1),
+                nombre_cliente='Cliente', telefono_cliente='600000000', email_cliente='c@test.com'
+            ))
+
+        url = reverse('api:servicio-negocio-list')
+        # servicios + empleados autorizados con su usuario
+        for lote in (servicios[:1], servicios):
+            with self.assertNumQueries(2):
+                response = self.client.get(url, {'ids': ','.join(str(s.pk) for s in lote)})
+            self.assertEqual(len(response.data['results']), len(lote))
+
+        self.authenticate_as_cliente()
+        url = reverse('api:cita-list')
+        # token + citas + empleados y servicios activos del negocio + empleados
+        # autorizados + total_negocios de la categoría
+        for lote in (citas[:1], citas):
+            with self.assertNumQueries(6):
+                response = self.client.get(url, {'ids': ','.join(str(c.pk) for c in lote)})
+            self.assertEqual(len(response.data['results']), len(lote))
+
+    def test_batch_citas_solo_del_usuario(self):
+        """Test que el multi-get de citas respeta el alcance del usuario"""
+        otro_cliente = User.objects.create(username='otro_cliente', tipo_usuario='cliente')
+        ajena = Cita.objects.create(
+            negocio=self.negocio,
+            cliente=otro_cliente,
+            servicio=self.servicio,
+            fecha_hora_inicio=timezone.now() + timedelta(days=1),
+            nombre_cliente='Otro',
+            telefono_cliente='111111111',
+            email_cliente='otro@test.com'
+        )
+        propia = Cita.objects.create(
+            negocio=self.negocio,
+            cliente=self.cliente_user,
+            servicio=self.servicio,
+            fecha_hora_inicio=timezone.now() + timedelta(days=2),
+            nombre_cliente='Cliente Test',
+            telefono_cliente='123456789',
+            email_cliente='cliente@test.com'
+        )
+
+        self.authenticate_as_cliente()
+        response = self.client.get(reverse('api:cita-list'), {'ids': f'{ajena.pk},{propia.pk}'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([cita['id'] for cita in response.data['results']], [str(propia.pk)])
+        self.assertEqual(response.data['no_encontrados'], [str(ajena.pk)])
+
+    def test_batch_ids_invalidos(self):
+        """Test que ids mal formados devuelven 400"""
+        response = self.client.get(reverse('api:negocio-list'), {'ids': 'no-es-uuid'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RangoPreciosNegocioTestCase(BaseAPITestCase):
+    """Tests para los rangos de precio desnormalizados en Negocio"""
+
+    def setUp(self):
+        super().setUp()
+        self.barato = ServicioNegocio.objects.create(
+            negocio=self.negocio, nombre='Flequillo', duracion_minutos=15, precio=Decimal('5.00')
+        )
+        self.caro = ServicioNegocio.objects.create(
+            negocio=self.negocio, nombre='Mechas', duracion_minutos=120, precio=Decimal('80.00')
+        )
+
+    def test_rangos_se_mantienen_al_guardar_y_borrar(self):
+        """Test que los rangos siguen a los servicios activos"""
+        self.negocio.refresh_from_db()
+        self.assertEqual(self.negocio.precio_min, Decimal('5.00'))
+        self.assertEqual(self.negocio.precio_max, Decimal('80.00'))
+        self.assertEqual(self.negocio.duracion_max, 120)
+
+        self.caro.activo = False
+        self.caro.save()
+        self.negocio.refresh_from_db()
+        self.assertEqual(self.negocio.precio_max, Decimal('5.00'))
+
+        self.barato.delete()
+        self.negocio.refresh_from_db()
+        self.assertIsNone(self.negocio.precio_min)
+
+    def test_rango_completo_exige_un_mismo_servicio(self):
+        """Test que precio_desde y precio_hasta se aplican al mismo servicio"""
+        url = reverse('api:negocio-list')
+
+        # 5€ y 80€: cada extremo lo cumple un servicio distinto, ninguno está en [20, 50]
+        response = self.client.get(url, {'precio_desde': 20, 'precio_hasta': 50})
+        self.assertEqual(len(response.data['results']), 0)
+
+        response = self.client.get(url, {'precio_desde': 50})
+        self.assertEqual(len(response.data['results']), 1)
+
+        response = self.client.get(url, {'precio_hasta': 10, 'ordering': 'precio_min'})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['precio_min'], '5.00')
+
+
+class BusquedaTextoCompletoTestCase(BaseAPITestCase):
+    """Tests para la búsqueda de texto completo de negocios"""
+
+    def setUp(self):
+        super().setUp()
+        self.barberia = Negocio.objects.create(
+            propietario=self.negocio_user, categoria=self.categoria,
+            nombre='Barbería Clásica', descripcion='Afeitado tradicional',
+            slug='barberia-clasica', telefono='600000000', email='barberia@test.com',
+            direccion='Gran Vía 1', ciudad='Málaga', provincia='Málaga', codigo_postal='29001'
+        )
+        self.url = reverse('api:negocio-list')
+
+    def buscar(self, consulta):
+        response = self.client.get(self.url, {'search': consulta})
+        return [negocio['nombre'] for negocio in response.data['results']]
+
+    def test_normalizacion_y_raiz(self):
+        """Test plegado de acentos y stemming ligero"""
+        self.assertEqual(normalizar('Peluquería MÁLAGA'), 'peluqueria malaga')
+        self.assertEqual(raiz('peluquerias'), raiz('peluqueria'))
+        self.assertEqual(raiz('cortes'), raiz('corte'))
+
+    def test_busqueda_sin_acentos_plurales_y_prefijos(self):
+        """Test que la búsqueda ignora acentos, plurales y admite prefijos"""
+        self.assertEqual(self.buscar('malaga'), ['Barbería Clásica'])
+        # Ambos son de la categoría Peluquería; el nombre pesa más
+        self.assertEqual(self.buscar('peluquerias'), ['Peluquería Test', 'Barbería Clásica'])
+        self.assertEqual(self.buscar('barb'), ['Barbería Clásica'])
+        self.assertEqual(self.buscar('barberia madrid'), [])
+
+    def test_indice_incremental_de_servicios_y_ranking(self):
+        """Test que los servicios se indexan al guardar y el nombre pesa más"""
+        self.assertEqual(self.buscar('afeitado'), ['Barbería Clásica'])
+
+        servicio = ServicioNegocio.objects.create(
+            negocio=self.negocio, nombre='Afeitados con navaja',
+            duracion_minutos=20, precio=Decimal('12.00')
+        )
+        # La barbería lo tiene en la descripción, la peluquería en un servicio
+        self.assertEqual(self.buscar('afeitado'), ['Peluquería Test', 'Barbería Clásica'])
+
+        servicio.delete()
+        self.assertEqual(self.buscar('navaja'), [])
+
+        self.barberia.nombre = 'Estudio Navaja'
+        self.barberia.save()
+        self.assertEqual(self.buscar('navaja'), ['Estudio Navaja'])
+
+    def test_motor_sin_indice_filtra_con_icontains(self):
+        """Test que el motor base busca cada término en los campos del negocio"""
+        motor = MotorBusqueda()
+        self.assertEqual(list(motor.filtrar(Negocio.objects.all(), 'Gran Málaga')), [self.barberia])
+        self.assertEqual(list(motor.filtrar(Negocio.objects.all(), 'barbería madrid')), [])
+
+
+class ProximidadNegocioTestCase(BaseAPITestCase):
+    """Tests para el filtro por distancia (lat/lon/radio_km)"""
+
+    def setUp(self):
+        super().setUp()
+        self.negocio.latitud, self.negocio.longitud = Decimal('40.4168'), Decimal('-3.7038')
+        self.negocio.save()
+        self.crear_negocio('Getafe', '40.3083', '-3.7327')
+        self.crear_negocio('Barcelona', '41.3874', '2.1686')
+        self.url = reverse('api:negocio-list')
+
+    def crear_negocio(self, nombre, latitud, longitud):
+        return Negocio.objects.create(
+            propietario=self.negocio_user, categoria=self.categoria, nombre=nombre,
+            slug=nombre.lower(), telefono='600000000', email='geo@test.com',
+            direccion='Calle 1', ciudad=nombre, latitud=Decimal(latitud), longitud=Decimal(longitud)
+        )
+
+    def test_haversine_y_caja_en_antimeridiano(self):
+        """Test distancia conocida y caja partida al cruzar el antimeridiano"""
+        self.assertAlmostEqual(haversine_km(40.4168, -3.7038, 41.3874, 2.1686), 505, delta=2)
+        fiyi = self.crear_negocio('Fiyi', '0', '-179.9')
+        self.assertEqual(list(Negocio.objects.filter(caja_delimitadora(0, 179.9, 50))), [fiyi])
+
+    def test_radio_y_orden_por_distancia(self):
+        """Test que se filtra por radio y se ordena por distancia"""
+        response = self.client.get(self.url, {'lat': '40.42', 'lon': '-3.70', 'radio_km': 20})
+        resultados = response.data['results']
+        self.assertEqual([n['nombre'] for n in resultados], ['Peluquería Test', 'Getafe'])
+        self.assertLess(resultados[0]['distancia_km'], 1)
+        self.assertAlmostEqual(resultados[1]['distancia_km'], 12.5, delta=1)
+
+        # Radio por defecto de 10 km
+        response = self.client.get(self.url, {'lat': '40.42', 'lon': '-3.70'})
+        self.assertEqual(len(response.data['results']), 1)
+
+        for radio in (1000, 0, -5):
+            response = self.client.get(self.url, {'lat': '40.42', 'lon': '-3.70', 'radio_km': radio})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, radio)
+
+        # Sin filtro de distancia no se incluye el campo
+        response = self.client.get(self.url)
+        self.assertNotIn('distancia_km', response.data['results'][0])
+
+
+class FiltrosFechaTestCase(BaseAPITestCase):
+    """Tests para los filtros de fecha por rangos en la zona horaria del negocio"""
+
+    def setUp(self):
+        super().setUp()
+        self.servicio = ServicioNegocio.objects.create(
+            negocio=self.negocio, nombre='Corte', duracion_minutos=30, precio=Decimal('15.00')
+        )
+        madrid = timezone.get_fixed_timezone(60)  # Europe/Madrid en marzo
+        self.ultima_del_dia = self.crear_cita(datetime(2025, 3, 1, 23, 30, tzinfo=madrid))
+        self.primera_del_siguiente = self.crear_cita(datetime(2025, 3, 2, 0, 30, tzinfo=madrid))
+
+    def crear_cita(self, inicio):
+        return Cita.objects.create(
+            negocio=self.negocio, cliente=self.cliente_user, servicio=self.servicio,
+            fecha_hora_inicio=inicio, nombre_cliente='Cliente Test',
+            telefono_cliente='123456789', email_cliente='cliente@test.com'
+        )
+
+    def filtrar_citas(self, **datos):
+        datos['negocio'] = str(self.negocio.pk)
+        return CitaFilter(datos, queryset=Cita.objects.all()).qs
+
+    def assertUsaIndice(self, queryset, columna):
+        """El plan accede por índice con la columna de fecha como condición"""
+        if connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            self.assertRegex(plan, rf'USING (COVERING )?INDEX \S+ \(.*{columna}[<>]', plan)
+        elif connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+                try:
+                    plan = queryset.explain()
+                finally:
+                    cursor.execute('RESET enable_seqscan')
+            self.assertIn(f'{columna} >=', plan.replace('"', ''))
+            self.assertIn('Index', plan)
+            self.assertNotIn('Filter: ((', plan)
+        else:
+            self.skipTest('Plan de consulta no comprobado para este motor')
+
+    def test_dias_en_zona_horaria_del_negocio(self):
+        """Test que los días se cortan a medianoche local, no UTC"""
+        citas = self.filtrar_citas(fecha_desde='2025-03-01', fecha_hasta='2025-03-01')
+        self.assertEqual(list(citas), [self.ultima_del_dia])
+
+        citas = self.filtrar_citas(fecha_desde='2025-03-02')
+        self.assertEqual(list(citas), [self.primera_del_siguiente])
+
+    def test_mes_y_año(self):
+        """Test mes y año como rangos semiabiertos"""
+        self.assertEqual(self.filtrar_citas(mes=3, año=2025).count(), 2)
+        self.assertEqual(self.filtrar_citas(mes=2, año=2025).count(), 0)
+        self.assertEqual(self.filtrar_citas(año=2025).count(), 2)
+        self.assertEqual(self.filtrar_citas(año=2024).count(), 0)
+
+    def test_bloqueos_activos_en_fecha(self):
+        """Test que un bloqueo que termina a medianoche no cuenta para el día siguiente"""
+        madrid = timezone.get_fixed_timezone(60)
+        bloqueo = BloqueoHorario.objects.create(
+            negocio=self.negocio,
+            fecha_inicio=datetime(2025, 3, 1, 9, 0, tzinfo=madrid),
+            fecha_fin=datetime(2025, 3, 2, 0, 0, tzinfo=madrid),
+        )
+        datos = {'negocio': str(self.negocio.pk)}
+        qs = BloqueoHorarioFilter({**datos, 'activos_en_fecha': '2025-03-01'}, queryset=BloqueoHorario.objects.all()).qs
+        self.assertEqual(list(qs), [bloqueo])
+        qs = BloqueoHorarioFilter({**datos, 'activos_en_fecha': '2025-03-02'}, queryset=BloqueoHorario.objects.all()).qs
+        self.assertEqual(list(qs), [])
+        qs = BloqueoHorarioFilter({**datos, 'fecha_hasta': '2025-03-01'}, queryset=BloqueoHorario.objects.all()).qs
+        self.assertEqual(list(qs), [bloqueo])
+
+        self.assertUsaIndice(
+            BloqueoHorarioFilter({**datos, 'activos_en_fecha': '2025-03-01'},
+                                 queryset=BloqueoHorario.objects.all()).qs,
+            'fecha_inicio'
+        )
+
+    def test_planes_usan_indices(self):
+        """Test que los filtros de fecha usan el índice (negocio, fecha_hora_inicio)"""
+        self.assertUsaIndice(self.filtrar_citas(fecha_desde='2025-03-01', fecha_hasta='2025-03-31'),
+                             'fecha_hora_inicio')
+        self.assertUsaIndice(self.filtrar_citas(mes=3, año=2025), 'fecha_hora_inicio')
+        self.assertUsaIndice(self.filtrar_citas(año=2025), 'fecha_hora_inicio')
+
+
+class BusquedaDifusaClientesTestCase(BaseAPITestCase):
+    """Tests para la búsqueda difusa de clientes por nombre y teléfono"""
+
+    def setUp(self):
+        super().setUp()
+        self.maria = User.objects.create_user(
+            username='mgarcia', email='maria@test.com', password='testpass123',
+            first_name='María', last_name='García', telefono='+34 611 22 33 44'
+        )
+        servicio = ServicioNegocio.objects.create(
+            negocio=self.negocio, nombre='Corte', duracion_minutos=30, precio=Decimal('15.00')
+        )
+        self.cita = Cita.objects.create(
+            negocio=self.negocio, cliente=self.cliente_user, servicio=servicio,
+            fecha_hora_inicio=timezone.now() + timedelta(days=1),
+            nombre_cliente='José Pérez', telefono_cliente='600-111-222', email_cliente='jose@test.com'
+        )
+        for modelo, campo in [(Usuario, 'nombre_normalizado'), (Cita, 'nombre_cliente_normalizado')]:
+            obtener_indice(modelo, campo).version = None
+
+    def test_normalizacion(self):
+        """Test columnas normalizadas al guardar"""
+        self.assertEqual(normalizar_telefono('+34 611 22 33 44'), '611223344')
+        self.assertEqual(normalizar_nombre('  José  PÉREZ '), 'jose perez')
+        self.assertEqual(self.maria.telefono_normalizado, '611223344')
+        self.assertEqual(self.cita.nombre_cliente_normalizado, 'jose perez')
+
+    def test_usuarios_por_nombre_con_erratas_y_telefono(self):
+        """Test filtros nombre y teléfono de usuarios"""
+        def filtrar(**datos):
+            return list(UsuarioFilter(datos, queryset=Usuario.objects.all()).qs)
+
+        self.assertEqual(filtrar(nombre='Garsia'), [self.maria])
+        self.assertEqual(filtrar(nombre='maria garcia'), [self.maria])
+        self.assertEqual(filtrar(telefono='611 22'), [self.maria])
+        self.assertEqual(filtrar(telefono='0034611'), [self.maria])
+        self.assertEqual(filtrar(telefono='612'), [])
+        # Sin dígitos suficientes no se abarca a todos los usuarios con teléfono
+        for telefono in ['+34', '-', '61']:
+            self.assertEqual(filtrar(telefono=telefono), [], telefono)
+
+    def test_busqueda_citas_y_actualizacion_del_indice(self):
+        """Test búsqueda de citas por nombre, teléfono y email"""
+        self.authenticate_as_negocio()
+        url = reverse('api:cita-list')
+
+        for consulta in ['jose perz', '600 111', 'jose@']:
+            response = self.client.get(url, {'search': consulta})
+            self.assertEqual(len(response.data['results']), 1, consulta)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cita.nombre_cliente = 'Ana Ruiz'
+            self.cita.save()
+        response = self.client.get(url, {'search': 'perez'})
+        self.assertEqual(len(response.data['results']), 0)
+        response = self.client.get(url, {'search': 'ana ruis'})
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_coincidencias_acotadas_y_del_queryset(self):
+        """Test que se devuelven como mucho MAXIMO_COINCIDENCIAS y solo del queryset filtrado"""
+        Usuario.objects.bulk_create([
+            Usuario(username=f'ana_{i}', email=f'ana{i}@test.com', nombre_normalizado='ana garcia')
+            for i in range(MAXIMO_COINCIDENCIAS + 100)
+        ])
+        indice = obtener_indice(Usuario, 'nombre_normalizado')
+        indice.version = None
+
+        todos = UsuarioFilter({'nombre': 'ana garcia'}, queryset=Usuario.objects.all()).qs
+        self.assertEqual(todos.count(), MAXIMO_COINCIDENCIAS)
+        ambito = Usuario.objects.filter(username__startswith='ana_1')
+        filtrados = UsuarioFilter({'nombre': 'ana garcia'}, queryset=ambito).qs
+        self.assertEqual(filtrados.count(), ambito.count())
+
+    def test_guardar_sin_cambiar_el_nombre_no_sube_la_version(self):
+        """Test que el login no obliga a reconstruir el índice en otros procesos"""
+        indice = obtener_indice(Usuario, 'nombre_normalizado')
+        indice.sincronizar()
+        version = indice.version_compartida()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.maria.last_login = timezone.now()
+            self.maria.save()
+        self.assertEqual(indice.version_compartida(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.maria.first_name = 'Marta'
+            self.maria.save()
+        self.assertEqual(indice.version_compartida(), version + 1)
+
+
+class AutocompletarTestCase(BaseAPITestCase):
+    """Tests para el autocompletado por prefijo"""
+
+    def setUp(self):
+        super().setUp()
+        self.servicio = ServicioNegocio.objects.create(
+            negocio=self.negocio, nombre='Peinado de novia', duracion_minutos=60, precio=Decimal('40.00')
+        )
+        self.url = reverse('api:negocio-autocompletar')
+        # El índice es por proceso: se fuerza a reconstruirlo con los datos de este test
+        indice_prefijos.version = None
+
+    def sugerencias(self, consulta, **params):
+        response = self.client.get(self.url, {'q': consulta, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(r['tipo'], r['etiqueta']) for r in response.data['resultados']]
+
+    def test_cambio_de_otro_proceso_entre_medias_fuerza_reconstruir(self):
+        """Test que si otro proceso sube la versión no se da la copia local por sincronizada"""
+        indice_prefijos.sincronizar()
+        version = indice_prefijos.version
+        incr = cache.incr
+
+        def incr_tras_otro_proceso(clave, delta=1):
+            # Otro proceso sube la versión justo antes que este
+            incr(clave)
+            return incr(clave, delta)
+
+        with mock.patch.object(cache, 'incr', incr_tras_otro_proceso):
+            indice_prefijos.aplicar_cambio(lambda: None)
+        self.assertEqual(indice_prefijos.version, version)
+
+        ServicioNegocio.objects.filter(pk=self.servicio.pk).update(nombre='Recogido')
+        self.assertEqual(self.sugerencias('reco'), [('servicio', 'Recogido')])
+
+    def test_prefijos_por_palabra_y_orden(self):
+        """Test coincidencias al inicio de cualquier palabra, primero desde la primera"""
+        self.assertEqual(
+            self.sugerencias('pe'),
+            [('categoria', 'Peluquería'), ('negocio', 'Peluquería Test'), ('servicio', 'Peinado de novia')]
+        )
+        self.assertEqual(self.sugerencias('NOVIA'), [('servicio', 'Peinado de novia')])
+        self.assertEqual(self.sugerencias('pe', limite=1), [('categoria', 'Peluquería')])
+        self.assertEqual(self.sugerencias(''), [])
+
+        response = self.client.get(self.url, {'q': 'pe'})
+        self.assertIn('autocompletar;dur=', response['Server-Timing'])
+
+    def test_actualizacion_incremental(self):
+        """Test que altas, cambios y bajas se reflejan sin reconstruir"""
+        self.sugerencias('pe')
+        version = indice_prefijos.version
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.servicio.nombre = 'Recogido de novia'
+            self.servicio.save()
+        self.assertEqual(self.sugerencias('recog'), [('servicio', 'Recogido de novia')])
+        self.assertEqual(self.sugerencias('peina'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.negocio.activo = False
+            self.negocio.save()
+        self.assertEqual(self.sugerencias('novia'), [])
+        self.assertEqual(self.sugerencias('pe'), [('categoria', 'Peluquería')])
+        self.assertGreater(indice_prefijos.version, version)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FacetasNegocioTestCase(BaseAPITestCase):
+    """Tests para los conteos por faceta del listado de negocios"""
+
+    def setUp(self):
+        super().setUp()
+        ServicioNegocio.objects.create(
+            negocio=self.negocio, nombre='Corte', duracion_minutos=30, precio=Decimal('15.00')
+        )
+        self.otro = Negocio.objects.create(
+            propietario=self.negocio_user, categoria=self.categoria, nombre='Peluquería Centro',
+            slug='peluqueria-centro', telefono='600000000', email='centro@test.com',
+            direccion='Calle 2', ciudad='Sevilla', verificado=True
+        )
+        ServicioNegocio.objects.create(
+            negocio=self.otro, nombre='Tinte', duracion_minutos=60, precio=Decimal('35.00')
+        )
+        self.url = reverse('api:negocio-list')
+
+    def consultas_facetas(self, consultas):
+        return sum('f_categoria' in consulta['sql'] for consulta in consultas.captured_queries)
+
+    def test_facetas_del_queryset_filtrado(self):
+        """Test conteos de las cuatro facetas en una sola consulta"""
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url, {'facetas': 'true'})
+        self.assertEqual(self.consultas_facetas(consultas), 1)
+        facetas = response.data['facetas']
+        self.assertEqual(facetas['categoria'], [
+            {'valor': self.categoria.pk, 'nombre': 'Peluquería', 'total': 2}
+        ])
+        self.assertEqual(facetas['ciudad'], [
+            {'valor': 'Madrid', 'total': 1}, {'valor': 'Sevilla', 'total': 1}
+        ])
+        self.assertEqual(facetas['verificado'], [
+            {'valor': True, 'total': 1}, {'valor': False, 'total': 1}
+        ])
+        self.assertEqual(facetas['rango_precio'], [
+            {'valor': '0-20', 'total': 1}, {'valor': '20-50', 'total': 1}
+        ])
+
+        response = self.client.get(self.url, {'facetas': 'true', 'search': 'centro'})
+        self.assertEqual(response.data['facetas']['ciudad'], [{'valor': 'Sevilla', 'total': 1}])
+
+        response = self.client.get(self.url)
+        self.assertNotIn('facetas', response.data)
+
+    def test_cache_por_filtros_e_invalidacion(self):
+        """Test que se reutiliza la caché y se invalida al guardar un negocio"""
+        self.client.get(self.url, {'facetas': 'true', 'ciudad': 'Madrid'})
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(self.url, {'ciudad': 'Madrid', 'page': 1, 'facetas': 'true'})
+        self.assertEqual(self.consultas_facetas(consultas), 0)
+
+        self.negocio.ciudad = 'Sevilla'
+        self.negocio.save()
+        response = self.client.get(self.url, {'facetas': 'true', 'ciudad': 'Madrid'})
+        self.assertEqual(response.data['facetas']['ciudad'], [])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AperturaNegocioTestCase(BaseAPITestCase):
+    """Tests para los filtros de apertura con la máscara semanal precalculada"""
+
+    def setUp(self):
+        super().setUp()
+        for inicio, fin in [(time(9, 0), time(14, 0)), (time(16, 30), time(20, 0))]:
+            HorarioNegocio.objects.create(negocio=self.negocio, dia_semana=0, hora_inicio=inicio, hora_fin=fin)
+        self.mexico = Negocio.objects.create(
+            propietario=self.negocio_user, categoria=self.categoria, nombre='Estética CDMX',
+            slug='estetica-cdmx', telefono='600000000', email='cdmx@test.com',
+            direccion='Reforma 1', ciudad='Ciudad de México', zona_horaria='America/Mexico_City'
+        )
+        HorarioNegocio.objects.create(negocio=self.mexico, dia_semana=0, hora_inicio=time(9, 0), hora_fin=time(14, 0))
+        self.url = reverse('api:negocio-list')
+        zonas_horarias.version = None
+
+    def nombres(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return sorted(negocio['nombre'] for negocio in response.data['results'])
+
+    def test_mascara_mantenida_por_horarios(self):
+        """Test que la máscara sigue a los horarios y admite tramos nocturnos"""
+        self.negocio.refresh_from_db()
+        lunes = self.negocio.mascara_apertura[:CUARTOS_POR_DIA]
+        self.assertEqual(lunes.count('1'), 20 + 14)
+        self.assertEqual(self.negocio.dias_apertura, 0b1)
+
+        horario = self.negocio.horarios.first()
+        horario.delete()
+        self.negocio.refresh_from_db()
+        self.assertEqual(self.negocio.mascara_apertura.count('1'), 14)
+
+        nocturno = HorarioNegocio(dia_semana=6, hora_inicio=time(22, 0), hora_fin=time(2, 0), activo=True)
+        mascara, dias = calcular_mascara([nocturno])
+        self.assertEqual(mascara[:8], '11111111')
+        self.assertEqual(mascara[-8:], '11111111')
+        self.assertEqual(dias, 0b1000001)
+
+    def test_abierto_en_hora_local_de_cada_negocio(self):
+        """Test abierto_en con y sin zona horaria"""
+        # Lunes 3 de marzo de 2025, 10:00 en Madrid = 03:00 en Ciudad de México
+        self.assertEqual(self.nombres(abierto_en='2025-03-03T10:00:00+01:00'), ['Peluquería Test'])
+        # Sin zona: las 10:00 locales de cada negocio
+        self.assertEqual(self.nombres(abierto_en='2025-03-03T10:00:00'), ['Estética CDMX', 'Peluquería Test'])
+        self.assertEqual(self.nombres(abierto_en='2025-03-03T15:00:00'), [])
+        self.assertEqual(self.nombres(abierto_en='2025-03-03T16:15:00'), [])
+        self.assertEqual(self.nombres(abierto_en='2025-03-03T16:30:00'), ['Peluquería Test'])
+
+        response = self.client.get(self.url, {'abierto_en': 'mañana'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_abierto_dia_sin_joins(self):
+        """Test abierto_dia y con_disponibilidad sobre la propia fila"""
+        self.assertEqual(self.nombres(abierto_dia=0), ['Estética CDMX', 'Peluquería Test'])
+        self.assertEqual(self.nombres(abierto_dia=2), [])
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(self.url, {'abierto_dia': 0})
+        self.assertFalse(any('horarios_negocio' in c['sql'] for c in consultas.captured_queries))
+
+        # Lunes 00:30 en Madrid es todavía domingo en Ciudad de México
+        instante = datetime(2025, 3, 3, 0, 30, tzinfo=ZoneInfo('Europe/Madrid'))
+        abiertos_hoy = Negocio.objects.filter(q_abierto_hoy(instante)).values_list('nombre', flat=True)
+        self.assertEqual(list(abiertos_hoy), ['Peluquería Test'])
+        self.assertEqual(self.client.get(self.url, {'abierto_ahora': 'true'}).status_code, status.HTTP_200_OK)
+
+    def test_zona_horaria_nueva_y_vigencia_en_dia_local(self):
+        """Test que una zona sin registrar se evalúa con la suya y la vigencia usa el día local"""
+        # Lunes 3 de marzo de 2025, 10:00 en Tokio = 02:00 en Madrid
+        instante = '2025-03-03T10:00:00+09:00'
+        self.assertEqual(self.nombres(abierto_en=instante), [])
+        self.mexico.refresh_from_db()
+        self.mexico.zona_horaria = 'Asia/Tokyo'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mexico.save()
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.nombres(abierto_en=instante), ['Estética CDMX'])
+        self.assertFalse(any('DISTINCT' in c['sql'] for c in consultas.captured_queries))
+
+        # Otro proceso cambia la zona y sube la versión compartida
+        Negocio.objects.filter(pk=self.mexico.pk).update(zona_horaria='Pacific/Kiritimati')
+        cache.incr(zonas_horarias.clave_version)
+        self.assertEqual(self.nombres(abierto_en='2025-03-03T10:00:00+14:00'), ['Estética CDMX'])
+
+        # Las 20:00 UTC del domingo ya son lunes en Tokio
+        ahora = datetime(2025, 3, 2, 20, 0, tzinfo=ZoneInfo('UTC'))
+        with mock.patch('django.utils.timezone.now', return_value=ahora):
+            HorarioNegocio.objects.create(
+                negocio=self.mexico, dia_semana=2, hora_inicio=time(9, 0), hora_fin=time(14, 0),
+                fecha_inicio_vigencia=date(2025, 3, 3),
+            )
+        self.mexico.refresh_from_db()
+        self.assertEqual(self.mexico.dias_apertura, 0b101)
+
+
+class ProximaDisponibilidadTestCase(BaseAPITestCase):
+    """Tests para el próximo hueco libre precalculado de los negocios"""
+
+    def setUp(self):
+        super().setUp()
+        self.servicio = ServicioNegocio.objects.create(
+            negocio=self.negocio, nombre='Corte', duracion_minutos=30, precio=Decimal('15.00')
+        )
+        # Abierto las 24 horas todos los días
+        for dia in range(7):
+            HorarioNegocio.objects.create(negocio=self.negocio, dia_semana=dia, hora_inicio=time(0, 0), hora_fin=time(0, 0))
+        self.sin_horario = Negocio.objects.create(
+            propietario=self.negocio_user, categoria=self.categoria, nombre='Sin Horario',
+            slug='sin-horario', telefono='600000000', email='sin@test.com', direccion='Calle 2', ciudad='Madrid'
+        )
+        self.url = reverse('api:negocio-list')
+
+    def crear_cita(self, inicio):
+        return Cita.objects.create(
+            negocio=self.negocio, cliente=self.cliente_user, servicio=self.servicio,
+            fecha_hora_inicio=inicio, nombre_cliente='Cliente Test',
+            telefono_cliente='123456789', email_cliente='cliente@test.com'
+        )
+
+    def test_primer_hueco(self):
+        """Test de huecos con citas, bloqueos, capacidad y horarios nocturnos"""
+        zona = ZoneInfo('Europe/Madrid')
+        horarios = [HorarioNegocio(dia_semana=0, hora_inicio=time(9, 0), hora_fin=time(11, 0), activo=True)]
+        desde = datetime(2025, 3, 3, 8, 0, tzinfo=zona)
+        cita = (datetime(2025, 3, 3, 9, 0, tzinfo=zona), datetime(2025, 3, 3, 9, 30, tzinfo=zona))
+        bloqueo = (datetime(2025, 3, 3, 9, 30, tzinfo=zona), datetime(2025, 3, 3, 10, 0, tzinfo=zona), False)
+
+        self.assertEqual(primer_hueco(horarios, [cita], [bloqueo], 1, 30, desde, zona).hour, 10)
+        self.assertEqual(primer_hueco(horarios, [cita], [bloqueo], 2, 30, desde, zona).hour, 9)
+        de_empleado = (cita[0], cita[1], True)
+        self.assertEqual(primer_hueco(horarios, [cita], [de_empleado], 2, 30, desde, zona).minute, 30)
+        # No cabe un servicio de 3 horas en un tramo de 2
+        self.assertIsNone(primer_hueco(horarios, [], [], 1, 180, desde, zona))
+
+        nocturno = [HorarioNegocio(dia_semana=0, hora_inicio=time(22, 0), hora_fin=time(2, 0), activo=True)]
+        martes = datetime(2025, 3, 4, 0, 40, tzinfo=zona)
+        self.assertEqual(primer_hueco(nocturno, [], [], 1, 30, martes, zona), datetime(2025, 3, 4, 1, 0, tzinfo=zona))
+
+    def test_recalculo_al_cambiar_citas(self):
+        """Test que citas y bloqueos desplazan el valor y la cancelación lo devuelve"""
+        self.negocio.refresh_from_db()
+        proxima = self.negocio.proxima_disponibilidad
+        minimo = timezone.now() + timedelta(minutes=self.negocio.tiempo_anticipacion_minimo)
+        self.assertGreaterEqual(proxima + timedelta(minutes=1), minimo)
+        self.assertLess(proxima, minimo + timedelta(minutes=30))
+
+        cita = self.crear_cita(proxima)
+        self.negocio.refresh_from_db()
+        self.assertEqual(self.negocio.proxima_disponibilidad, proxima + timedelta(minutes=30))
+
+        BloqueoHorario.objects.create(
+            negocio=self.negocio, fecha_inicio=proxima + timedelta(minutes=30), fecha_fin=proxima + timedelta(hours=2)
+        )
+        self.negocio.refresh_from_db()
+        self.assertEqual(self.negocio.proxima_disponibilidad, proxima + timedelta(hours=2))
+
+        cita.estado = 'cancelada_cliente'
+        cita.save()
+        self.negocio.refresh_from_db()
+        self.assertEqual(self.negocio.proxima_disponibilidad, proxima)
+
+    def test_ordenar_filtrar_y_barrido(self):
+        """Test de ordering con nulos al final, disponible_antes y el comando de barrido"""
+        for ordering in ['proxima_disponibilidad', '-proxima_disponibilidad']:
+            response = self.client.get(self.url, {'ordering': ordering})
+            nombres = [negocio['nombre'] for negocio in response.data['results']]
+            self.assertEqual(nombres, ['Peluquería Test', 'Sin Horario'])
+
+        manana = (timezone.now() + timedelta(days=1)).isoformat()
+        response = self.client.get(self.url, {'disponible_antes': manana})
+        self.assertEqual([negocio['nombre'] for negocio in response.data['results']], ['Peluquería Test'])
+        response = self.client.get(self.url, {'disponible_antes': 'pronto'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        Negocio.objects.filter(pk=self.negocio.pk).update(proxima_disponibilidad=timezone.now() - timedelta(hours=1))
+        call_command('recalcular_proxima_disponibilidad', stdout=StringIO())
+        self.negocio.refresh_from_db()
+        self.assertGreater(self.negocio.proxima_disponibilidad, timezone.now())
+
+
+class DisponibilidadMapaTestCase(BaseAPITestCase):
+    """Tests para el resumen de huecos de muchos negocios a la vez"""
+
+    def setUp(self):
+        super().setUp()
+        self.manana = timezone.localdate() + timedelta(days=1)
+        self.servicio = ServicioNegocio.objects.create(
+            negocio=self.negocio, nombre='Corte', duracion_minutos=30, precio=Decimal('15.00')
+        )
+        HorarioNegocio.objects.create(
+            negocio=self.negocio, dia_semana=self.manana.weekday(), hora_inicio=time(9, 0), hora_fin=time(11, 0)
+        )
+        Cita.objects.create(
+            negocio=self.negocio, cliente=self.cliente_user, servicio=self.servicio,
+            fecha_hora_inicio=datetime.combine(self.manana, time(9, 0), tzinfo=ZoneInfo('Europe/Madrid')),
+            nombre_cliente='Cliente Test', telefono_cliente='123456789', email_cliente='cliente@test.com'
+        )
+        Negocio.objects.filter(pk=self.negocio.pk).update(latitud=Decimal('40.4168'), longitud=Decimal('-3.7038'))
+        self.otros = [
+            Negocio.objects.create(
+                propietario=self.negocio_user, categoria=self.categoria, nombre=f'Negocio {i}',
+                slug=f'negocio-{i}', telefono='600000000', email=f'n{i}@test.com', direccion='Calle',
+                ciudad='Madrid', latitud=Decimal('40.42'), longitud=Decimal('-3.70')
+            )
+            for i in range(4)
+        ]
+        self.url = reverse('api:negocio-disponibilidad-mapa')
+
+    def test_resumen_por_ids_en_consultas_agrupadas(self):
+        """Test que el número de consultas no depende del número de negocios"""
+        desconocido = '00000000-0000-0000-0000-000000000000'
+        ids = ','.join([str(self.negocio.pk), str(self.otros[0].pk), desconocido])
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url, {'ids': ids, 'fecha': self.manana.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        negocios = response.data['negocios']
+        self.assertEqual(negocios[0]['huecos_libres'], 3)
+        self.assertEqual(negocios[0]['primer_hueco'].astimezone(ZoneInfo('Europe/Madrid')).time(), time(9, 30))
+        self.assertEqual(negocios[1]['huecos_libres'], 0)
+        self.assertIsNone(negocios[1]['primer_hueco'])
+        self.assertEqual(response.data['no_encontrados'], [desconocido])
+
+        ids = ','.join(str(negocio.pk) for negocio in [self.negocio, *self.otros])
+        with self.assertNumQueries(5):
+            self.client.get(self.url, {'ids': ids, 'fecha': self.manana.isoformat()})
+
+    def test_resumen_por_caja(self):
+        """Test de caja delimitadora, límites y validación"""
+        response = self.client.get(self.url, {'caja': '40.41,-3.71,40.425,-3.69', 'fecha': self.manana.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['negocios']), 5)
+        self.assertFalse(response.data['truncado'])
+
+        response = self.client.get(self.url, {'caja': '41,-3.71,42,-3.69'})
+        self.assertEqual(response.data['negocios'], [])
+
+        for params in [{'caja': 'norte'}, {}, {'ids': str(self.negocio.pk), 'fecha': '2000-01-01'},
+                       {'ids': ','.join(str(i) for i in range(201))}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class EstadisticasNegocioTestCase(BaseAPITestCase):
+    """Tests para las estadísticas del negocio en una sola consulta"""
+
+    def setUp(self):
+        super().setUp()
+        self.servicio = ServicioNegocio.objects.create(
+            negocio=self.negocio, nombre='Corte', duracion_minutos=30, precio=Decimal('20.00')
+        )
+        self.hoy = timezone.now().astimezone(ZoneInfo('Europe/Madrid')).date()
+        otro_cliente = User.objects.create_user(username='otro_cliente', tipo_usuario='cliente')
+        for dias, estado, cliente in [
+            (0, 'completada', self.cliente_user),
+            (0, 'pendiente', otro_cliente),
+            (40, 'completada', self.cliente_user),
+            (40, 'cancelada_cliente', otro_cliente),
+            (400, 'confirmada', otro_cliente),
+        ]:
+            Cita.objects.create(
+                negocio=self.negocio, cliente=cliente, servicio=self.servicio,
+                fecha_hora_inicio=datetime.combine(self.hoy - timedelta(days=dias), time(0, 30), tzinfo=ZoneInfo('Europe/Madrid')),
+                estado=estado, nombre_cliente='Cliente', telefono_cliente='600000000', email_cliente='c@test.com'
+            )
+        self.url = reverse('api:negocio-estadisticas', kwargs={'pk': self.negocio.pk})
+
+    def test_consultas_constantes(self):
+        """Test que los conteos salen del resumen diario y los clientes de los sketches mensuales"""
+        with self.assertNumQueries(2):
+            datos = calcular_estadisticas(self.negocio)
+        self.assertEqual(datos['total_citas'], 5)
+        self.assertEqual(datos['citas_completadas'], 2)
+        self.assertEqual(datos['citas_canceladas'], 1)
+        self.assertEqual(datos['ingresos'], Decimal('40.00'))
+        self.assertEqual(datos['ingresos_mes_actual'], Decimal('20.00'))
+        self.assertEqual(datos['total_clientes'], 2)
+
+    def test_ventana_desde_hasta(self):
+        """Test de la ventana de días locales y su validación"""
+        self.authenticate_as_negocio()
+        desde = self.hoy - timedelta(days=60)
+        response = self.client.get(self.url, {'desde': desde.isoformat(), 'hasta': (self.hoy - timedelta(days=1)).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_citas'], 2)
+        self.assertEqual(response.data['citas_canceladas'], 1)
+        self.assertEqual(Decimal(response.data['ingresos']), Decimal('20.00'))
+        # El mes en curso no depende de la ventana
+        self.assertEqual(Decimal(response.data['ingresos_mes_actual']), Decimal('20.00'))
+
+        response = self.client.get(self.url, {'desde': self.hoy.isoformat()})
+        self.assertEqual(response.data['total_citas'], 2)
+        self.assertEqual(response.data['total_clientes'], 2)
+
+        for params in [{'desde': 'ayer'}, {'desde': self.hoy.isoformat(), 'hasta': desde.isoformat()}]:
+            self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_benchmark_deshace_sus_datos(self):
+        """Test que el comando de benchmark se ejecuta y no deja datos"""
+        salida = StringIO()
+        call_command('benchmark_estadisticas', citas=50, clientes=5, repeticiones=1, stdout=salida)
+        self.assertIn('Resumen diario: 2 consultas', salida.getvalue())
+        self.assertFalse(Negocio.objects.filter(slug='benchmark-estadisticas').exists())
+
+    def test_resumen_diario_incremental(self):
+        """Test que altas, cambios de estado y bajas mantienen el resumen igual que una reconstrucción"""
+        cita = Cita.objects.filter(estado='pendiente').get()
+        cita.estado = 'completada'
+        cita.save()
+        fila = ResumenDiarioCitas.objects.get(negocio=self.negocio, fecha=self.hoy, estado='completada')
+        self.assertEqual((fila.total, fila.ingresos, fila.minutos), (2, Decimal('40.00'), 60))
+        self.assertEqual(ResumenDiarioCitas.objects.get(fecha=self.hoy, estado='pendiente').total, 0)
+
+        Cita.objects.filter(estado='confirmada').get().delete()
+        incremental = {
+            (fila.fecha, fila.estado): (fila.total, fila.ingresos, fila.minutos)
+            for fila in ResumenDiarioCitas.objects.exclude(total=0)
+        }
+        call_command('reconstruir_resumen_diario', stdout=StringIO())
+        reconstruido = {
+            (fila.fecha, fila.estado): (fila.total, fila.ingresos, fila.minutos)
+            for fila in ResumenDiarioCitas.objects.all()
+        }
+        self.assertEqual(incremental, reconstruido)
+        self.assertEqual(calcular_estadisticas(self.negocio)['total_citas'], 4)
+
+    def test_reconstruccion_fallida_conserva_los_resumenes(self):
+        """Test que un fallo a mitad de la reconstrucción no deja los resúmenes vacíos"""
+        antes = ResumenDiarioCitas.objects.count()
+        with mock.patch('API.resumenes.filas_visitas', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                reconstruir()
+        self.assertEqual(ResumenDiarioCitas.objects.count(), antes)
+        self.assertEqual(ResumenClienteNegocio.objects.count(), 1)
+
+
+    def test_sketch_hyperloglog(self):
+        """Test del error de la estimación y de la unión de sketches"""
+        pares, impares = hll.vacio(), hll.vacio()
+        for valor in range(20000):
+            hll.añadir(pares if valor % 2 == 0 else impares, valor)
+        self.assertAlmostEqual(hll.estimar(pares), 10000, delta=500)
+        self.assertAlmostEqual(hll.estimar(hll.unir(pares, impares)), 20000, delta=1000)
+        self.assertEqual(hll.estimar(hll.vacio()), 0)
+
+    def test_clientes_por_meses_y_extremos(self):
+        """Test que la estimación por sketches coincide con el recuento exacto"""
+        inicio_mes = self.hoy.replace(day=1)
+        nuevo = User.objects.create_user(username='nuevo_cliente', tipo_usuario='cliente')
+        Cita.objects.create(
+            negocio=self.negocio, cliente=nuevo, servicio=self.servicio,
+            fecha_hora_inicio=datetime.combine(inicio_mes - timedelta(days=70), time(12, 0), tzinfo=ZoneInfo('Europe/Madrid')),
+            nombre_cliente='Nuevo', telefono_cliente='600000000', email_cliente='n@test.com'
+        )
+        self.assertEqual(self.negocio.clientes_mensuales.count(), 4)
+
+        for desde, hasta in [
+            (None, None), (inicio_mes - timedelta(days=75), None), (self.hoy - timedelta(days=400), self.hoy),
+            (inicio_mes - timedelta(days=45), inicio_mes - timedelta(days=1)), (self.hoy, self.hoy),
+        ]:
+            aproximado = calcular_estadisticas(self.negocio, desde, hasta)
+            exacto = calcular_estadisticas(self.negocio, desde, hasta, exacto=True)
+            self.assertEqual(aproximado['total_clientes'], exacto['total_clientes'], (desde, hasta))
+
+        self.authenticate_as_negocio()
+        response = self.client.get(self.url, {'exacto': 'true'})
+        self.assertEqual((response.data['total_clientes'], response.data['clientes_exacto']), (3, True))
+        self.assertFalse(self.client.get(self.url).data['clientes_exacto'])
+
+    def test_ventana_desde_fin_de_enero_usa_el_sketch_de_febrero(self):
+        """Test que desde el 31 de enero el primer mes completo es febrero"""
+        nuevo = User.objects.create_user(username='cliente_febrero', tipo_usuario='cliente')
+        # Borrar la cita no saca al cliente del sketch: solo lo cuenta si se lee febrero del sketch
+        Cita.objects.create(
+            negocio=self.negocio, cliente=nuevo, servicio=self.servicio,
+            fecha_hora_inicio=datetime(2025, 2, 15, 12, 0, tzinfo=ZoneInfo('Europe/Madrid')),
+            nombre_cliente='Nuevo', telefono_cliente='600000000', email_cliente='n@test.com'
+        ).delete()
+
+        desde, hasta = date(2025, 1, 31), date(2025, 3, 31)
+        aproximado = calcular_estadisticas(self.negocio, desde, hasta)['total_clientes']
+        exacto = calcular_estadisticas(self.negocio, desde, hasta, exacto=True)['total_clientes']
+        self.assertEqual(aproximado, exacto + 1)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SeriesNegocioTestCase(BaseAPITestCase):
+    """Tests para las series temporales por tramos con caché de tramos cerrados"""
+
+    def setUp(self):
+        super().setUp()
+        self.servicio = ServicioNegocio.objects.create(
+            negocio=self.negocio, nombre='Corte', duracion_minutos=30, precio=Decimal('20.00')
+        )
+        self.hoy = timezone.now().astimezone(ZoneInfo('Europe/Madrid')).date()
+        self.citas = {
+            (dias, estado): Cita.objects.create(
+                negocio=self.negocio, cliente=self.cliente_user, servicio=self.servicio,
+                fecha_hora_inicio=datetime.combine(self.hoy - timedelta(days=dias), time(10, 0), tzinfo=ZoneInfo('Europe/Madrid')),
+                estado=estado, nombre_cliente='Cliente', telefono_cliente='600000000', email_cliente='c@test.com'
+            )
+            for dias, estado in [(0, 'pendiente'), (3, 'completada'), (3, 'no_asistio'), (10, 'cancelada_cliente')]
+        }
+        self.url = reverse('api:negocio-series', kwargs={'pk': self.negocio.pk})
+        self.authenticate_as_negocio()
+
+    def serie(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return {tramo['inicio']: tramo for tramo in response.data['series']}
+
+    def test_tramos_por_dia_y_mes(self):
+        """Test de los valores por día y de la agrupación mensual"""
+        serie = self.serie(desde=(self.hoy - timedelta(days=11)).isoformat())
+        self.assertEqual(len(serie), 12)
+        tres_dias = serie[self.hoy - timedelta(days=3)]
+        self.assertEqual((tres_dias['reservas'], tres_dias['no_asistidas']), (2, 1))
+        self.assertEqual(tres_dias['ingresos'], Decimal('20.00'))
+        self.assertEqual(serie[self.hoy - timedelta(days=10)]['cancelaciones'], 1)
+        self.assertEqual(serie[self.hoy]['reservas'], 1)
+
+        mensual = self.serie(intervalo='mes', desde=(self.hoy - timedelta(days=40)).isoformat())
+        self.assertEqual(sum(tramo['reservas'] for tramo in mensual.values()), 4)
+        self.assertTrue(all(inicio.day == 1 for inicio in mensual))
+
+        semanal = self.serie(intervalo='semana')
+        self.assertTrue(all(inicio.weekday() == 0 for inicio in semanal))
+
+    def test_tramos_cerrados_en_cache(self):
+        """Test que los tramos pasados no se recalculan salvo cambios en días pasados"""
+        desde = (self.hoy - timedelta(days=5)).isoformat()
+        self.serie(desde=desde)
+        # Cambio directo en el resumen, sin pasar por las señales
+        ResumenDiarioCitas.objects.filter(fecha=self.hoy - timedelta(days=3), estado='completada').update(total=50)
+        ResumenDiarioCitas.objects.filter(fecha=self.hoy, estado='pendiente').update(total=7)
+        serie = self.serie(desde=desde)
+        self.assertEqual(serie[self.hoy - timedelta(days=3)]['reservas'], 2)
+        self.assertEqual(serie[self.hoy]['reservas'], 7)
+
+        cita = self.citas[(3, 'no_asistio')]
+        cita.estado = 'completada'
+        cita.save()
+        serie = self.serie(desde=desde)
+        self.assertEqual(serie[self.hoy - timedelta(days=3)]['reservas'], 51)
+        self.assertEqual(serie[self.hoy - timedelta(days=3)]['no_asistidas'], 0)
+
+    def test_validacion_y_permisos(self):
+        """Test de parámetros inválidos y acceso de otros usuarios"""
+        futuro = (self.hoy + timedelta(days=30)).isoformat()
+        for params in [{'intervalo': 'hora'}, {'desde': '2020-01-01'}, {'desde': 'ayer'}, {'desde': futuro}]:
+            self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST)
+        self.authenticate_as_cliente()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ValoracionesNegocioTestCase(BaseAPITestCase):
+    """Tests para la calificación incremental de los negocios"""
+
+    def setUp(self):
+        super().setUp()
+        self.otro = User.objects.create_user(username='otro_cliente', tipo_usuario='cliente')
+
+    def reseña(self, cliente, calificacion, **aspectos):
+        return ReseñaNegocio.objects.create(
+            negocio=self.negocio, cliente=cliente, calificacion=calificacion, **aspectos
+        )
+
+    def calificacion(self):
+        self.negocio.refresh_from_db()
+        return self.negocio.total_reseñas, self.negocio.calificacion_promedio
+
+    def test_alta_edicion_y_baja(self):
+        """Test que crear, editar, desactivar y borrar reseñas actualizan los contadores"""
+        primera = self.reseña(self.cliente_user, 5, calificacion_servicio=4)
+        segunda = self.reseña(self.otro, 2, calificacion_servicio=2, calificacion_atencion=3)
+        self.assertEqual(self.calificacion(), (2, Decimal('3.50')))
+        valoraciones = ValoracionesNegocio.objects.get(negocio=self.negocio)
+        self.assertEqual((valoraciones.total_servicio, valoraciones.suma_servicio), (2, 6))
+        self.assertEqual((valoraciones.total_atencion, valoraciones.total_instalaciones), (1, 0))
+
+        segunda.calificacion = 4
+        segunda.calificacion_servicio = None
+        segunda.save()
+        self.assertEqual(self.calificacion(), (2, Decimal('4.50')))
+        self.assertEqual(ValoracionesNegocio.objects.get(negocio=self.negocio).total_servicio, 1)
+
+        primera.activa = False
+        primera.save()
+        self.assertEqual(self.calificacion(), (1, Decimal('4.00')))
+        segunda.delete()
+        self.assertEqual(self.calificacion(), (0, Decimal('0.00')))
+
+        # Borrar el negocio con reseñas no deja contadores huérfanos
+        self.reseña(self.otro, 3)
+        self.negocio.delete()
+        self.assertFalse(ValoracionesNegocio.objects.exists())
+
+    def test_resumen_de_reseñas(self):
+        """Test del histograma desde los contadores y desde la consulta agrupada"""
+        url = reverse('api:negocio-reseñas-resumen', kwargs={'pk': self.negocio.pk})
+        self.reseña(self.cliente_user, 5, calificacion_servicio=4, respuesta_negocio='Gracias')
+        self.reseña(self.otro, 3, calificacion_servicio=5)
+        self.reseña(self.otro, 5, activa=False)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['estrellas'], {'1': 0, '2': 0, '3': 1, '4': 0, '5': 1})
+        self.assertEqual(response.data['aspectos']['servicio'], {'total': 2, 'media': Decimal('4.50')})
+        self.assertIsNone(response.data['aspectos']['atencion']['media'])
+        self.assertEqual(response.data['tasa_respuesta'], 0.5)
+
+        ValoracionesNegocio.objects.all().delete()
+        self.assertEqual(self.client.get(url).data, response.data)
+
+    def test_comando_recalcula(self):
+        """Test que el comando corrige la calificación tras cambios masivos"""
+        self.reseña(self.cliente_user, 5)
+        self.reseña(self.otro, 4, calificacion_instalaciones=5)
+        ReseñaNegocio.objects.filter(calificacion=5).update(activa=False)
+        self.assertEqual(self.calificacion(), (2, Decimal('4.50')))
+
+        salida = StringIO()
+        call_command('recalcular_calificaciones', stdout=salida)
+        self.assertIn('1 negocios corregidos', salida.getvalue())
+        self.assertEqual(self.calificacion(), (1, Decimal('4.00')))
+        self.assertEqual(ValoracionesNegocio.objects.get(negocio=self.negocio).suma_instalaciones, 5)
+
+
+class RankingNegocioTestCase(BaseAPITestCase):
+    """Tests para la puntuación de ranking precalculada"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.clientes = [
+            User.objects.create_user(username=f'cliente_{i}', tipo_usuario='cliente') for i in range(20)
+        ]
+        self.popular = self.crear_negocio('Popular')
+        self.mediocre = self.crear_negocio('Mediocre')
+        self.reseñar(self.negocio, [5])
+        self.reseñar(self.popular, [5] * 16 + [4] * 4)
+        self.reseñar(self.mediocre, [3] * 10)
+
+    def crear_negocio(self, nombre):
+        return Negocio.objects.create(
+            propietario=self.negocio_user, categoria=self.categoria, nombre=nombre,
+            telefono='600000000', email='n@test.com', direccion='Calle', ciudad='Madrid'
+        )
+
+    def reseñar(self, negocio, calificaciones):
+        for cliente, calificacion in zip(self.clientes, calificaciones):
+            ReseñaNegocio.objects.create(negocio=negocio, cliente=cliente, calificacion=calificacion)
+
+    def test_orden_por_defecto(self):
+        """Test que muchas reseñas de 4,8 superan a una sola de 5 tras el recálculo en bloque"""
+        salida = StringIO()
+        call_command('recalcular_ranking', stdout=salida)
+        self.assertIn('negocios actualizados', salida.getvalue())
+
+        response = self.client.get(reverse('api:negocio-list'))
+        nombres = [negocio['nombre'] for negocio in response.data['results']]
+        self.assertEqual(nombres, ['Popular', 'Peluquería Test', 'Mediocre'])
+        self.assertGreater(response.data['results'][0]['puntuacion_ranking'], '4.5')
+
+        response = self.client.get(reverse('api:negocio-list'), {'ordering': 'puntuacion_ranking'})
+        self.assertEqual(response.data['results'][0]['nombre'], 'Mediocre')
+
+    def test_actualizacion_incremental(self):
+        """Test que verificación, citas completadas y reseñas actualizan la puntuación"""
+        reconstruir_ranking()
+        inicial = Negocio.objects.get(pk=self.mediocre.pk).puntuacion_ranking
+
+        self.mediocre.verificado = True
+        self.mediocre.save()
+        verificado = Negocio.objects.get(pk=self.mediocre.pk).puntuacion_ranking
+        self.assertEqual(verificado - inicial, Decimal('0.250'))
+
+        servicio = ServicioNegocio.objects.create(
+            negocio=self.mediocre, nombre='Corte', duracion_minutos=30, precio=Decimal('20.00')
+        )
+        Cita.objects.create(
+            negocio=self.mediocre, cliente=self.cliente_user, servicio=servicio,
+            fecha_hora_inicio=timezone.now() - timedelta(days=1), estado='completada',
+            nombre_cliente='Cliente', telefono_cliente='600000000', email_cliente='c@test.com'
+        )
+        con_cita = Negocio.objects.get(pk=self.mediocre.pk).puntuacion_ranking
+        self.assertGreater(con_cita, verificado)
+
+        self.reseñar(self.mediocre, [5] * 10)
+        self.assertGreater(Negocio.objects.get(pk=self.mediocre.pk).puntuacion_ranking, con_cita)
+
+    def test_recalculo_invalida_etag_del_listado(self):
+        """Test que un cambio de puntuación no deja el listado en 304 con el orden antiguo"""
+        url = reverse('api:negocio-list')
+        Negocio.objects.update(fecha_actualizacion=timezone.now() - timedelta(days=1))
+        etag = self.client.get(url)['ETag']
+
+        reconstruir_ranking()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_bonos_de_volumen_y_recencia(self):
+        """Test de los bonos acotados por volumen y recencia"""
+        hoy = date(2024, 6, 1)
+        base = puntuacion(0, 0, 4.0, False, 0, None, hoy)
+        self.assertEqual(base, Decimal('4.000'))
+        self.assertEqual(puntuacion(0, 0, 4.0, False, 10 ** 6, None, hoy) - base, Decimal('0.500'))
+        reciente = puntuacion(0, 0, 4.0, False, 0, hoy, hoy)
+        antigua = puntuacion(0, 0, 4.0, False, 0, hoy - timedelta(days=30), hoy)
+        self.assertEqual((reciente - base, antigua - base), (Decimal('0.250'), Decimal('0.125')))
+
+
+class RetencionClientesTestCase(BaseAPITestCase):
+    """Tests para el informe de retención a partir del resumen por cliente"""
+
+    def setUp(self):
+        super().setUp()
+        self.servicio = ServicioNegocio.objects.create(
+            negocio=self.negocio, nombre='Corte', duracion_minutos=30, precio=Decimal('20.00')
+        )
+        hoy = timezone.now().astimezone(ZoneInfo('Europe/Madrid')).date()
+        self.meses = [(hoy.replace(day=1) - timedelta(days=80)).replace(day=1)]
+        for _ in range(3):
+            self.meses.append((self.meses[-1] + timedelta(days=31)).replace(day=1))
+        self.otro = User.objects.create_user(username='otro_cliente', tipo_usuario='cliente')
+        self.tercero = User.objects.create_user(username='tercer_cliente', tipo_usuario='cliente')
+        for cliente, mes, dia, estado in [
+            (self.cliente_user, 0, 5, 'completada'),
+            (self.cliente_user, 0, 15, 'completada'),
+            (self.cliente_user, 2, 10, 'completada'),
+            (self.otro, 0, 20, 'completada'),
+            (self.otro, 2, 1, 'pendiente'),
+            (self.tercero, 1, 3, 'completada'),
+            (self.tercero, 1, 10, 'completada'),
+        ]:
+            self.crear_cita(cliente, self.meses[mes] + timedelta(days=dia - 1), estado)
+        self.url = reverse('api:negocio-retencion', kwargs={'pk': self.negocio.pk})
+        self.authenticate_as_negocio()
+
+    def crear_cita(self, cliente, fecha, estado):
+        return Cita.objects.create(
+            negocio=self.negocio, cliente=cliente, servicio=self.servicio,
+            fecha_hora_inicio=datetime.combine(fecha, time(0, 30), tzinfo=ZoneInfo('Europe/Madrid')),
+            estado=estado, nombre_cliente='Cliente', telefono_cliente='600000000', email_cliente='c@test.com'
+        )
+
+    def visitas(self):
+        return {
+            fila.cliente_id: (fila.primera_visita, fila.ultima_visita, fila.visitas)
+            for fila in ResumenClienteNegocio.objects.filter(negocio=self.negocio)
+        }
+
+    def test_meses_cohortes_e_intervalos(self):
+        """Test de nuevos y recurrentes por mes, cohortes e intervalos entre visitas"""
+        response = self.client.get(self.url, {'desde': self.meses[0].isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        meses = [(mes['clientes'], mes['nuevos'], mes['recurrentes']) for mes in response.data['meses']]
+        self.assertEqual(meses, [(2, 2, 0), (1, 1, 0), (1, 0, 1), (0, 0, 0)])
+        cohortes = {cohorte['cohorte']: cohorte['activos'] for cohorte in response.data['cohortes']}
+        self.assertEqual(cohortes, {self.meses[0]: [2, 1, 1, 0], self.meses[1]: [1, 0, 0]})
+
+        intervalos = response.data['intervalos']
+        self.assertEqual(intervalos['clientes_recurrentes'], 2)
+        media_primero = ((self.meses[2] + timedelta(days=9)) - (self.meses[0] + timedelta(days=4))).days / 2
+        self.assertEqual(intervalos['media_dias'], round((media_primero + 7) / 2, 1))
+        self.assertEqual(intervalos['distribucion']['hasta_7_dias'], 1)
+
+    def test_resumen_sigue_transiciones_de_completada(self):
+        """Test que completar, cancelar y borrar citas dejan el resumen igual que una reconstrucción"""
+        pendiente = Cita.objects.get(cliente=self.otro, estado='pendiente')
+        pendiente.estado = 'completada'
+        pendiente.save()
+        self.assertEqual(self.visitas()[self.otro.pk], (self.meses[0] + timedelta(days=19), self.meses[2], 2))
+
+        ultima = Cita.objects.filter(cliente=self.cliente_user).latest('fecha_hora_inicio')
+        ultima.estado = 'cancelada_cliente'
+        ultima.save()
+        self.assertEqual(self.visitas()[self.cliente_user.pk][1:], (self.meses[0] + timedelta(days=14), 2))
+        Cita.objects.filter(cliente=self.tercero).delete()
+        self.assertNotIn(self.tercero.pk, self.visitas())
+
+        incremental = self.visitas()
+        call_command('reconstruir_resumen_diario', stdout=StringIO())
+        self.assertEqual(self.visitas(), incremental)
+
+    def test_validacion_y_permisos(self):
+        """Test de rangos inválidos y acceso de otros usuarios"""
+        futuro = (timezone.localdate() + timedelta(days=62)).isoformat()
+        for params in [{'desde': '2020-01-01', 'hasta': '2024-01-01'}, {'desde': 'ayer'}, {'desde': futuro}]:
+            self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST)
+        self.authenticate_as_cliente()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class UtilizacionEmpleadosTestCase(BaseAPITestCase):
+    """Tests para el informe de utilización de empleados"""
+
+    def setUp(self):
+        super().setUp()
+        self.zona = ZoneInfo('Europe/Madrid')
+        self.lunes = date(2024, 1, 1)
+        HorarioNegocio.objects.create(negocio=self.negocio, dia_semana=0, hora_inicio=time(9, 0), hora_fin=time(13, 0))
+        self.empleado = EmpleadoNegocio.objects.create(usuario=self.negocio_user, negocio=self.negocio)
+        self.servicio = ServicioNegocio.objects.create(
+            negocio=self.negocio, nombre='Corte', duracion_minutos=60, precio=Decimal('20.00')
+        )
+        self.url = reverse('api:negocio-utilizacion', kwargs={'pk': self.negocio.pk})
+        self.authenticate_as_negocio()
+
+    def instante(self, hora):
+        return datetime.combine(self.lunes, time(hora, 0), tzinfo=self.zona)
+
+    def test_operaciones_de_intervalos(self):
+        """Test de unión, resta, intersección y reparto por tramos"""
+        unidos = unir([(5, 8), (0, 3), (2, 4), (9, 9)])
+        self.assertEqual(unidos, [[0, 4], [5, 8]])
+        self.assertEqual(restar(unidos, [[1, 2], [3, 6]]), [[0, 1], [2, 3], [6, 8]])
+        self.assertEqual(intersecar(unidos, [[3, 6], [7, 20]]), [[3, 4], [5, 6], [7, 8]])
+        self.assertEqual(repartir(unidos, [0, 2, 6, 10]), [2, 3, 2])
+
+    def test_informe_descuenta_bloqueos(self):
+        """Test de minutos disponibles (horario menos bloqueos) y reservados"""
+        BloqueoHorario.objects.create(
+            negocio=self.negocio, empleado=self.empleado,
+            fecha_inicio=self.instante(12), fecha_fin=self.instante(14),
+        )
+        for hora, estado in [(9, 'confirmada'), (10, 'cancelada_cliente'), (12, 'confirmada')]:
+            Cita.objects.create(
+                negocio=self.negocio, empleado=self.empleado, cliente=self.cliente_user, servicio=self.servicio,
+                fecha_hora_inicio=self.instante(hora), estado=estado,
+                nombre_cliente='Cliente', telefono_cliente='600000000', email_cliente='c@test.com'
+            )
+
+        response = self.client.get(self.url, {'desde': '2024-01-01', 'hasta': '2024-01-09'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        informe = response.data['empleados'][0]
+        lunes = informe['dias'][0]
+        self.assertEqual((lunes['disponibles'], lunes['reservados'], lunes['utilizacion']), (180, 60, 0.3333))
+        self.assertEqual((informe['disponibles'], informe['reservados']), (420, 60))
+        self.assertEqual(len(informe['dias']), 9)
+        self.assertIsNone(informe['dias'][1]['utilizacion'])
+        self.assertEqual([semana['disponibles'] for semana in informe['semanas']], [180, 240])
+
+    def test_trimestre_de_treinta_empleados(self):
+        """Test que un trimestre de 30 empleados se calcula en menos de un segundo"""
+        horarios = [
+            HorarioNegocio(dia_semana=dia, hora_inicio=time(9, 0), hora_fin=time(20, 0)) for dia in range(6)
+        ]
+        fechas = [self.lunes + timedelta(days=n) for n in range(91)]
+        citas = {
+            empleado: [
+                (datetime.combine(fecha, time(hora, 0), tzinfo=self.zona),
+                 datetime.combine(fecha, time(hora, 45), tzinfo=self.zona))
+                for fecha in fechas for hora in range(9, 20, 2)
+            ]
+            for empleado in range(30)
+        }
+        bloqueos = {0: [(self.instante(9), self.instante(20) + timedelta(days=13))]}
+
+        inicio = perf_counter()
+        informe = calcular_utilizacion(
+            fechas, self.zona, horarios, [], bloqueos, citas, [(empleado, '') for empleado in range(30)]
+        )
+        self.assertLess(perf_counter() - inicio, 1)
+        self.assertEqual(informe[1]['disponibles'], 78 * 11 * 60)
+        self.assertEqual(informe[1]['reservados'], 78 * 6 * 45)
+        self.assertEqual(informe[0]['disponibles'], 66 * 11 * 60)
+
+    def test_validacion_y_permisos(self):
+        """Test de rangos inválidos y acceso de otros usuarios"""
+        futuro = (timezone.localdate() + timedelta(days=30)).isoformat()
+        for params in [
+            {'desde': '2024-01-01', 'hasta': '2024-12-31'}, {'desde': '2024-02-01', 'hasta': '2024-01-01'},
+            {'desde': futuro},
+        ]:
+            self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST)
+        self.authenticate_as_cliente()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MetricasPlataformaTestCase(BaseAPITestCase):
+    """Tests para las métricas globales materializadas del panel de administración"""
+
+    def setUp(self):
+        super().setUp()
+        self.hoy = timezone.localdate()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@test.com', password='x')
+        self.negocio.estado_suscripcion = 'activa'
+        self.negocio.save()
+        estetica = CategoriaNegocio.objects.create(nombre='Estética', descripcion='Estética', orden=2)
+        self.sevilla = Negocio.objects.create(
+            propietario=self.negocio_user, categoria=estetica, nombre='Estética Sur',
+            telefono='600000000', email='e@test.com', direccion='Calle', ciudad='Sevilla'
+        )
+        self.servicios = {
+            negocio.pk: ServicioNegocio.objects.create(
+                negocio=negocio, nombre='Corte', duracion_minutos=30, precio=Decimal('20.00')
+            )
+            for negocio in (self.negocio, self.sevilla)
+        }
+        for negocio, dias, estado in (
+            (self.negocio, 1, 'completada'), (self.negocio, 1, 'completada'),
+            (self.negocio, 2, 'cancelada_cliente'), (self.sevilla, 1, 'completada'),
+        ):
+            self.crear_cita(negocio, dias, estado)
+        for numero, (monto, meses) in enumerate(((Decimal('29.99'), 1), (Decimal('240.00'), 12))):
+            FacturacionSuscripcion.objects.create(
+                negocio=self.negocio, stripe_invoice_id=f'in_{numero}', stripe_subscription_id='sub',
+                numero_factura=f'F-{numero}', monto=monto, estado_pago='pagado',
+                periodo_inicio=self.hoy - timedelta(days=10),
+                periodo_fin=self.hoy - timedelta(days=10) + timedelta(days=round(30.4 * meses)),
+                fecha_vencimiento=timezone.now(),
+            )
+
+    def crear_cita(self, negocio, dias, estado):
+        dia = self.hoy - timedelta(days=dias)
+        inicio = datetime.combine(dia, time(12), tzinfo=ZoneInfo('Europe/Madrid'))
+        return Cita.objects.create(
+            negocio=negocio, cliente=self.cliente_user, servicio=self.servicios[negocio.pk],
+            fecha_hora_inicio=inicio, estado=estado,
+            nombre_cliente='Cliente', telefono_cliente='600000000', email_cliente='c@test.com'
+        )
+
+    def test_panel_desde_las_metricas(self):
+        """Test que el panel lee la foto y las citas por día de las métricas materializadas"""
+        salida = StringIO()
+        call_command('actualizar_metricas_plataforma', stdout=salida)
+        self.assertIn('métricas actualizadas', salida.getvalue())
+
+        with self.assertNumQueries(2):
+            panel = leer_metricas(dias=7)
+        self.assertEqual(panel['fecha'], self.hoy)
+        self.assertEqual(panel['suscripciones']['activa'], 1)
+        self.assertEqual(panel['suscripciones']['pendiente_pago'], 1)
+        self.assertEqual(panel['mrr'], {'EUR': Decimal('49.99')})
+        ayer, anteayer = panel['citas_por_dia'][-2], panel['citas_por_dia'][-3]
+        self.assertEqual((ayer['fecha'], ayer['total']), (self.hoy - timedelta(days=1), 3))
+        self.assertEqual(anteayer['estados'], {'cancelada_cliente': 1})
+        self.assertEqual(panel['top_ciudades'], [
+            {'nombre': 'Madrid', 'citas': 2}, {'nombre': 'Sevilla', 'citas': 1},
+        ])
+        self.assertEqual(panel['top_categorias'][0], {'nombre': 'Peluquería', 'citas': 2})
+
+    def test_actualizacion_incremental(self):
+        """Test que solo se reescriben las filas que cambian y los días recientes"""
+        actualizar_metricas()
+        self.assertEqual(actualizar_metricas(), 0)
+
+        self.crear_cita(self.sevilla, 1, 'completada')
+        self.crear_cita(self.sevilla, 60, 'completada')
+        # Citas de ayer en Sevilla y en su categoría
+        self.assertEqual(actualizar_metricas(), 3)
+        antiguas = MetricaPlataforma.objects.filter(tipo='citas', fecha=self.hoy - timedelta(days=60))
+        self.assertFalse(antiguas.exists())
+
+        call_command('actualizar_metricas_plataforma', '--completo', stdout=StringIO())
+        self.assertEqual(antiguas.get().valor, 1)
+
+    def test_solo_administradores(self):
+        """Test que el endpoint y la página del admin son solo para administradores"""
+        url = reverse('api:metricas-plataforma-list')
+        self.authenticate_as_negocio()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials()
+        self.client.force_authenticate(self.admin)
+        actualizar_metricas()
+        response = self.client.get(url, {'dias': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['citas_por_dia']), 3)
+        self.assertEqual(self.client.get(url, {'dias': 0}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:API_metricaplataforma_changelist'))
+        self.assertContains(response, 'Madrid')
+
+
 class ServicioNegocioAPITestCase(BaseAPITestCase):
     """Tests para la API de servicios de negocio"""
     
@@ -434,6 +2062,69 @@ class CitaAPITestCase(BaseAPITestCase):
         self.assertEqual(cita.estado, 'confirmada')
 
 
+class PaginacionCursorTestCase(BaseAPITestCase):
+    """Tests para la paginación por cursor de citas"""
+
+    def setUp(self):
+        super().setUp()
+        servicio = ServicioNegocio.objects.create(
+            negocio=self.negocio,
+            nombre='Corte de Cabello',
+            duracion_minutos=30,
+            precio=Decimal('15.00')
+        )
+        # Dos citas por hora para forzar empates en fecha_hora_inicio
+        inicio = timezone.now() + timedelta(days=1)
+        for i in range(25):
+            Cita.objects.create(
+                negocio=self.negocio,
+                cliente=self.cliente_user,
+                servicio=servicio,
+                fecha_hora_inicio=inicio + timedelta(hours=i // 2),
+                nombre_cliente='Cliente Test',
+                telefono_cliente='123456789',
+                email_cliente='cliente@test.com'
+            )
+        self.authenticate_as_cliente()
+
+    def test_recorrer_paginas_con_cursor(self):
+        """Test que next/previous recorren todas las citas sin duplicados"""
+        response = self.client.get(reverse('api:cita-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+        primera = [cita['id'] for cita in response.data['results']]
+
+        response = self.client.get(response.data['next'])
+        segunda = [cita['id'] for cita in response.data['results']]
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(len(set(primera + segunda)), 25)
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([cita['id'] for cita in response.data['results']], primera)
+
+    def test_cursor_respeta_ordering(self):
+        """Test que el cursor usa el campo del OrderingFilter"""
+        url = reverse('api:cita-list')
+        response = self.client.get(url, {'ordering': '-fecha_hora_inicio'})
+        fechas = [cita['fecha_hora_inicio'] for cita in response.data['results']]
+        response = self.client.get(response.data['next'])
+        fechas += [cita['fecha_hora_inicio'] for cita in response.data['results']]
+        self.assertEqual(fechas, sorted(fechas, reverse=True))
+
+    def test_modo_pagina_sigue_disponible(self):
+        """Test que ?page= usa paginación por número de página"""
+        response = self.client.get(reverse('api:cita-list'), {'page': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_cursor_invalido(self):
+        """Test cursor corrupto devuelve 404"""
+        response = self.client.get(reverse('api:cita-list'), {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
 class ReseñaAPITestCase(BaseAPITestCase):
     """Tests para la API de reseñas"""
     
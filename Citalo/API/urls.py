@@ -6,7 +6,7 @@ from .views import (
     UsuarioViewSet, CategoriaNegocioViewSet, NegocioViewSet, 
     EmpleadoNegocioViewSet, ServicioNegocioViewSet, HorarioNegocioViewSet,
     BloqueoHorarioViewSet, CitaViewSet, ReseñaNegocioViewSet,
-    FacturacionSuscripcionViewSet, ConfiguracionPlataformaViewSet,
+    FacturacionSuscripcionViewSet, ConfiguracionPlataformaViewSet, MetricasPlataformaViewSet,
     CustomAuthToken, logout_view
 )
 
@@ -25,6 +25,7 @@ router.register(r'citas', CitaViewSet, basename='cita')
 router.register(r'reseñas', ReseñaNegocioViewSet, basename='reseña')
 router.register(r'facturacion', FacturacionSuscripcionViewSet, basename='facturacion')
 router.register(r'configuracion', ConfiguracionPlataformaViewSet, basename='configuracion')
+router.register(r'metricas-plataforma', MetricasPlataformaViewSet, basename='metricas-plataforma')
 
 urlpatterns = [
     # Autenticación
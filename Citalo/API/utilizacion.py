@@ -0,0 +1,182 @@
+"""
+Utilización de los empleados: minutos reservados sobre minutos disponibles.
+
+Los minutos disponibles son los horarios del negocio menos sus bloqueos y los
+del propio empleado; los reservados, la unión de sus citas activas dentro de
+ese tiempo disponible. Todo se calcula con aritmética de intervalos sobre
+minutos enteros (listas ordenadas y barridos lineales), a partir de cuatro
+consultas en bloque, y se reparte por días locales y semanas.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from .disponibilidad import tramos_del_dia
+from .fechas import inicio_dia, obtener_zona_horaria
+
+
+ESTADOS_OCUPAN = ('pendiente', 'confirmada', 'en_curso', 'completada')
+MAXIMO_DIAS = 120
+
+
+def minuto(instante):
+    return int(instante.timestamp() // 60)
+
+
+def en_minutos(intervalos):
+    """Intervalos aware (inicio, fin) como minutos enteros unidos"""
+    return unir((minuto(inicio), minuto(fin)) for inicio, fin in intervalos)
+
+
+def unir(intervalos):
+    """Intervalos ordenados y sin solapes"""
+    unidos = []
+    for inicio, fin in sorted(intervalos):
+        if fin <= inicio:
+            continue
+        if unidos and inicio <= unidos[-1][1]:
+            if fin > unidos[-1][1]:
+                unidos[-1][1] = fin
+        else:
+            unidos.append([inicio, fin])
+    return unidos
+
+
+def restar(base, quitar):
+    """base - quitar, ambos unidos (resultado de unir())"""
+    resultado = []
+    j = 0
+    for inicio, fin in base:
+        while j < len(quitar) and quitar[j][1] <= inicio:
+            j += 1
+        k = j
+        while k < len(quitar) and quitar[k][0] < fin:
+            if quitar[k][0] > inicio:
+                resultado.append([inicio, quitar[k][0]])
+            inicio = max(inicio, quitar[k][1])
+            k += 1
+        if inicio < fin:
+            resultado.append([inicio, fin])
+    return resultado
+
+
+def intersecar(a, b):
+    """a ∩ b, ambos unidos"""
+    resultado = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        inicio, fin = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if inicio < fin:
+            resultado.append([inicio, fin])
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return resultado
+
+
+def repartir(intervalos, limites):
+    """
+    Minutos de los intervalos (unidos) en cada tramo [limites[i], limites[i+1]).
+    Barrido simultáneo de ambas listas ordenadas.
+    """
+    minutos = [0] * (len(limites) - 1)
+    t = 0
+    for inicio, fin in intervalos:
+        while t < len(minutos) and limites[t + 1] <= inicio:
+            t += 1
+        k = t
+        while k < len(minutos) and limites[k] < fin:
+            minutos[k] += max(0, min(fin, limites[k + 1]) - max(inicio, limites[k]))
+            k += 1
+    return minutos
+
+
+def _ratio(reservados, disponibles):
+    return round(reservados / disponibles, 4) if disponibles else None
+
+
+def calcular_utilizacion(fechas, zona, horarios, bloqueos_negocio, bloqueos_empleado, citas_empleado, empleados):
+    """
+    Utilización por empleado, día y semana.
+
+    `bloqueos_negocio` son intervalos (inicio, fin) aware; `bloqueos_empleado`
+    y `citas_empleado` los relacionan por empleado_id. `empleados` es una
+    lista de (empleado_id, nombre).
+    """
+    if not fechas:
+        return []
+    limites = [minuto(inicio_dia(fecha, zona)) for fecha in fechas]
+    limites.append(minuto(inicio_dia(fechas[-1] + timedelta(days=1), zona)))
+
+    # Desde la víspera por los horarios nocturnos
+    abierto = en_minutos(
+        tramo for fecha in [fechas[0] - timedelta(days=1), *fechas]
+        for tramo in tramos_del_dia(horarios, fecha, zona)
+    )
+    base = restar(
+        intersecar(abierto, [[limites[0], limites[-1]]]),
+        en_minutos(bloqueos_negocio),
+    )
+
+    semanas = [fecha - timedelta(days=fecha.weekday()) for fecha in fechas]
+    informe = []
+    for empleado_id, nombre in empleados:
+        disponible = restar(base, en_minutos(bloqueos_empleado.get(empleado_id, ())))
+        reservado = intersecar(disponible, en_minutos(citas_empleado.get(empleado_id, ())))
+        por_dia = zip(fechas, semanas, repartir(disponible, limites), repartir(reservado, limites))
+
+        dias = []
+        por_semana = defaultdict(lambda: [0, 0])
+        for fecha, semana, disponibles, reservados in por_dia:
+            dias.append({
+                'fecha': fecha, 'disponibles': disponibles, 'reservados': reservados,
+                'utilizacion': _ratio(reservados, disponibles),
+            })
+            por_semana[semana][0] += disponibles
+            por_semana[semana][1] += reservados
+
+        disponibles = sum(dia['disponibles'] for dia in dias)
+        reservados = sum(dia['reservados'] for dia in dias)
+        informe.append({
+            'empleado': empleado_id,
+            'nombre': nombre,
+            'disponibles': disponibles,
+            'reservados': reservados,
+            'utilizacion': _ratio(reservados, disponibles),
+            'dias': dias,
+            'semanas': [
+                {'inicio': semana, 'disponibles': d, 'reservados': r, 'utilizacion': _ratio(r, d)}
+                for semana, (d, r) in sorted(por_semana.items())
+            ],
+        })
+    return informe
+
+
+def informe_utilizacion(negocio, desde, hasta):
+    """Carga en bloque lo necesario y calcula la utilización entre dos días locales"""
+    zona = obtener_zona_horaria(negocio.zona_horaria)
+    fechas = [desde + timedelta(days=n) for n in range((hasta - desde).days + 1)]
+    inicio, fin = inicio_dia(desde, zona), inicio_dia(hasta + timedelta(days=1), zona)
+
+    empleados = [
+        (empleado.pk, empleado.usuario.get_full_name() or empleado.usuario.username)
+        for empleado in negocio.empleados.filter(activo=True).select_related('usuario').order_by('pk')
+    ]
+    bloqueos_negocio = []
+    bloqueos_empleado = defaultdict(list)
+    for empleado_id, desde_bloqueo, hasta_bloqueo in negocio.bloqueos.filter(
+        activo=True, fecha_inicio__lt=fin, fecha_fin__gt=inicio
+    ).values_list('empleado_id', 'fecha_inicio', 'fecha_fin'):
+        destino = bloqueos_negocio if empleado_id is None else bloqueos_empleado[empleado_id]
+        destino.append((desde_bloqueo, hasta_bloqueo))
+    citas_empleado = defaultdict(list)
+    for empleado_id, desde_cita, hasta_cita in negocio.citas.filter(
+        empleado__isnull=False, estado__in=ESTADOS_OCUPAN,
+        fecha_hora_inicio__lt=fin, fecha_hora_fin__gt=inicio,
+    ).values_list('empleado_id', 'fecha_hora_inicio', 'fecha_hora_fin'):
+        citas_empleado[empleado_id].append((desde_cita, hasta_cita))
+
+    return calcular_utilizacion(
+        fechas, zona, list(negocio.horarios.all()), bloqueos_negocio,
+        bloqueos_empleado, citas_empleado, empleados,
+    )
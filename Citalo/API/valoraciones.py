@@ -0,0 +1,186 @@
+"""
+Valoraciones agregadas de los negocios.
+
+ValoracionesNegocio guarda la suma y el número de calificaciones de las
+reseñas activas, en global y por aspecto, cuántas hay de cada número de
+estrellas y cuántas tienen respuesta del negocio. Las señales de ReseñaNegocio aplican
+la diferencia entre la aportación anterior y la nueva de cada reseña con
+deltas F(); desactivar una reseña (activa=False) retira su aportación.
+Negocio.calificacion_promedio y total_reseñas se copian de la fila recién
+actualizada, que queda bloqueada hasta el commit, sin recorrer las reseñas, y
+se recalcula la puntuación de ranking del negocio.
+`recalcular_calificaciones` lo regenera desde cero. Si un negocio aún no tiene
+fila, `resumen_reseñas` cuenta sus reseñas con una consulta agrupada: el índice
+(negocio, activa, calificacion) localiza las reseñas activas, pero no cubre la
+consulta, que lee de la tabla los aspectos y la respuesta de cada una.
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .ranking import actualizar_ranking
+
+
+ASPECTOS = ('servicio', 'atencion', 'instalaciones')
+ESTRELLAS = range(1, 6)
+CAMPOS_RESEÑA = (
+    'negocio_id', 'activa', 'calificacion',
+    'calificacion_servicio', 'calificacion_atencion', 'calificacion_instalaciones',
+    'respuesta_negocio',
+)
+CONTADORES = (
+    'total', 'suma',
+    *(f'{prefijo}_{aspecto}' for aspecto in ASPECTOS for prefijo in ('total', 'suma')),
+    *(f'estrellas_{estrellas}' for estrellas in ESTRELLAS),
+    'respondidas',
+)
+
+
+def valores_reseña(reseña):
+    return {campo: getattr(reseña, campo) for campo in CAMPOS_RESEÑA}
+
+
+def aportacion(valores):
+    """Contadores que aporta una reseña dada por sus CAMPOS_RESEÑA"""
+    if not valores['activa']:
+        return {}
+    contadores = {
+        'total': 1,
+        'suma': valores['calificacion'],
+        f'estrellas_{valores["calificacion"]}': 1,
+        'respondidas': 1 if valores['respuesta_negocio'] else 0,
+    }
+    for aspecto in ASPECTOS:
+        nota = valores[f'calificacion_{aspecto}']
+        if nota is not None:
+            contadores[f'total_{aspecto}'] = 1
+            contadores[f'suma_{aspecto}'] = nota
+    return contadores
+
+
+def media(suma, total):
+    if not total:
+        return Decimal('0.00')
+    return (Decimal(suma) / total).quantize(Decimal('0.01'))
+
+
+def aplicar(negocio_id, deltas):
+    """Suma `deltas` a los contadores del negocio y actualiza su calificación"""
+    from .models import Negocio, ValoracionesNegocio
+
+    deltas = {contador: delta for contador, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    filas = ValoracionesNegocio.objects.filter(pk=negocio_id)
+    incrementos = {contador: F(contador) + delta for contador, delta in deltas.items()}
+    with transaction.atomic():
+        if not filas.update(**incrementos):
+            if all(delta < 0 for delta in deltas.values()):
+                # Sin fila no hay nada que restar (p. ej. borrado en cascada)
+                return
+            ValoracionesNegocio.objects.get_or_create(negocio_id=negocio_id)
+            filas.update(**incrementos)
+        if 'total' in deltas or 'suma' in deltas:
+            total, suma = filas.values_list('total', 'suma').get()
+            Negocio.objects.filter(pk=negocio_id).update(
+                total_reseñas=total, calificacion_promedio=media(suma, total),
+                fecha_actualizacion=timezone.now(),
+            )
+            actualizar_ranking(negocio_id)
+
+
+def actualizar(anterior, actual):
+    """Aplica el cambio de una reseña entre sus valores anterior y actual (None si no existe)"""
+    deltas = defaultdict(Counter)
+    if anterior is not None:
+        deltas[anterior['negocio_id']].subtract(aportacion(anterior))
+    if actual is not None:
+        deltas[actual['negocio_id']].update(aportacion(actual))
+    for negocio_id, cambios in deltas.items():
+        aplicar(negocio_id, cambios)
+
+
+def contar_reseñas(reseñas):
+    """Contadores por negocio_id de un queryset de reseñas activas, con una consulta agrupada"""
+    agregados = {
+        'total': Count('pk'),
+        'suma': Sum('calificacion'),
+        'respondidas': Count('pk', filter=~Q(respuesta_negocio='')),
+    }
+    for aspecto in ASPECTOS:
+        agregados[f'total_{aspecto}'] = Count(f'calificacion_{aspecto}')
+        agregados[f'suma_{aspecto}'] = Sum(f'calificacion_{aspecto}')
+    for estrellas in ESTRELLAS:
+        agregados[f'estrellas_{estrellas}'] = Count('pk', filter=Q(calificacion=estrellas))
+    return {
+        fila.pop('negocio'): {contador: valor or 0 for contador, valor in fila.items()}
+        for fila in reseñas.order_by().values('negocio').annotate(**agregados)
+    }
+
+
+def resumen_reseñas(negocio):
+    """Histograma de estrellas, medias por aspecto y tasa de respuesta de un negocio"""
+    from .models import ValoracionesNegocio
+
+    fila = ValoracionesNegocio.objects.filter(pk=negocio.pk).values(*CONTADORES).first()
+    if fila is None:
+        fila = contar_reseñas(negocio.reseñas.filter(activa=True)).get(negocio.pk, {})
+    contadores = {contador: fila.get(contador, 0) for contador in CONTADORES}
+    total = contadores['total']
+    return {
+        'negocio': negocio.pk,
+        'total_reseñas': total,
+        'calificacion_promedio': media(contadores['suma'], total),
+        'estrellas': {str(estrellas): contadores[f'estrellas_{estrellas}'] for estrellas in ESTRELLAS},
+        'aspectos': {
+            aspecto: {
+                'total': contadores[f'total_{aspecto}'],
+                'media': media(contadores[f'suma_{aspecto}'], contadores[f'total_{aspecto}'])
+                if contadores[f'total_{aspecto}'] else None,
+            }
+            for aspecto in ASPECTOS
+        },
+        'tasa_respuesta': round(contadores['respondidas'] / total, 4) if total else None,
+    }
+
+
+def reconstruir_valoraciones(negocio_ids=None):
+    """
+    Regenera los contadores y la calificación de los negocios (todos o los
+    indicados). Devuelve cuántos negocios tenían la calificación
+    desactualizada.
+    """
+    from .models import Negocio, ReseñaNegocio, ValoracionesNegocio
+
+    negocios = Negocio.objects.all()
+    reseñas = ReseñaNegocio.objects.filter(activa=True)
+    valoraciones = ValoracionesNegocio.objects.all()
+    if negocio_ids is not None:
+        negocios = negocios.filter(pk__in=negocio_ids)
+        reseñas = reseñas.filter(negocio_id__in=negocio_ids)
+        valoraciones = valoraciones.filter(negocio_id__in=negocio_ids)
+
+    contadores = contar_reseñas(reseñas)
+    ahora = timezone.now()
+    filas, cambiados = [], []
+    for negocio in negocios.only('pk', 'total_reseñas', 'calificacion_promedio'):
+        datos = contadores.get(negocio.pk, {})
+        fila = ValoracionesNegocio(negocio_id=negocio.pk, **{campo: datos.get(campo, 0) for campo in CONTADORES})
+        filas.append(fila)
+        calificacion = media(fila.suma, fila.total)
+        if (negocio.total_reseñas, negocio.calificacion_promedio) != (fila.total, calificacion):
+            negocio.total_reseñas, negocio.calificacion_promedio = fila.total, calificacion
+            negocio.fecha_actualizacion = ahora
+            cambiados.append(negocio)
+
+    with transaction.atomic():
+        valoraciones.delete()
+        ValoracionesNegocio.objects.bulk_create(filas, batch_size=1000)
+        Negocio.objects.bulk_update(
+            cambiados, ['total_reseñas', 'calificacion_promedio', 'fecha_actualizacion'], batch_size=500
+        )
+    return len(cambiados)
+
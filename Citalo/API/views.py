@@ -7,9 +7,9 @@ from rest_framework.authtoken.views import ObtainAuthToken
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import authenticate, login, logout
 from django.utils import timezone
-from django.db.models import Q, Count, Sum, Avg
+from django.db.models import Q, Count, Avg, Prefetch
 from datetime import datetime, timedelta, time
-from decimal import Decimal
+from time import perf_counter
 
 from .models import (
     Usuario, CategoriaNegocio, Negocio, EmpleadoNegocio, 
@@ -27,8 +27,21 @@ from .serializers import (
 from .filters import (
     UsuarioFilter, NegocioFilter, ServicioNegocioFilter, CitaFilter,
     ReseñaNegocioFilter, FacturacionSuscripcionFilter, HorarioNegocioFilter,
-    BloqueoHorarioFilter, EmpleadoNegocioFilter
+    BloqueoHorarioFilter, EmpleadoNegocioFilter, RelevanciaOrderingFilter
 )
+from .autocompletar import LIMITE_MAXIMO, LIMITE_POR_DEFECTO, indice_prefijos
+from .busqueda import BusquedaTextoCompletoFilter
+from .coincidencia import BusquedaClienteFilter
+from .disponibilidad import HORIZONTE_DIAS, resumen_dia
+from .estadisticas import calcular_estadisticas
+from .fechas import obtener_zona_horaria
+from .metricas import DIAS_POR_DEFECTO as DIAS_METRICAS, MAXIMO_DIAS as MAXIMO_DIAS_METRICAS, leer_metricas
+from .mixins import BatchGetMixin, ConditionalGetMixin, FacetasMixin
+from .pagination import KeysetPagination
+from .retencion import MAXIMO_MESES as MAXIMO_MESES_RETENCION, informe_retencion
+from .series import INTERVALOS, MAXIMO_TRAMOS, calcular_series, tramos
+from .utilizacion import MAXIMO_DIAS as MAXIMO_DIAS_UTILIZACION, informe_utilizacion
+from .valoraciones import resumen_reseñas
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -104,15 +117,16 @@ def logout_view(request):
         return Response({'error': 'Error en logout'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UsuarioViewSet(viewsets.ModelViewSet):
+class UsuarioViewSet(BatchGetMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de usuarios"""
     queryset = Usuario.objects.all()
     serializer_class = UsuarioSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, RelevanciaOrderingFilter]
     filterset_class = UsuarioFilter
     search_fields = ['username', 'email', 'first_name', 'last_name', 'telefono']
     ordering_fields = ['fecha_creacion', 'last_login', 'first_name']
     ordering = ['-fecha_creacion']
+    ordering_relevancia = ['-similitud']
 
     def get_permissions(self):
         if self.action == 'create':
@@ -124,7 +138,9 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
     def get_serializer_class(self):
-        if self.action in ['list', 'retrieve'] and self.request.user != self.get_object():
+        if self.action == 'list':
+            return UsuarioPublicSerializer
+        if self.action == 'retrieve' and self.request.user != self.get_object():
             return UsuarioPublicSerializer
         return UsuarioSerializer
 
@@ -158,7 +174,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         return Response({'message': 'Contraseña actualizada exitosamente'})
 
 
-class CategoriaNegocioViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoriaNegocioViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet de solo lectura para categorías de negocio"""
     queryset = CategoriaNegocio.objects.filter(activa=True).order_by('orden', 'nombre')
     serializer_class = CategoriaNegocioSerializer
@@ -168,18 +184,37 @@ class CategoriaNegocioViewSet(viewsets.ReadOnlyModelViewSet):
     ordering_fields = ['orden', 'nombre']
 
 
-class NegocioViewSet(viewsets.ModelViewSet):
+MAXIMO_NEGOCIOS_MAPA = 200
+
+
+class NegocioViewSet(BatchGetMixin, ConditionalGetMixin, FacetasMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de negocios"""
     queryset = Negocio.objects.filter(activo=True)
     serializer_class = NegocioSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    conditional_related_timestamp_fields = ('categoria__fecha_actualizacion', 'propietario__fecha_actualizacion')
+    batch_select_related = ('propietario', 'categoria')
+    batch_prefetch_related = (
+        Prefetch('empleados', queryset=EmpleadoNegocio.objects.filter(activo=True),
+                 to_attr='empleados_activos'),
+        Prefetch('servicios', queryset=ServicioNegocio.objects.filter(activo=True),
+                 to_attr='servicios_activos'),
+    )
+    filter_backends = [DjangoFilterBackend, BusquedaTextoCompletoFilter, RelevanciaOrderingFilter]
     filterset_class = NegocioFilter
+    # Solo se usan si la base de datos no tiene motor de texto completo
     search_fields = ['nombre', 'descripcion', 'ciudad', 'direccion']
-    ordering_fields = ['nombre', 'calificacion_promedio', 'fecha_creacion']
-    ordering = ['-calificacion_promedio', 'nombre']
+    ordering_fields = [
+        'nombre', 'calificacion_promedio', 'puntuacion_ranking', 'fecha_creacion', 'precio_min', 'precio_max',
+        'proxima_disponibilidad'
+    ]
+    ordering = ['-puntuacion_ranking', 'nombre']
+    ordering_relevancia = ['distancia_km', '-rango_busqueda']
+    ordering_nulos_al_final = ['proxima_disponibilidad']
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'disponibilidad']:
+        if self.action in [
+            'list', 'retrieve', 'disponibilidad', 'autocompletar', 'disponibilidad_mapa', 'reseñas_resumen'
+        ]:
             permission_classes = [permissions.AllowAny]
         elif self.action == 'create':
             permission_classes = [permissions.IsAuthenticated]
@@ -192,32 +227,127 @@ class NegocioViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def estadisticas(self, request, pk=None):
-        """Obtener estadísticas del negocio"""
+        """Obtener estadísticas del negocio (opcionalmente entre `desde` y `hasta`; `exacto` para clientes)"""
         negocio = self.get_object()
         if negocio.propietario != request.user:
             return Response({'error': 'No autorizado'}, status=status.HTTP_403_FORBIDDEN)
 
-        hoy = timezone.now().date()
-        inicio_mes = hoy.replace(day=1)
-        
-        citas = negocio.citas.all()
-        citas_mes = citas.filter(fecha_hora_inicio__date__gte=inicio_mes)
-        
-        estadisticas = {
-            'total_citas': citas.count(),
-            'citas_pendientes': citas.filter(estado='pendiente').count(),
-            'citas_confirmadas': citas.filter(estado='confirmada').count(),
-            'citas_completadas': citas.filter(estado='completada').count(),
-            'citas_canceladas': citas.filter(estado__in=['cancelada_cliente', 'cancelada_negocio']).count(),
-            'ingresos_mes_actual': citas_mes.filter(estado='completada').aggregate(
-                total=Sum('precio_final'))['total'] or Decimal('0'),
-            'calificacion_promedio': negocio.calificacion_promedio,
-            'total_clientes': citas.values('cliente').distinct().count()
-        }
-        
-        serializer = NegocioEstadisticasSerializer(estadisticas)
+        try:
+            desde, hasta = self._leer_rango_fechas(request)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        exacto = request.query_params.get('exacto', '').lower() in ('1', 'true')
+        serializer = NegocioEstadisticasSerializer(calcular_estadisticas(negocio, desde, hasta, exacto=exacto))
         return Response(serializer.data)
 
+    def _leer_rango_fechas(self, request):
+        """(desde, hasta) de los parámetros, o None si faltan; ValueError si no son válidos"""
+        try:
+            desde, hasta = (
+                datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+                for valor in (request.query_params.get('desde'), request.query_params.get('hasta'))
+            )
+        except ValueError:
+            raise ValueError('Formato de fecha inválido')
+        if desde and hasta and desde > hasta:
+            raise ValueError('desde debe ser anterior a hasta')
+        return desde, hasta
+
+    @action(detail=True, methods=['get'])
+    def series(self, request, pk=None):
+        """Reservas, cancelaciones, no asistidas e ingresos por día, semana o mes"""
+        negocio = self.get_object()
+        if negocio.propietario != request.user:
+            return Response({'error': 'No autorizado'}, status=status.HTTP_403_FORBIDDEN)
+
+        intervalo = request.query_params.get('intervalo', 'dia')
+        if intervalo not in INTERVALOS:
+            return Response(
+                {'error': f'intervalo debe ser uno de: {", ".join(INTERVALOS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            desde, hasta = self._leer_rango_fechas(request)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        hoy = timezone.now().astimezone(obtener_zona_horaria(negocio.zona_horaria)).date()
+        hasta = hasta or hoy
+        desde = desde or hasta - timedelta(days=29)
+        if desde > hasta:
+            return Response({'error': 'desde debe ser anterior a hasta'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(tramos(desde, hasta, intervalo)) > MAXIMO_TRAMOS:
+            return Response(
+                {'error': f'Máximo {MAXIMO_TRAMOS} tramos por consulta'}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'intervalo': intervalo,
+            'desde': desde,
+            'hasta': hasta,
+            'series': calcular_series(negocio, desde, hasta, intervalo, hoy),
+        })
+
+    @action(detail=True, methods=['get'], url_path='reseñas-resumen')
+    def reseñas_resumen(self, request, pk=None):
+        """Histograma de estrellas, medias por aspecto y tasa de respuesta"""
+        return Response(resumen_reseñas(self.get_object()))
+
+    @action(detail=True, methods=['get'])
+    def retencion(self, request, pk=None):
+        """Clientes nuevos y recurrentes por mes, cohortes e intervalos entre visitas"""
+        negocio = self.get_object()
+        if negocio.propietario != request.user:
+            return Response({'error': 'No autorizado'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            desde, hasta = self._leer_rango_fechas(request)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        hoy = timezone.now().astimezone(obtener_zona_horaria(negocio.zona_horaria)).date()
+        hasta = hasta or hoy
+        desde = desde or (hasta.replace(day=1) - timedelta(days=330)).replace(day=1)
+        if desde > hasta:
+            return Response({'error': 'desde debe ser anterior a hasta'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(tramos(desde, hasta, 'mes')) > MAXIMO_MESES_RETENCION:
+            return Response(
+                {'error': f'Máximo {MAXIMO_MESES_RETENCION} meses por consulta'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(informe_retencion(negocio, desde, hasta))
+
+    @action(detail=True, methods=['get'])
+    def utilizacion(self, request, pk=None):
+        """Minutos reservados sobre disponibles de cada empleado, por día y semana"""
+        negocio = self.get_object()
+        if negocio.propietario != request.user:
+            return Response({'error': 'No autorizado'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            desde, hasta = self._leer_rango_fechas(request)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        hoy = timezone.now().astimezone(obtener_zona_horaria(negocio.zona_horaria)).date()
+        hasta = hasta or hoy
+        desde = desde or hasta - timedelta(days=hasta.weekday())
+        if desde > hasta:
+            return Response({'error': 'desde debe ser anterior a hasta'}, status=status.HTTP_400_BAD_REQUEST)
+        if (hasta - desde).days >= MAXIMO_DIAS_UTILIZACION:
+            return Response(
+                {'error': f'Máximo {MAXIMO_DIAS_UTILIZACION} días por consulta'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'desde': desde,
+            'hasta': hasta,
+            'empleados': informe_utilizacion(negocio, desde, hasta),
+        })
+
     @action(detail=True, methods=['get'])
     def disponibilidad(self, request, pk=None):
         """Consultar disponibilidad de horarios"""
@@ -264,6 +394,82 @@ class NegocioViewSet(viewsets.ModelViewSet):
         serializer = DisponibilidadSerializer({'fecha': fecha, 'horarios_disponibles': horarios_disponibles})
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], url_path='disponibilidad-mapa')
+    def disponibilidad_mapa(self, request):
+        """
+        Resumen de huecos libres de un día para muchos negocios (vista de mapa),
+        por `ids` o por `caja=sur,oeste,norte,este`, con consultas agrupadas.
+        """
+        hoy = timezone.localdate()
+        fecha_str = request.query_params.get('fecha')
+        try:
+            fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date() if fecha_str else hoy
+        except ValueError:
+            return Response({'error': 'Formato de fecha inválido'}, status=status.HTTP_400_BAD_REQUEST)
+        if not hoy <= fecha <= hoy + timedelta(days=HORIZONTE_DIAS):
+            return Response(
+                {'error': f'La fecha debe estar entre hoy y dentro de {HORIZONTE_DIAS} días'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        campos = ('id', 'nombre', 'latitud', 'longitud', 'zona_horaria',
+                  'tiempo_anticipacion_minimo', 'duracion_min')
+        queryset = self.get_queryset().only(*campos)
+        no_encontrados = []
+        truncado = False
+        if self.batch_query_param in request.query_params:
+            ids = self.get_batch_ids(request, MAXIMO_NEGOCIOS_MAPA)
+            por_pk = {negocio.pk: negocio for negocio in queryset.filter(pk__in=[pk for _, pk in ids])}
+            negocios = [por_pk[pk] for _, pk in ids if pk in por_pk]
+            no_encontrados = [valor for valor, pk in ids if pk not in por_pk]
+        elif 'caja' in request.query_params:
+            try:
+                sur, oeste, norte, este = (float(valor) for valor in request.query_params['caja'].split(','))
+            except ValueError:
+                return Response({'error': 'caja debe ser sur,oeste,norte,este'}, status=status.HTTP_400_BAD_REQUEST)
+            longitud = (Q(longitud__gte=oeste, longitud__lte=este) if oeste <= este
+                        else Q(longitud__gte=oeste) | Q(longitud__lte=este))
+            negocios = list(queryset.filter(longitud, latitud__gte=sur, latitud__lte=norte).order_by(
+                '-puntuacion_ranking', 'nombre'
+            )[:MAXIMO_NEGOCIOS_MAPA + 1])
+            truncado = len(negocios) > MAXIMO_NEGOCIOS_MAPA
+            negocios = negocios[:MAXIMO_NEGOCIOS_MAPA]
+        else:
+            return Response({'error': 'Indique ids o caja'}, status=status.HTTP_400_BAD_REQUEST)
+
+        resumen = resumen_dia(negocios, fecha)
+        return Response({
+            'fecha': fecha,
+            'negocios': [
+                {
+                    'id': negocio.pk,
+                    'nombre': negocio.nombre,
+                    'latitud': negocio.latitud,
+                    'longitud': negocio.longitud,
+                    **resumen[negocio.pk],
+                }
+                for negocio in negocios
+            ],
+            'truncado': truncado,
+            'no_encontrados': no_encontrados,
+        })
+
+    @action(detail=False, methods=['get'])
+    def autocompletar(self, request):
+        """Sugerencias de negocios, servicios y categorías por prefijo"""
+        inicio = perf_counter()
+        consulta = request.query_params.get('q', '')
+        try:
+            limite = min(int(request.query_params.get('limite', LIMITE_POR_DEFECTO)), LIMITE_MAXIMO)
+        except ValueError:
+            return Response({'error': 'Límite inválido'}, status=status.HTTP_400_BAD_REQUEST)
+
+        resultados = indice_prefijos.buscar(consulta, max(limite, 1))
+        response = Response({'resultados': resultados})
+        duracion = (perf_counter() - inicio) * 1000
+        response['Server-Timing'] = f'autocompletar;dur={duracion:.3f}'
+        return response
+
 
 class EmpleadoNegocioViewSet(viewsets.ModelViewSet):
     """ViewSet para gestión de empleados de negocio"""
@@ -286,9 +492,14 @@ class EmpleadoNegocioViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class ServicioNegocioViewSet(viewsets.ModelViewSet):
+class ServicioNegocioViewSet(BatchGetMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de servicios de negocio"""
     serializer_class = ServicioNegocioSerializer
+    conditional_related_timestamp_fields = ('negocio__fecha_actualizacion',)
+    batch_select_related = ('negocio',)
+    batch_prefetch_related = (
+        Prefetch('empleados_autorizados', queryset=EmpleadoNegocio.objects.select_related('usuario')),
+    )
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = ServicioNegocioFilter
     search_fields = ['nombre', 'descripcion']
@@ -361,11 +572,28 @@ class BloqueoHorarioViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class CitaViewSet(viewsets.ModelViewSet):
+class CitaViewSet(BatchGetMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de citas"""
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = KeysetPagination
+    batch_select_related = (
+        'negocio__propietario', 'negocio__categoria', 'cliente',
+        'empleado__usuario', 'servicio__negocio',
+    )
+    batch_prefetch_related = (
+        Prefetch('negocio__empleados', queryset=EmpleadoNegocio.objects.filter(activo=True),
+                 to_attr='empleados_activos'),
+        Prefetch('negocio__servicios', queryset=ServicioNegocio.objects.filter(activo=True),
+                 to_attr='servicios_activos'),
+        Prefetch('servicio__empleados_autorizados', queryset=EmpleadoNegocio.objects.select_related('usuario')),
+    )
+    filter_backends = [DjangoFilterBackend, BusquedaClienteFilter, filters.OrderingFilter]
     filterset_class = CitaFilter
     search_fields = ['nombre_cliente', 'telefono_cliente', 'email_cliente']
+    busqueda_cliente_campos = {
+        'nombre': 'nombre_cliente_normalizado',
+        'telefono': 'telefono_cliente_normalizado',
+        'email': 'email_cliente',
+    }
     ordering_fields = ['fecha_hora_inicio', 'fecha_creacion']
     ordering = ['fecha_hora_inicio']
 
@@ -422,6 +650,7 @@ class CitaViewSet(viewsets.ModelViewSet):
 class ReseñaNegocioViewSet(viewsets.ModelViewSet):
     """ViewSet para gestión de reseñas de negocio"""
     serializer_class = ReseñaNegocioSerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = ReseñaNegocioFilter
     ordering_fields = ['fecha_creacion', 'calificacion']
@@ -459,6 +688,7 @@ class ReseñaNegocioViewSet(viewsets.ModelViewSet):
 class FacturacionSuscripcionViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet de solo lectura para facturación"""
     serializer_class = FacturacionSuscripcionSerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = FacturacionSuscripcionFilter
     ordering_fields = ['fecha_creacion', 'fecha_vencimiento']
@@ -478,10 +708,27 @@ class FacturacionSuscripcionViewSet(viewsets.ReadOnlyModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class ConfiguracionPlataformaViewSet(viewsets.ReadOnlyModelViewSet):
+class ConfiguracionPlataformaViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet de solo lectura para configuración de plataforma"""
     queryset = ConfiguracionPlataforma.objects.filter(activa=True)
     serializer_class = ConfiguracionPlataformaSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter]
     search_fields = ['clave', 'descripcion']
+
+
+class MetricasPlataformaViewSet(viewsets.ViewSet):
+    """Panel de métricas globales de la plataforma (solo administradores, ver metricas.py)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        try:
+            dias = int(request.query_params.get('dias', DIAS_METRICAS))
+        except ValueError:
+            return Response({'error': 'dias debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= dias <= MAXIMO_DIAS_METRICAS:
+            return Response(
+                {'error': f'dias debe estar entre 1 y {MAXIMO_DIAS_METRICAS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(leer_metricas(dias=dias))
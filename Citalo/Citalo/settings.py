@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'API.middleware.CompresionRespuestaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -99,6 +100,20 @@ DATABASES = {
     }
 }
 
+# Caché. Debe ser compartida entre procesos: las versiones de las series por
+# negocio, de los índices en memoria (trigramas, autocompletado) y de las
+# facetas se invalidan a través de ella, y con una caché por proceso los demás
+# workers seguirían sirviendo datos antiguos. En producción con varios workers
+# usar Redis (CACHE_BACKEND=django.core.cache.backends.redis.RedisCache,
+# CACHE_LOCATION=redis://host:6379/0) o Memcached. Sin configurar se usa la
+# caché local del proceso, válida solo con un único proceso (desarrollo y tests).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -165,7 +180,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'API.pagination.ConteoAproximadoPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -178,6 +193,26 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Compresión de respuestas (gzip siempre, brotli si el paquete está instalado)
+COMPRESION_RESPUESTAS = {
+    'TAMANO_MINIMO': 1024,  # bytes; por debajo no compensa comprimir
+    'NIVEL_GZIP': 6,
+    'NIVEL_BROTLI': 5,
+    'CACHE': 'default',  # caché donde se guardan los cuerpos ya comprimidos
+    'TIMEOUT_CACHE': 300,
+}
+
+# Conteos de paginación: exactos hasta el umbral, aproximados por encima
+CONTEO_APROXIMADO = {
+    'UMBRAL_EXACTO': 10000,
+    'TIMEOUT_CACHE': 300,  # segundos que se reutiliza un COUNT(*) fuera de PostgreSQL
+}
+
+# Conteos por faceta del listado de negocios (?facetas=true)
+FACETAS = {
+    'TIMEOUT_CACHE': 120,  # además se invalidan al cambiar negocios, servicios o categorías
+}
+
 # drf-spectacular settings for API documentation
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Citalo API',